@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Arabic Text Normalization
+Diacritic stripping, orthographic folding, phonetic keys and tokenization shared by
+the corpus builder and the recitation matcher
+"""
+
+import re
+import unicodedata
+
+
+# Spelling variants that ASR output and Uthmani script disagree on: alef forms
+# (wasla, hamza above/below, madda), ta marbuta, alef maqsura, hamza carriers,
+# Persian ya/kaf, tatweel and the Uthmani small waw/ya signs.
+ORTHOGRAPHIC_FOLDING = {
+    "ٱ": "ا", "أ": "ا", "إ": "ا", "آ": "ا",
+    "ة": "ه", "ى": "ي", "ی": "ي", "ک": "ك",
+    "ؤ": "و", "ئ": "ي",
+    "ـ": None, "ۥ": None, "ۦ": None,
+}
+
+# Latin, Greek, Cyrillic, Hebrew, Syriac and every Arabic block decompose (NFKD) into
+# code points below U+0900, so a list-backed translate table covers recitation text;
+# anything beyond it falls back to the per-character combining() check.
+TRANSLATE_TABLE_END = 0x0900
+COMBINING_MARKS_TABLE = [
+    None if unicodedata.combining(chr(codePoint)) else codePoint
+    for codePoint in range(TRANSLATE_TABLE_END)
+]
+for variant, folded in ORTHOGRAPHIC_FOLDING.items():
+    COMBINING_MARKS_TABLE[ord(variant)] = folded and ord(folded)
+BEYOND_TABLE_PATTERN = re.compile(f"[{chr(TRANSLATE_TABLE_END)}-{chr(0x10FFFF)}]")
+
+# Letters recognizers (and reciters' dialects) commonly confuse collapse to one
+# representative, so a phonetic key is just a translate over the folded word.
+PHONETIC_KEY_TABLE = str.maketrans({
+    "ط": "ت", "ث": "س", "ص": "س", "ذ": "ز", "ظ": "ز", "ض": "ز",
+    "ح": "ه", "ق": "ك", "ء": "ا",
+})
+VOWEL_LETTERS = frozenset("اوي")
+VOWEL_EDIT_COST = 0.3
+MATCH_CACHE_LIMIT = 200000
+
+matchCache = {}
+
+
+def stripCombiningMarks(text):
+    """Strip combining marks and fold orthographic variants (see ORTHOGRAPHIC_FOLDING)."""
+    if BEYOND_TABLE_PATTERN.search(text):
+        text = ''.join([c for c in text if not unicodedata.combining(c)])
+    return text.translate(COMBINING_MARKS_TABLE)
+
+
+def normalizeArabic(text):
+    normalized = stripCombiningMarks(unicodedata.normalize('NFKD', text))
+    normalized = ' '.join(normalized.split())
+    return normalized.lower()
+
+
+def tokenizeArabic(normalizedText):
+    return normalizedText.split()
+
+
+def normalizedWordsWithSources(text):
+    """
+    Normalized words of text, and for each the index of the whitespace-separated
+    word of text it came from, so recited words can be shown as transcribed.
+    """
+    words = tokenizeArabic(normalizeArabic(text))
+    sourceWords = text.split()
+    if len(words) == len(sourceWords):
+        return words, list(range(len(words)))
+    
+    # A word may normalize to nothing (bare marks) or to several words (ligatures).
+    words, sources = [], []
+    for source, sourceWord in enumerate(sourceWords):
+        for word in tokenizeArabic(normalizeArabic(sourceWord)):
+            words.append(word)
+            sources.append(source)
+    return words, sources
+
+
+def phoneticKey(normalizedWord):
+    return normalizedWord.translate(PHONETIC_KEY_TABLE)
+
+
+def consonantCount(key):
+    return sum(1 for char in key if char not in VOWEL_LETTERS)
+
+
+def matchTolerance(keyA, keyB):
+    """
+    Allowed weighted distance: one long-vowel slip in short words, two in longer
+    ones. Consonant errors beyond the phonetic classes are never forgiven, since
+    e.g. يعلمون vs تعلمون is a real recitation mistake.
+    """
+    return 2 * VOWEL_EDIT_COST if max(len(keyA), len(keyB)) >= 5 else VOWEL_EDIT_COST
+
+
+def weightedEditDistance(keyA, keyB, limit=None):
+    """
+    Levenshtein distance where inserting or deleting a long-vowel letter costs
+    VOWEL_EDIT_COST and any other edit costs 1. Stops early once every cell of
+    a row exceeds `limit`, returning a value above it.
+    """
+    previous = [0.0]
+    for char in keyB:
+        previous.append(previous[-1] + (VOWEL_EDIT_COST if char in VOWEL_LETTERS else 1.0))
+
+    for charA in keyA:
+        deleteCost = VOWEL_EDIT_COST if charA in VOWEL_LETTERS else 1.0
+        current = [previous[0] + deleteCost]
+        for index, charB in enumerate(keyB, 1):
+            insertCost = VOWEL_EDIT_COST if charB in VOWEL_LETTERS else 1.0
+            current.append(min(
+                previous[index - 1] + (charA != charB),
+                previous[index] + deleteCost,
+                current[index - 1] + insertCost,
+            ))
+        if limit is not None and min(current) > limit:
+            return min(current)
+        previous = current
+    return previous[-1]
+
+
+def keysMatch(keyA, keyB):
+    """Whether two phonetic keys are close enough to count as the same recited word; memoized."""
+    if keyA == keyB:
+        return True
+    pair = (keyA, keyB) if keyA < keyB else (keyB, keyA)
+    matched = matchCache.get(pair)
+    if matched is None:
+        # Every consonant insert or delete costs a full point, so consonant counts bound the distance.
+        tolerance = matchTolerance(keyA, keyB)
+        if abs(consonantCount(keyA) - consonantCount(keyB)) > tolerance:
+            matched = False
+        else:
+            matched = weightedEditDistance(keyA, keyB, tolerance) <= tolerance
+        if len(matchCache) >= MATCH_CACHE_LIMIT:
+            matchCache.clear()
+        matchCache[pair] = matched
+    return matched
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Streaming Audio Pipeline
+Capture thread feeding a bounded queue of phrases to a pool of recognition workers
+"""
+
+import queue
+import threading
+import time
+
+from latency_metrics import profiledTarget
+
+
+class ListenCancelled(Exception):
+    pass
+
+
+class CancellableStream:
+    """
+    Wraps the microphone's input stream so a blocked listen or calibration gives
+    up at the next chunk once the session closes or the listener cancels it.
+    """
+    
+    def __init__(self, stream, microphoneSession):
+        self.stream = stream
+        self.microphoneSession = microphoneSession
+    
+    def read(self, size, *args, **kwargs):
+        if self.microphoneSession.isCancelled():
+            raise ListenCancelled("Listening was cancelled")
+        return self.stream.read(size, *args, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class MicrophoneSession:
+    """
+    Keeps one microphone stream open for the whole session. Ambient noise
+    calibration runs in the background, the recognizer's dynamic energy
+    threshold adapts while listening, and idle periods trigger a short recalibration.
+    """
+    
+    def __init__(self, microphone, recognizer, calibrationDuration=1.0,
+                 recalibrationDuration=0.5, recalibrationInterval=30.0):
+        self.microphone = microphone
+        self.recognizer = recognizer
+        self.calibrationDuration = calibrationDuration
+        self.recalibrationDuration = recalibrationDuration
+        self.recalibrationInterval = recalibrationInterval
+        self.source = None
+        self.openError = None
+        self.ready = threading.Event()
+        self.closed = threading.Event()
+        self.streamLock = threading.Lock()
+        self.listenCancelled = None
+        self.lastListenTime = 0.0
+        self.thread = None
+    
+    def open(self, onReady=None, onError=None):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.sessionThread, args=(onReady, onError), daemon=True)
+        self.thread.start()
+    
+    def sessionThread(self, onReady, onError):
+        try:
+            self.source = self.microphone.__enter__()
+            self.source.stream = CancellableStream(self.source.stream, self)
+            self.recognizer.dynamic_energy_threshold = True
+            with self.streamLock:
+                self.recognizer.adjust_for_ambient_noise(self.source, duration=self.calibrationDuration)
+        except Exception as e:
+            self.openError = e
+            self.ready.set()
+            if onError:
+                onError(e)
+            return
+        
+        self.lastListenTime = time.monotonic()
+        self.ready.set()
+        if onReady:
+            onReady()
+        
+        while not self.closed.wait(self.recalibrationInterval):
+            if time.monotonic() - self.lastListenTime < self.recalibrationInterval:
+                continue
+            if self.streamLock.acquire(blocking=False):
+                try:
+                    self.recognizer.adjust_for_ambient_noise(self.source, duration=self.recalibrationDuration)
+                except ListenCancelled:
+                    break
+                except Exception as e:
+                    print(f"Warning: Could not recalibrate microphone: {str(e)}")
+                finally:
+                    self.streamLock.release()
+    
+    def isCancelled(self):
+        return self.closed.is_set() or (self.listenCancelled is not None and self.listenCancelled.is_set())
+    
+    def listen(self, timeout, phraseTimeLimit, cancelled=None):
+        """
+        Next VAD-segmented phrase. Raises ListenCancelled within one chunk of the
+        cancelled event being set or the session closing.
+        """
+        self.ready.wait()
+        if self.openError is not None:
+            raise self.openError
+        with self.streamLock:
+            if self.closed.is_set() or self.source is None:
+                raise ListenCancelled("Microphone session is closed")
+            self.listenCancelled = cancelled
+            try:
+                return self.recognizer.listen(self.source, timeout=timeout, phrase_time_limit=phraseTimeLimit)
+            finally:
+                self.listenCancelled = None
+                self.lastListenTime = time.monotonic()
+    
+    def close(self):
+        # Setting closed first makes a pending listen or recalibration give up the stream lock.
+        self.closed.set()
+        with self.streamLock:
+            if self.source is not None:
+                self.microphone.__exit__(None, None, None)
+                self.source = None
+
+
+class PhraseResult:
+    def __init__(self, sequenceNumber, text=None, error=None, dropped=False, mode=None, capturedAt=None):
+        self.sequenceNumber = sequenceNumber
+        self.text = text
+        self.error = error
+        self.dropped = dropped
+        self.mode = mode
+        self.capturedAt = capturedAt
+        self.completedAt = None
+
+
+class ResultSequencer:
+    """Buffers out-of-order worker results and releases them in capture order."""
+    
+    def __init__(self, onResult):
+        self.onResult = onResult
+        self.pending = {}
+        self.nextSequenceNumber = 0
+        self.lock = threading.RLock()
+    
+    def submit(self, result):
+        with self.lock:
+            self.pending[result.sequenceNumber] = result
+            while self.nextSequenceNumber in self.pending:
+                ready = self.pending.pop(self.nextSequenceNumber)
+                self.nextSequenceNumber += 1
+                if not ready.dropped:
+                    self.onResult(ready)
+
+
+class RecitationPipeline:
+    """
+    The capture thread only listens and enqueues VAD-segmented phrases, so speech
+    is never lost while recognition is in flight. When the queue is full the
+    oldest phrase is dropped rather than stalling capture. With a recorder, every
+    captured phrase is also appended to it, tagged by segmentTag() with the
+    (surah, ayah) being practiced. stop() cancels the listen in progress, so a
+    stopped pipeline releases the microphone within one audio chunk.
+    """
+    
+    def __init__(self, microphoneSession, backend, listenSettings, onResult,
+                 onCaptureError=None, workerCount=2, queueSize=8, metrics=None,
+                 recorder=None, segmentTag=None):
+        self.microphoneSession = microphoneSession
+        self.backend = backend
+        self.listenSettings = listenSettings
+        self.onResult = onResult
+        self.onCaptureError = onCaptureError
+        # A backend that replays by call order needs phrases recognized in capture order.
+        self.workerCount = 1 if backend.orderDependent else workerCount
+        self.metrics = metrics
+        self.recorder = recorder
+        self.segmentTag = segmentTag
+        self.phraseQueue = queue.Queue(maxsize=queueSize)
+        self.sequencer = ResultSequencer(self.deliverResult)
+        self.isRunning = False
+        self.cancelled = threading.Event()
+        self.threads = []
+        self.droppedPhrases = 0
+    
+    def start(self):
+        self.isRunning = True
+        self.cancelled.clear()
+        self.threads = [threading.Thread(target=profiledTarget(self.captureThread, "capture"), daemon=True)]
+        for workerNumber in range(self.workerCount):
+            worker = profiledTarget(self.recognitionWorker, f"worker{workerNumber}")
+            self.threads.append(threading.Thread(target=worker, daemon=True))
+        for thread in self.threads:
+            thread.start()
+    
+    def stop(self):
+        if not self.isRunning:
+            return
+        self.isRunning = False
+        self.cancelled.set()
+        for _ in range(self.workerCount):
+            self.enqueue(None)
+    
+    def enqueue(self, item):
+        while True:
+            try:
+                self.phraseQueue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self.phraseQueue.get_nowait()
+                except queue.Empty:
+                    continue
+                if dropped is not None:
+                    self.droppedPhrases += 1
+                    self.sequencer.submit(PhraseResult(dropped[0], dropped=True))
+    
+    def captureThread(self):
+        import speech_recognition as sr
+        
+        sequenceNumber = 0
+        while self.isRunning:
+            timeout, phraseTimeLimit, languages, mode = self.listenSettings()
+            listenStart = time.perf_counter()
+            try:
+                audio = self.microphoneSession.listen(timeout, phraseTimeLimit, self.cancelled)
+            except ListenCancelled:
+                break
+            except sr.WaitTimeoutError:
+                continue
+            except Exception as e:
+                if self.isRunning and self.onCaptureError:
+                    self.onCaptureError(e)
+                self.stop()
+                break
+            
+            if not self.isRunning:
+                break
+            capturedAt = time.perf_counter()
+            if self.metrics:
+                self.metrics.record("listen", capturedAt - listenStart)
+            self.enqueue((sequenceNumber, audio, languages, mode, capturedAt))
+            sequenceNumber += 1
+            if self.recorder is not None:
+                self.recordPhrase(audio, mode)
+    
+    def recordPhrase(self, audio, mode):
+        surahNum, ayahNum = self.segmentTag() if self.segmentTag else (0, 0)
+        try:
+            self.recorder.append(audio, surahNum, ayahNum, mode)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not record phrase: {str(e)}")
+    
+    def recognitionWorker(self):
+        while True:
+            item = self.phraseQueue.get()
+            if item is None:
+                break
+            
+            sequenceNumber, audio, languages, mode, capturedAt = item
+            recognizeStart = time.perf_counter()
+            try:
+                result = PhraseResult(sequenceNumber, text=self.backend.transcribe(audio, languages),
+                                      mode=mode, capturedAt=capturedAt)
+            except Exception as e:
+                result = PhraseResult(sequenceNumber, error=e, mode=mode, capturedAt=capturedAt)
+            result.completedAt = time.perf_counter()
+            if self.metrics:
+                self.metrics.record("queueWait", recognizeStart - capturedAt)
+                self.metrics.record("recognize", result.completedAt - recognizeStart)
+            if self.isRunning:
+                self.sequencer.submit(result)
+    
+    def deliverResult(self, result):
+        if self.metrics and result.completedAt is not None:
+            self.metrics.recordSince("sequencerWait", result.completedAt)
+        self.onResult(result)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Batch Recitation Scoring
+Recognizes and scores a directory of tagged recordings across a process pool
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from practice_session import SIMILARITY_THRESHOLD, scoreRecitedRange
+from quran_corpus import QuranCorpus
+from recognition_cache import CACHE_ENV_VAR, withRecognitionCache
+from speech_backends import BackendUnavailableError, UnknownSpeechError, createBackend, loadAudioFile
+
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".aiff", ".aif")
+FILENAME_TAG = re.compile(r"(?P<surah>\d{1,3})[_-](?P<start>\d{1,3})(?:-(?P<end>\d{1,3}))?$")
+CSV_COLUMNS = ["audio", "surah", "startAyah", "endAyah", "similarity", "passed", "missingWords", "recognitionMs", "error"]
+
+workerCorpus = None
+workerBackend = None
+workerThreshold = SIMILARITY_THRESHOLD
+
+
+def parseFilenameTag(audioFilePath):
+    """'ahmad_002_001-005.wav' -> (2, 1, 5); 'ahmad_2_255.wav' -> (2, 255, 255)."""
+    stem = os.path.splitext(os.path.basename(audioFilePath))[0]
+    match = FILENAME_TAG.search(stem)
+    if not match:
+        return None
+    startAyah = int(match.group("start"))
+    endAyah = int(match.group("end") or startAyah)
+    return int(match.group("surah")), startAyah, endAyah
+
+
+def readManifest(manifestFilePath):
+    tasks = []
+    baseDirectory = os.path.dirname(os.path.abspath(manifestFilePath))
+    with open(manifestFilePath, 'r', encoding='utf-8') as manifestFile:
+        for row in csv.DictReader(manifestFile):
+            startAyah = int(row['startAyah'])
+            endAyah = int(row.get('endAyah') or startAyah)
+            tasks.append((os.path.join(baseDirectory, row['audio']), int(row['surah']), startAyah, endAyah))
+    return tasks
+
+
+def collectTasks(audioDirectory, manifestFilePath=None):
+    if manifestFilePath:
+        return readManifest(manifestFilePath)
+    
+    tasks = []
+    for audioFilePath in sorted(glob.glob(os.path.join(audioDirectory, "**", "*"), recursive=True)):
+        if not audioFilePath.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        tag = parseFilenameTag(audioFilePath)
+        if tag is None:
+            print(f"Warning: Skipping {audioFilePath}: no surah/ayah tag in file name", file=sys.stderr)
+            continue
+        tasks.append((audioFilePath,) + tag)
+    return tasks
+
+
+def initializeWorker(csvFilePath, backendName, model, threshold, cacheFilePath=None):
+    global workerCorpus, workerBackend, workerThreshold
+    workerCorpus = QuranCorpus.load(csvFilePath)
+    # Each worker keeps its own memory tier; the SQLite tier is shared, so a
+    # recording already recognized by any worker, or by an earlier run, is not sent again.
+    workerBackend = withRecognitionCache(createBackend(backendName, model=model), cacheFilePath)
+    workerBackend.load()
+    workerThreshold = threshold
+
+
+def scoreRecording(task):
+    audioFilePath, surahNum, startAyah, endAyah = task
+    record = {"audio": audioFilePath, "surah": surahNum, "startAyah": startAyah, "endAyah": endAyah}
+    
+    startTime = time.perf_counter()
+    hitsBefore = workerBackend.cache.hits
+    try:
+        transcript = workerBackend.transcribe(loadAudioFile(audioFilePath), ("ar-SA",))
+    except UnknownSpeechError:
+        transcript = ""
+    except Exception as e:
+        record["error"] = str(e)
+        return record
+    record["recognitionMs"] = round((time.perf_counter() - startTime) * 1000, 1)
+    record["cached"] = workerBackend.cache.hits > hitsBefore
+    
+    try:
+        record.update(scoreRecitedRange(workerCorpus, surahNum, startAyah, endAyah, transcript, workerThreshold))
+    except ValueError as e:
+        record["error"] = str(e)
+    return record
+
+
+class ResultWriter:
+    """Appends finished records to CSV or JSONL; successful files go to a checkpoint so reruns resume."""
+    
+    def __init__(self, outputFilePath):
+        self.outputFilePath = outputFilePath
+        self.checkpointFilePath = outputFilePath + ".done"
+        self.isCsv = outputFilePath.lower().endswith(".csv")
+        writeHeader = self.isCsv and not os.path.exists(outputFilePath)
+        self.outputFile = open(outputFilePath, 'a', encoding='utf-8', newline='')
+        self.checkpointFile = open(self.checkpointFilePath, 'a', encoding='utf-8')
+        if self.isCsv:
+            self.csvWriter = csv.DictWriter(self.outputFile, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+            if writeHeader:
+                self.csvWriter.writeheader()
+    
+    def completedFiles(self):
+        with open(self.checkpointFilePath, 'r', encoding='utf-8') as checkpointFile:
+            return {line.rstrip("\n") for line in checkpointFile if line.strip()}
+    
+    def write(self, record):
+        if self.isCsv:
+            row = dict(record)
+            row["missingWords"] = " ".join(record.get("missingWords", []))
+            self.csvWriter.writerow(row)
+        else:
+            self.outputFile.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.outputFile.flush()
+        os.fsync(self.outputFile.fileno())
+        if "error" not in record:
+            self.checkpointFile.write(record["audio"] + "\n")
+            self.checkpointFile.flush()
+    
+    def close(self):
+        self.outputFile.close()
+        self.checkpointFile.close()
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description="Batch-score recorded recitations.")
+    parser.add_argument("audioDirectory", help="directory of recordings named <name>_<surah>_<startAyah>[-<endAyah>].wav")
+    parser.add_argument("--manifest", help="CSV with audio,surah,startAyah,endAyah columns instead of file-name tags")
+    parser.add_argument("--output", default="scores.jsonl", help="results file, .jsonl or .csv (default: scores.jsonl)")
+    parser.add_argument("--backend", help="speech backend (google, vosk, whisper, fake)")
+    parser.add_argument("--model", help="model path or name for the speech backend")
+    parser.add_argument("--cache", help=f"SQLite recognition cache shared by the workers (default: ${CACHE_ENV_VAR})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--csv", default="quran.csv", help="Quran text CSV (default: quran.csv)")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="pass threshold in percent")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+    # Build the corpus file up front so worker processes only memory-map it.
+    QuranCorpus.load(args.csv).close()
+    # Load the backend once here too, so a missing engine or model is reported
+    # plainly instead of breaking every worker's initializer.
+    try:
+        createBackend(args.backend, model=args.model).load()
+    except (BackendUnavailableError, ValueError) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 2
+    
+    writer = ResultWriter(args.output)
+    completed = writer.completedFiles()
+    tasks = [task for task in collectTasks(args.audioDirectory, args.manifest) if task[0] not in completed]
+    print(f"{len(completed)} recordings already scored, {len(tasks)} to go", file=sys.stderr)
+    
+    startTime = time.perf_counter()
+    cachedCount = 0
+    try:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=initializeWorker,
+            initargs=(args.csv, args.backend, args.model, args.threshold, args.cache),
+        ) as executor:
+            futures = [executor.submit(scoreRecording, task) for task in tasks]
+            for finished, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                writer.write(record)
+                cachedCount += bool(record.get("cached"))
+                status = record.get("error") or f"{record['similarity']:.1f}%"
+                print(f"[{finished}/{len(tasks)}] {record['audio']}: {status}", file=sys.stderr)
+    except BrokenProcessPool as e:
+        print(f"Error: A scoring worker failed: {str(e)}", file=sys.stderr)
+        return 2
+    finally:
+        writer.close()
+    
+    elapsed = time.perf_counter() - startTime
+    if tasks:
+        print(f"Scored {len(tasks)} recordings in {elapsed:.1f} s ({len(tasks) / elapsed:.1f}/s), "
+              f"{cachedCount} from the recognition cache", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Normalization Micro-benchmark
+Compares a per-character normalizer (stripping and folding the same way) with the translate-table normalizer
+and with reading the precomputed normalized form from the corpus
+"""
+
+import os
+import sys
+import timeit
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from arabic_text import ORTHOGRAPHIC_FOLDING, normalizeArabic
+from quran_corpus import QuranCorpus
+
+
+def normalizeArabicPerCharacter(text):
+    normalized = unicodedata.normalize('NFKD', text)
+    normalized = ''.join([ORTHOGRAPHIC_FOLDING.get(c, c) or '' for c in normalized if not unicodedata.combining(c)])
+    normalized = ' '.join(normalized.split())
+    return normalized.lower()
+
+
+def main():
+    csvFilePath = sys.argv[1] if len(sys.argv) > 1 else "quran.csv"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    
+    with QuranCorpus.load(csvFilePath) as corpus:
+        ayahs = [corpus.rowText(row) for row in range(len(corpus))]
+        
+        for text in ayahs:
+            assert normalizeArabic(text) == normalizeArabicPerCharacter(text)
+        
+        cases = {
+            "per-character loop": lambda: [normalizeArabicPerCharacter(text) for text in ayahs],
+            "translate table": lambda: [normalizeArabic(text) for text in ayahs],
+            "precomputed corpus": lambda: [corpus.rowNormalizedText(row) for row in range(len(corpus))],
+        }
+        
+        print(f"{len(ayahs)} ayahs x {repeat} runs")
+        baseline = None
+        for name, case in cases.items():
+            elapsed = min(timeit.repeat(case, number=repeat, repeat=3))
+            perAyah = elapsed / (repeat * len(ayahs)) * 1e6
+            baseline = baseline or elapsed
+            print(f"{name:>20}: {perAyah:8.2f} us/ayah  ({baseline / elapsed:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Surah Name Resolver Benchmark
+Resolves noisy ASR-style transcripts of every surah name and reports accuracy and latency
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from surah_resolver import SURAH_NAMES, SurahNameResolver
+
+
+PREFIXES = ["", "surah ", "surat ", "I want to recite ", "سورة ", "please start "]
+LATIN_CONFUSIONS = {"q": "k", "h": "", "i": "ee", "u": "oo", "a": "aa", "'": "", "-": " "}
+
+
+def addSpellingNoise(name, rng, errorRate):
+    noisy = []
+    for char in name:
+        roll = rng.random()
+        if roll < errorRate and char.lower() in LATIN_CONFUSIONS:
+            noisy.append(LATIN_CONFUSIONS[char.lower()])
+        elif roll < errorRate * 1.5 and char.isalpha():
+            noisy.append(char * 2)
+        else:
+            noisy.append(char)
+    return "".join(noisy)
+
+
+def noisyTranscripts(count, errorRate, seed):
+    rng = random.Random(seed)
+    transcripts = []
+    for _ in range(count):
+        surahNum, arabicName, transliteration, englishName = rng.choice(SURAH_NAMES)
+        name = rng.choice([arabicName, transliteration, transliteration.lower(), englishName])
+        if name is not arabicName:
+            name = addSpellingNoise(name, rng, errorRate)
+        transcripts.append((surahNum, rng.choice(PREFIXES) + name))
+    return transcripts
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    errorRate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.15
+    
+    buildStart = time.perf_counter()
+    resolver = SurahNameResolver()
+    buildTime = time.perf_counter() - buildStart
+    
+    transcripts = noisyTranscripts(count, errorRate, seed=114)
+    latencies = []
+    correct = 0
+    for expected, transcript in transcripts:
+        startTime = time.perf_counter()
+        ranked = resolver.resolve(transcript)
+        latencies.append(time.perf_counter() - startTime)
+        if ranked and ranked[0][0] == expected:
+            correct += 1
+    
+    latencies.sort()
+    print(f"index build: {buildTime * 1000:.1f} ms for {len(resolver.aliases)} aliases")
+    print(f"transcripts: {count} (spelling error rate {errorRate:.0%})")
+    print(f"top-1 accuracy: {correct / count:.1%}")
+    for label, quantile in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        print(f"{label}: {latencies[int(quantile * (count - 1))] * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Server Load Test
+Concurrent simulated learners reciting noisy phrases to quran_server.py, reporting
+round-trip latency and how many sessions per core fit within a latency budget
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from quran_corpus import QuranCorpus
+from quran_server import ConnectionClosed, WebSocket
+from synthetic_workload import noisyTranscript, splitIntoPhrases
+
+
+SEED = 6236
+AUDIO_SAMPLE_RATE = 16000
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "quran_server.py")
+
+
+def learnerRecitations(corpus, count, ayahsPerLearner, seed):
+    """Per learner: a (surah, startAyah, endAyah) range and the noisy phrases reciting it."""
+    rng = random.Random(seed)
+    recitations = []
+    for _ in range(count):
+        row = rng.randrange(len(corpus))
+        surahNum, startAyah, _ = corpus.rowAyah(row)
+        endRow = min(row + ayahsPerLearner, corpus.surahRows(surahNum)[1])
+        phrases = []
+        for ayahRow in range(row, endRow):
+            phrases.extend(splitIntoPhrases(noisyTranscript(corpus.rowText(ayahRow), rng), rng))
+        recitations.append(((surahNum, startAyah, corpus.rowAyah(endRow - 1)[1]), phrases))
+    return recitations
+
+
+async def connect(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode('ascii')
+    writer.write((
+        f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+    ).encode('latin-1'))
+    await writer.drain()
+    response = await reader.readuntil(b"\r\n\r\n")
+    if not response.startswith(b"HTTP/1.1 101"):
+        raise ConnectionClosed(response.split(b"\r\n", 1)[0].decode('latin-1'))
+    return WebSocket(reader, writer, isClient=True)
+
+
+def audioPhrase(seconds, seed):
+    """Seeded 16 kHz 16-bit mono noise; exercises frame unmasking and the recognizer hand-off."""
+    return random.Random(seed).randbytes(int(seconds * AUDIO_SAMPLE_RATE) * 2)
+
+
+async def simulateLearner(host, port, learnerId, recitation, phraseInterval, stats, audio=None):
+    """Recite the phrases as transcripts, or, with audio, send that PCM once per phrase instead."""
+    (surahNum, startAyah, endAyah), phrases = recitation
+    try:
+        connection = await connect(host, port, f"/session/loadtest{learnerId}")
+        await connection.sendJson({"type": "start", "surah": surahNum, "startAyah": startAyah, "endAyah": endAyah})
+        await connection.receiveJson()
+        for phrase in phrases:
+            startTime = time.perf_counter()
+            if audio is None:
+                await connection.sendJson({"type": "transcript", "text": phrase})
+            else:
+                await connection.send(audio)
+            reply = await connection.receiveJson()
+            stats["latencies"].append(time.perf_counter() - startTime)
+            stats["completedAyahs"] += bool(reply.get("completed"))
+            if phraseInterval:
+                await asyncio.sleep(phraseInterval)
+        await connection.close()
+    except (ConnectionClosed, ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+        stats["errors"] += 1
+        print(f"Warning: Learner {learnerId} failed: {str(e)}", file=sys.stderr)
+
+
+async def runRound(host, port, recitations, phraseInterval, audio=None):
+    stats = {"latencies": [], "completedAyahs": 0, "errors": 0}
+    startTime = time.perf_counter()
+    await asyncio.gather(*(
+        simulateLearner(host, port, learnerId, recitation, phraseInterval, stats, audio)
+        for learnerId, recitation in enumerate(recitations)
+    ))
+    wallSeconds = time.perf_counter() - startTime
+    
+    latencies = sorted(stats["latencies"])
+    count = len(latencies)
+    
+    def percentile(fraction):
+        return latencies[min(count - 1, int(fraction * count))] * 1000 if count else 0.0
+    
+    return {
+        "audio": audio is not None,
+        "sessions": len(recitations),
+        "phrases": count,
+        "phrasesPerSec": count / wallSeconds if wallSeconds else 0.0,
+        "p50Ms": percentile(0.50),
+        "p95Ms": percentile(0.95),
+        "p99Ms": percentile(0.99),
+        "completedAyahs": stats["completedAyahs"],
+        "errors": stats["errors"],
+    }
+
+
+def freePort():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def spawnServer(args):
+    """Run the server in its own process so the client does not share its GIL."""
+    port = freePort()
+    command = [sys.executable, SERVER_SCRIPT, "--port", str(port), "--csv", args.csv]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    if args.audio_seconds:
+        # Noise never matches a canned transcript, so each phrase costs framing plus a fake recognition.
+        command += ["--backend", "fake"]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as probe:
+                probe.sendall(b"GET /health HTTP/1.1\r\n\r\n")
+                if probe.recv(64).startswith(b"HTTP/1.1 200"):
+                    return server, port
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start within 60 seconds")
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description="Load-test the practice server with simulated learners.")
+    parser.add_argument("--server", help="host:port of a running server (default: spawn one locally)")
+    parser.add_argument("--csv", default="quran.csv", help="Quran text CSV for the learners' recitations")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 50, 100, 200],
+                        help="concurrent learners per round (default: 10 50 100 200)")
+    parser.add_argument("--ayahs", type=int, default=5, help="ayahs each learner recites")
+    parser.add_argument("--phrase-interval", type=float, default=0.5,
+                        help="seconds between a learner's phrases, roughly speaking pace (0 = flat out)")
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="p95 round-trip latency budget")
+    parser.add_argument("--workers", type=int, help="worker threads for a spawned server")
+    parser.add_argument("--audio-seconds", type=float, default=5.0,
+                        help="also run rounds sending binary PCM phrases this long (0 = transcripts only)")
+    parser.add_argument("--output", help="write the results JSON here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+    server = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        port = int(port)
+    else:
+        server, port = spawnServer(args)
+        host = "127.0.0.1"
+    
+    rounds = []
+    try:
+        with QuranCorpus.load(args.csv) as corpus:
+            roundAudio = [None]
+            if args.audio_seconds:
+                roundAudio.append(audioPhrase(args.audio_seconds, SEED))
+            for audio, sessionCount in [(audio, count) for audio in roundAudio for count in args.sessions]:
+                recitations = learnerRecitations(corpus, sessionCount, args.ayahs, SEED + sessionCount)
+                result = asyncio.run(runRound(host, port, recitations, args.phrase_interval, audio))
+                rounds.append(result)
+                print(
+                    f"{'audio' if result['audio'] else 'text':>5} {result['sessions']:>5} sessions  "
+                    f"{result['phrasesPerSec']:8.1f} phrases/s  "
+                    f"p50 {result['p50Ms']:7.1f} ms  p95 {result['p95Ms']:7.1f} ms  p99 {result['p99Ms']:7.1f} ms  "
+                    f"errors {result['errors']}"
+                )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    
+    cores = os.cpu_count() or 1
+    sessionsPerCore = {}
+    for kind in sorted({result["audio"] for result in rounds}):
+        withinBudget = [
+            result["sessions"] for result in rounds
+            if result["audio"] == kind and result["p95Ms"] <= args.budget_ms and not result["errors"]
+        ]
+        maxSessions = max(withinBudget, default=0)
+        label = "audio" if kind else "text"
+        sessionsPerCore[label] = maxSessions / cores
+        print(f"{label}: {maxSessions} concurrent sessions within p95 {args.budget_ms:.0f} ms on {cores} cores "
+              f"({maxSessions / cores:.1f} per core)")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as outputFile:
+            json.dump({"cores": cores, "budgetMs": args.budget_ms, "phraseInterval": args.phrase_interval,
+                       "sessionsPerCore": sessionsPerCore, "rounds": rounds}, outputFile, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Seeded, GUI-free benchmarks of corpus loading, normalization, recitation scoring,
+surah detection and verse location from Al-Fatiha to whole-Quran scale, with
+baselines for catching regressions
+"""
+
+import argparse
+import difflib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from arabic_text import normalizeArabic
+from bench_surah_resolver import noisyTranscripts
+from practice_session import SIMILARITY_THRESHOLD, PracticeSession
+from quran_corpus import QuranCorpus, buildCorpusFile
+from speech_backends import FakeBackend
+from surah_resolver import SurahNameResolver
+from synthetic_workload import SCALES, recitationWorkload, splitIntoPhrases, writeScaledCorpus
+from verse_locator import VerseLocator
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEED = 6236
+# Latency changes smaller than this are timer and scheduler noise, whatever the ratio.
+MIN_LATENCY_DELTA = {"Us": 50.0, "Ms": 2.0}
+# The character ratio's pass mark before the word aligner replaced it.
+CHARACTER_RATIO_THRESHOLD = 80
+# Share of near-threshold verdicts the word similarity must agree on with the character ratio.
+MIN_VERDICT_AGREEMENT = 0.9
+
+
+def latencyStats(latencies, unit=1e6, suffix="Us"):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    total = sum(latencies)
+    return {
+        "count": count,
+        "perSec": count / total if total else 0.0,
+        f"p50{suffix}": latencies[count // 2] * unit,
+        f"p99{suffix}": latencies[min(count - 1, int(count * 0.99))] * unit,
+    }
+
+
+def timeEach(function, inputs, rounds=3):
+    """Per-item latencies from the fastest of `rounds` passes, like timeit's best-of-N."""
+    best = None
+    for _ in range(rounds):
+        latencies = []
+        for item in inputs:
+            startTime = time.perf_counter()
+            function(item)
+            latencies.append(time.perf_counter() - startTime)
+        if best is None or sum(latencies) < sum(best):
+            best = latencies
+    return best
+
+
+def benchCorpusLoading(csvFilePath, corpusFilePath, repeat):
+    buildTimes, loadTimes = [], []
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        buildCorpusFile(csvFilePath, corpusFilePath)
+        buildTimes.append(time.perf_counter() - startTime)
+        
+        startTime = time.perf_counter()
+        with QuranCorpus(corpusFilePath) as corpus:
+            corpus.rowWords(len(corpus) - 1)
+        loadTimes.append(time.perf_counter() - startTime)
+    # Best of `repeat`: the minimum is the least disturbed by other processes.
+    return {"buildMs": min(buildTimes) * 1000, "loadMs": min(loadTimes) * 1000}
+
+
+def benchNormalize(workload):
+    return latencyStats(timeEach(normalizeArabic, [transcript for _, transcript in workload]))
+
+
+def benchScoring(corpus, workload, seed):
+    """
+    Feed each noisy ayah through a fake recognizer phrase by phrase, as the GUI
+    would; latencies are per ayah, from starting it to its last feedback.
+    """
+    rng = random.Random(seed)
+    session = PracticeSession(corpus)
+    recitations = [(corpus.rowAyah(row)[:2], splitIntoPhrases(transcript, rng)) for row, transcript in workload]
+    verdicts = {}
+    
+    def reciteAyah(recitation):
+        (surahNum, ayahNum), phrases = recitation
+        session.startSurah(surahNum, ayahNum, ayahNum)
+        recognizer = FakeBackend(phrases)
+        feedback = None
+        for _ in phrases:
+            _, feedback = session.submitTranscript(recognizer.transcribe(None))
+        verdicts[id(recitation)] = bool(feedback and session.verdict(feedback))
+    
+    phraseCount = sum(len(phrases) for _, phrases in recitations)
+    latencies = timeEach(reciteAyah, recitations)
+    stats = latencyStats(latencies)
+    stats["phrasesPerSec"] = phraseCount / sum(latencies)
+    stats["passRate"] = sum(verdicts.values()) / len(recitations)
+    return stats
+
+
+def benchSpanningPhrases(corpus, workload):
+    """
+    Recite each ayah cleanly followed by the first words of the next one, as a
+    fluent learner does. The ayah must still complete and the spill-over words
+    must carry into the next ayah, as transcribed.
+    """
+    session = PracticeSession(corpus)
+    spanning = []
+    for row, _ in workload:
+        surahNum, ayahNum, text = corpus.rowAyah(row)
+        if row + 1 < len(corpus) and corpus.rowAyah(row + 1)[0] == surahNum:
+            nextWords = corpus.rowText(row + 1).split()[:3]
+            spanning.append((surahNum, ayahNum, f"{text} {' '.join(nextWords)}", ' '.join(nextWords)))
+    
+    completed = carried = 0
+    for surahNum, ayahNum, phrase, nextText in spanning:
+        session.startSurah(surahNum, ayahNum)
+        _, feedback = session.submitTranscript(phrase)
+        if session.isAyahComplete(feedback):
+            completed += 1
+            session.markCompleted()
+            session.advance(carryOver=True)
+            carried += session.accumulatedRecitation == nextText
+    return {
+        "count": len(spanning),
+        "completeRate": completed / max(1, len(spanning)),
+        "carriedRate": carried / max(1, len(spanning)),
+    }
+
+
+def characterRatio(correctText, recitedText):
+    """The original scoring: difflib's ratio over diacritic-stripped text."""
+    def strip(text):
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+        return ' '.join(text.split()).lower()
+    return difflib.SequenceMatcher(None, strip(correctText), strip(recitedText)).ratio()
+
+
+def benchSimilarityCalibration(corpus, count, seed):
+    """
+    Compare the word similarity with the character ratio it replaced, on
+    transcripts noisy enough to land near the pass mark. The scores may differ,
+    but verdicts at SIMILARITY_THRESHOLD should agree with the old 80%.
+    """
+    session = PracticeSession(corpus)
+    differences = []
+    agreements = 0
+    for row, transcript in recitationWorkload(corpus, count, seed, dropRate=0.15, swapRate=0.15):
+        session.startRange(corpus.rowAyah(row)[:2], None)
+        _, feedback = session.submitTranscript(transcript)
+        wordScore = feedback.similarity * 100
+        characterScore = characterRatio(corpus.rowText(row), transcript) * 100
+        differences.append(abs(wordScore - characterScore))
+        agreements += (wordScore >= SIMILARITY_THRESHOLD) == (characterScore >= CHARACTER_RATIO_THRESHOLD)
+    return {
+        "count": len(differences),
+        "meanAbsDiff": sum(differences) / len(differences),
+        "maxAbsDiff": max(differences),
+        "verdictAgreement": agreements / len(differences),
+    }
+
+
+def benchSurahDetection(corpus, count, seed):
+    resolver = SurahNameResolver()
+    transcripts = noisyTranscripts(count, 0.15, seed)
+    detected = {}
+    latencies = timeEach(
+        lambda item: detected.__setitem__(item, resolver.bestMatch(item[1], corpus)), transcripts
+    )
+    stats = latencyStats(latencies)
+    # Only surahs present in the corpus can be detected; score accuracy over those.
+    available = [item for item in transcripts if item[0] in corpus]
+    stats["accuracy"] = sum(1 for item in available if detected[item] == item[0]) / max(1, len(available))
+    return stats
+
+
+def benchLocate(corpus, workload):
+    locator = VerseLocator(corpus)
+    startTime = time.perf_counter()
+    locator.build()
+    buildMs = (time.perf_counter() - startTime) * 1000
+    
+    found = {}
+    latencies = timeEach(lambda item: found.__setitem__(item[0], locator.locate(item[1], limit=1)), workload)
+    stats = latencyStats(latencies)
+    stats["buildMs"] = buildMs
+    # Scaled corpora repeat ayah text, so any ayah with the recited text counts as found.
+    stats["top1"] = sum(
+        1 for row, _ in workload
+        if found[row] and corpus.ayahText(found[row][0].surah, found[row][0].ayah) == corpus.rowText(row)
+    ) / len(workload)
+    return stats
+
+
+def runScale(csvFilePath, scale, workDirectory, samples, repeat):
+    scaledCsvPath = writeScaledCorpus(csvFilePath, scale, os.path.join(workDirectory, f"{scale}.csv"))
+    corpusFilePath = os.path.join(workDirectory, f"{scale}.corpus")
+    
+    results = {"corpus": benchCorpusLoading(scaledCsvPath, corpusFilePath, repeat)}
+    with QuranCorpus(corpusFilePath) as corpus:
+        workload = recitationWorkload(corpus, samples, SEED)
+        results["ayahs"] = len(corpus)
+        results["normalize"] = benchNormalize(workload)
+        results["scoring"] = benchScoring(corpus, workload, SEED)
+        results["spanning"] = benchSpanningPhrases(corpus, workload)
+        results["calibration"] = benchSimilarityCalibration(corpus, samples, SEED + 1)
+        results["surahDetection"] = benchSurahDetection(corpus, samples, SEED)
+        results["locate"] = benchLocate(corpus, workload)
+    return results
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def findRegressions(results, baseline, tolerance):
+    """Median latencies that grew, or throughput/accuracy that fell, by more than `tolerance`."""
+    regressions = []
+    current = flatten(results)
+    for key, baseValue in flatten(baseline).items():
+        value = current.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(baseValue, (int, float)) or not baseValue:
+            continue
+        metric = key.rsplit(".", 1)[-1]
+        if metric.startswith("p99"):
+            continue  # tail latency is reported, but too noisy on shared machines to gate on
+        unit = metric[-2:]
+        if unit in MIN_LATENCY_DELTA and value > max(baseValue * (1 + tolerance), baseValue + MIN_LATENCY_DELTA[unit]):
+            regressions.append(f"{key}: {baseValue:.1f} -> {value:.1f}")
+        elif metric in ("perSec", "phrasesPerSec", "accuracy", "top1", "passRate", "completeRate", "carriedRate") and value < baseValue * (1 - tolerance):
+            regressions.append(f"{key}: {baseValue:.3f} -> {value:.3f}")
+    for key, value in current.items():
+        if key.endswith(".verdictAgreement") and value < MIN_VERDICT_AGREEMENT:
+            regressions.append(f"{key}: {value:.3f} below {MIN_VERDICT_AGREEMENT:.2f}")
+    return regressions
+
+
+def printResults(results):
+    for scale, scaleResults in results["scales"].items():
+        print(f"== {scale} ({scaleResults['ayahs']} ayahs)")
+        for bench, stats in scaleResults.items():
+            if isinstance(stats, dict):
+                print(f"  {bench:<15}" + "  ".join(f"{key} {value:.4g}" for key, value in stats.items()))
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description="Run the recitation benchmark suite.")
+    parser.add_argument("--csv", default="quran.csv", help="Quran text CSV the synthetic corpora are drawn from")
+    parser.add_argument("--scales", nargs="+", choices=sorted(SCALES), default=["fatiha", "juz30", "quran"])
+    parser.add_argument("--samples", type=int, default=2000, help="noisy transcripts per scale")
+    parser.add_argument("--repeat", type=int, default=5, help="corpus build/load repetitions")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression (default 0.3)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+    workDirectory = tempfile.mkdtemp(prefix="quran-bench-")
+    try:
+        scales = {scale: runScale(args.csv, scale, workDirectory, args.samples, args.repeat) for scale in args.scales}
+    finally:
+        shutil.rmtree(workDirectory, ignore_errors=True)
+    
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "samples": args.samples,
+        "seed": SEED,
+        "scales": scales,
+    }
+    printResults(results)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as outputFile:
+            json.dump(results, outputFile, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baselineFile:
+            json.dump(results, baselineFile, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first.")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as baselineFile:
+        baseline = json.load(baselineFile)
+    regressions = findRegressions({"scales": scales}, {"scales": baseline.get("scales", {})}, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Synthetic Recitation Workloads
+Seeded corpora from Al-Fatiha to whole-Quran scale and ASR-style noisy transcripts of their ayahs
+"""
+
+import csv
+import itertools
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+
+# Ayahs per surah in the Hafs count; used to lay out whole-Quran sized corpora.
+AYAH_COUNTS = [
+    7, 286, 200, 176, 120, 165, 206, 75, 129, 109, 123, 111, 43, 52, 99, 128, 111, 110, 98, 135,
+    112, 78, 118, 64, 77, 227, 93, 88, 69, 60, 34, 30, 73, 54, 45, 83, 182, 88, 75, 85,
+    54, 53, 89, 59, 37, 35, 38, 29, 18, 45, 60, 49, 62, 55, 78, 96, 29, 22, 24, 13,
+    14, 11, 11, 18, 12, 12, 30, 52, 52, 44, 28, 28, 20, 56, 40, 31, 50, 40, 46, 42,
+    29, 19, 36, 25, 22, 17, 19, 26, 30, 20, 15, 21, 11, 8, 8, 19, 5, 8, 8, 11,
+    11, 8, 3, 9, 5, 4, 7, 3, 6, 3, 5, 4, 5, 6,
+]
+
+# Which surahs each scale covers: Al-Fatiha, the last juz, and the whole Quran.
+SCALES = {
+    "fatiha": [1],
+    "juz30": list(range(78, 115)),
+    "quran": list(range(1, 115)),
+}
+
+HARAKAT = "ًٌٍَُِّْ"
+HARAKAT_PATTERN = re.compile(f"[{HARAKAT}ٰ]")
+
+
+def readSourceRows(csvFilePath):
+    with open(csvFilePath, 'r', encoding='utf-8') as csvFile:
+        return [(int(row['surah']), int(row['ayah']), row['text'].strip())
+                for row in csv.DictReader(csvFile) if row.get('surah') and row.get('text')]
+
+
+def writeScaledCorpus(csvFilePath, scale, outputFilePath):
+    """
+    Lay out a corpus with the real ayah counts of the scale's surahs. Ayahs that
+    exist in the source CSV keep their text; the rest cycle through the source
+    ayahs, so word statistics stay Quranic even when quran.csv is partial.
+    """
+    sourceRows = readSourceRows(csvFilePath)
+    sourceText = {(surahNum, ayahNum): text for surahNum, ayahNum, text in sourceRows}
+    filler = itertools.cycle([text for _, _, text in sourceRows])
+    
+    with open(outputFilePath, 'w', encoding='utf-8', newline='') as outputFile:
+        writer = csv.writer(outputFile)
+        writer.writerow(["surah", "ayah", "text"])
+        for surahNum in SCALES[scale]:
+            for ayahNum in range(1, AYAH_COUNTS[surahNum - 1] + 1):
+                writer.writerow([surahNum, ayahNum, sourceText.get((surahNum, ayahNum)) or next(filler)])
+    return outputFilePath
+
+
+def addDiacriticNoise(word, rng):
+    """Strip a word's harakat, or drop a stray one after a random letter."""
+    if HARAKAT_PATTERN.search(word) and rng.random() < 0.5:
+        return HARAKAT_PATTERN.sub("", word)
+    position = rng.randrange(1, len(word) + 1)
+    return word[:position] + rng.choice(HARAKAT) + word[position:]
+
+
+def noisyTranscript(text, rng, dropRate=0.05, swapRate=0.05, diacriticRate=0.2):
+    """Apply dropped words, swapped neighbouring words and diacritic noise at the given rates."""
+    words = [word for word in text.split() if rng.random() >= dropRate] or text.split()[:1]
+    index = 0
+    while index < len(words) - 1:
+        if rng.random() < swapRate:
+            words[index], words[index + 1] = words[index + 1], words[index]
+            index += 1
+        index += 1
+    return " ".join(addDiacriticNoise(word, rng) if rng.random() < diacriticRate else word for word in words)
+
+
+def splitIntoPhrases(transcript, rng, minWords=2, maxWords=4):
+    """Chop a transcript into the short phrases a VAD-segmenting recognizer would return."""
+    words = transcript.split()
+    phrases = []
+    while words:
+        size = rng.randint(minWords, maxWords)
+        phrases.append(" ".join(words[:size]))
+        words = words[size:]
+    return phrases
+
+
+def recitationWorkload(corpus, count, seed, **noiseRates):
+    """(row, transcript) pairs for `count` randomly chosen ayahs of the corpus."""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(count):
+        row = rng.randrange(len(corpus))
+        workload.append((row, noisyTranscript(corpus.rowText(row), rng, **noiseRates)))
+    return workload
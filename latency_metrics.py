@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Latency Metrics
+Per-stage rolling latency histograms with JSON / Prometheus export, startup phase timing and an optional cProfile hook
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+PROFILE_ENV_VAR = "QURAN_PROFILE"
+STARTUP_TIMING_ENV_VAR = "QURAN_STARTUP_TIMING"
+DEFAULT_WINDOW = 1000
+# From 3.12 cProfile runs on sys.monitoring, which sees every thread but allows one profiler at a time.
+PROFILER_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+
+# Stages of the phrase -> feedback path, in order.
+PIPELINE_STAGES = (
+    "listen", "queueWait", "recognize", "sequencerWait",
+    "normalize", "align", "feedback", "uiQueue", "render", "endToEnd",
+)
+
+
+class RollingHistogram:
+    """Keeps the last `window` samples for percentiles plus lifetime count and sum."""
+    
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+    
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+    
+    def stats(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": self.count, "sumSeconds": self.total}
+        
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+        
+        return {
+            "count": self.count,
+            "sumSeconds": self.total,
+            "p50Ms": percentile(0.50),
+            "p95Ms": percentile(0.95),
+            "p99Ms": percentile(0.99),
+            "meanMs": sum(samples) / len(samples) * 1000,
+            "maxMs": samples[-1] * 1000,
+        }
+
+
+class LatencyMetrics:
+    """Thread-safe registry of stage histograms; record() is cheap enough to call per phrase."""
+    
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.histograms = {}
+        self.lock = threading.Lock()
+    
+    def record(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.window)
+            histogram.record(seconds)
+    
+    def recordSince(self, stage, startTime):
+        self.record(stage, time.perf_counter() - startTime)
+    
+    @contextmanager
+    def timed(self, stage):
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.recordSince(stage, startTime)
+    
+    def snapshot(self):
+        with self.lock:
+            stats = {stage: histogram.stats() for stage, histogram in self.histograms.items()}
+        order = {stage: index for index, stage in enumerate(PIPELINE_STAGES)}
+        return dict(sorted(stats.items(), key=lambda item: (order.get(item[0], len(order)), item[0])))
+    
+    def summary(self):
+        parts = []
+        for stage, stats in self.snapshot().items():
+            if "p50Ms" in stats:
+                parts.append(f"{stage} p50 {stats['p50Ms']:.1f} ms / p95 {stats['p95Ms']:.1f} ms")
+        return ", ".join(parts) or "no stages timed"
+    
+    def toJson(self):
+        return json.dumps({"generatedAt": time.time(), "stages": self.snapshot()}, indent=2)
+    
+    def toPrometheus(self, metricName="quran_stage_latency_seconds"):
+        lines = [
+            f"# HELP {metricName} Latency of each recitation pipeline stage.",
+            f"# TYPE {metricName} summary",
+        ]
+        for stage, stats in self.snapshot().items():
+            for quantile, key in (("0.5", "p50Ms"), ("0.95", "p95Ms"), ("0.99", "p99Ms")):
+                if key in stats:
+                    lines.append(f'{metricName}{{stage="{stage}",quantile="{quantile}"}} {stats[key] / 1000:.6f}')
+            lines.append(f'{metricName}_sum{{stage="{stage}"}} {stats["sumSeconds"]:.6f}')
+            lines.append(f'{metricName}_count{{stage="{stage}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+    
+    def export(self, outputFilePath):
+        """Write Prometheus text for .prom/.txt paths, JSON otherwise."""
+        if outputFilePath.endswith((".prom", ".txt")):
+            content = self.toPrometheus()
+        else:
+            content = self.toJson()
+        with open(outputFilePath, 'w', encoding='utf-8') as outputFile:
+            outputFile.write(content)
+
+
+class StartupTimer:
+    """
+    Start and end of each startup phase, in seconds since `origin` (normally the
+    moment the entry module started importing). Phases run on several threads
+    and overlap, so the report gives offsets as well as durations.
+    """
+    
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases = []
+        self.lock = threading.Lock()
+    
+    def record(self, phase, startTime, endTime=None):
+        endTime = time.perf_counter() if endTime is None else endTime
+        with self.lock:
+            self.phases.append((phase, startTime - self.origin, endTime - self.origin, threading.current_thread().name))
+    
+    @contextmanager
+    def phase(self, phase):
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, startTime)
+    
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda item: (item[1], item[2]))
+        lines = ["Startup phases (ms since launch):"]
+        for phase, start, end, threadName in phases:
+            lines.append(f"  {phase:<14}{start * 1000:8.1f} -> {end * 1000:8.1f}  {(end - start) * 1000:8.1f} ms  [{threadName}]")
+        return "\n".join(lines)
+
+
+def startupTimingMode():
+    """None, or the QURAN_STARTUP_TIMING value ('exit' quits once startup finishes)."""
+    return os.environ.get(STARTUP_TIMING_ENV_VAR) or None
+
+
+def profilePath():
+    return os.environ.get(PROFILE_ENV_VAR) or None
+
+
+def startProfiling():
+    """Enable cProfile on the calling thread when QURAN_PROFILE is set; returns the profiler or None."""
+    if not profilePath():
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        print(f"Warning: Could not start profiler: {str(e)}")
+        return None
+    return profiler
+
+
+def stopProfiling(profiler, suffix=None):
+    if profiler is None:
+        return
+    profiler.disable()
+    outputFilePath = profilePath() if suffix is None else f"{profilePath()}.{suffix}"
+    profiler.dump_stats(outputFilePath)
+    print(f"Profile written to {outputFilePath}")
+
+
+def profiledTarget(target, name):
+    """
+    Before Python 3.12 cProfile only sees the thread it was enabled on, so worker
+    threads get their own profiler, dumped next to the main one as
+    <QURAN_PROFILE>.<name>. From 3.12 the main profiler already covers them.
+    """
+    if not profilePath() or PROFILER_SEES_ALL_THREADS:
+        return target
+    
+    def run(*args, **kwargs):
+        profiler = startProfiling()
+        try:
+            return target(*args, **kwargs)
+        finally:
+            stopProfiling(profiler, suffix=name)
+    return run
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Practice Session Engine
+GUI-free session state: ayah progression, recitation alignment and pass/fail thresholds
+"""
+
+import threading
+import time
+
+from arabic_text import normalizeArabic, normalizedWordsWithSources, tokenizeArabic
+from quran_corpus import AyahSelection, AyahSequence
+from recitation_aligner import IncrementalAligner, wordWeight
+from recitation_diff import buildRecitationFeedback, wordSpans
+
+
+# Calibrated against the difflib character ratio the tool used to score with, which
+# passed at 80%: on noisy synthetic transcripts this is where the weighted word
+# similarity flips the fewest verdicts (see benchSimilarityCalibration).
+SIMILARITY_THRESHOLD = 80.2
+MIN_RECITED_LENGTH = 3
+PREFETCH_AYAHS = 3
+RANGE_WINDOW_SLACK = 10
+
+
+class PracticeSession:
+    """
+    Holds the ayah sequence being practiced and the aligner for the current ayah.
+    submitTranscript may be called from worker threads; everything else is meant
+    for the thread that drives the session (the Tk thread in the GUI).
+    """
+    
+    def __init__(self, corpus, threshold=SIMILARITY_THRESHOLD, correctBaseIndex="1.0", metrics=None):
+        self.corpus = corpus
+        self.threshold = threshold
+        self.correctBaseIndex = correctBaseIndex
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.clear()
+    
+    def clear(self):
+        with self.lock:
+            self.currentSurah = None
+            self.label = None
+            self.ayahList = []
+            self.currentAyahIndex = 0
+            self.accumulatedRecitation = ""
+            self.recitedSources = []
+            self.aligner = None
+            self.correctWordSpans = None
+            self.currentAyahCompleted = False
+    
+    def startSurah(self, surahNum, startAyah=None, endAyah=None, startWord=0):
+        """startWord skips the first ayah's opening words, for a learner who starts mid-ayah."""
+        if surahNum not in self.corpus:
+            return False
+        
+        startRow, endRow = self.corpus.surahRows(surahNum)
+        if startAyah is not None:
+            startRow = self.corpus.findRow(surahNum, startAyah)
+        if endAyah is not None:
+            lastRow = self.corpus.findRow(surahNum, endAyah)
+            endRow = lastRow + 1 if lastRow is not None else None
+        if startRow is None or endRow is None or startRow >= endRow:
+            return False
+        
+        self.clear()
+        self.label = f"Surah {surahNum}"
+        self.ayahList = AyahSequence(self.corpus, startRow, endRow, lookahead=PREFETCH_AYAHS)
+        self.beginAyah(firstWord=startWord)
+        return True
+    
+    def startAtLocation(self, located, recitedText):
+        """
+        Jump to a VerseLocator match: practice its surah from the located ayah and
+        word, and feed that ayah the recitation that located it, from the first
+        word the locator placed (so a leading basmala is left out). Returns the
+        (aligner, feedback) for those words, or None if the ayah is not found.
+        """
+        if not self.startSurah(located.surah, startAyah=located.ayah, startWord=located.wordOffset):
+            return None
+        _, sources = normalizedWordsWithSources(recitedText)
+        return self.submitTranscript(" ".join(recitedText.split()[sources[located.queryOffset]:]))
+    
+    def startRange(self, start, stop, label=None):
+        """
+        Practice from the (surah, ayah) start up to, not including, stop (None for
+        the end of the corpus). Ranges may cross surah boundaries.
+        """
+        startRow = self.corpus.rowAtOrAfter(*start)
+        endRow = len(self.corpus) if stop is None else self.corpus.rowAtOrAfter(*stop)
+        if startRow >= endRow:
+            return False
+        
+        self.clear()
+        self.label = label or f"{start[0]}:{start[1]} onwards"
+        self.ayahList = AyahSequence(self.corpus, startRow, endRow, lookahead=PREFETCH_AYAHS)
+        self.beginAyah()
+        return True
+    
+    def startRows(self, surahNum, rows):
+        """Practice an explicit list of corpus rows, e.g. a spaced-repetition queue."""
+        if not rows:
+            return False
+        
+        self.clear()
+        self.label = f"Surah {surahNum}"
+        self.ayahList = AyahSelection(self.corpus, rows, lookahead=PREFETCH_AYAHS)
+        self.beginAyah()
+        return True
+    
+    def currentAyah(self):
+        if self.isFinished():
+            return None
+        return self.ayahList[self.currentAyahIndex]
+    
+    def isFinished(self):
+        return self.currentAyahIndex >= len(self.ayahList)
+    
+    def beginAyah(self, carryOver=False, firstWord=0):
+        """
+        Set up the aligner for the current ayah. With carryOver, words recited past
+        the end of the previous ayah are replayed into the new one, under the same
+        lock, so a phrase spanning two ayahs is not lost when the session advances.
+        The new ayah's recited text starts with the carried words as transcribed.
+        firstWord drops the ayah's opening words from what is judged.
+        """
+        with self.lock:
+            overflow, overflowText, overflowSources = [], "", []
+            if carryOver and self.aligner:
+                scoredWords = self.aligner.result().scoredWords
+                overflow = self.aligner.recitedWords[scoredWords:]
+                if overflow:
+                    firstSource = self.recitedSources[scoredWords]
+                    overflowText = " ".join(self.accumulatedRecitation.split()[firstSource:])
+                    overflowSources = [source - firstSource for source in self.recitedSources[scoredWords:]]
+            self.accumulatedRecitation = ""
+            self.recitedSources = []
+            self.currentAyahCompleted = False
+            if self.isFinished():
+                self.aligner = None
+                self.correctWordSpans = None
+                return
+            self.currentSurah, _, text = self.ayahList[self.currentAyahIndex]
+            self.aligner = IncrementalAligner(
+                self.ayahList.words(self.currentAyahIndex)[firstWord:],
+                self.ayahList.wordKeys(self.currentAyahIndex)[firstWord:]
+            )
+            spans = wordSpans(text)
+            self.correctWordSpans = spans[firstWord:] if spans is not None else None
+            self.ayahList.prefetch(self.currentAyahIndex + 1)
+            if overflow:
+                self.accumulatedRecitation = overflowText
+                self.recitedSources = overflowSources
+                self.aligner.extend(overflow)
+    
+    def resetRecitation(self):
+        with self.lock:
+            self.accumulatedRecitation = ""
+            self.recitedSources = []
+            if self.aligner:
+                self.aligner.reset()
+    
+    def submitTranscript(self, newText):
+        """Extend the current ayah's alignment; returns (aligner, feedback) or (None, None)."""
+        normalizeStart = time.perf_counter()
+        newWords, newSources = normalizedWordsWithSources(newText)
+        alignStart = time.perf_counter()
+        
+        with self.lock:
+            sourceOffset = len(self.accumulatedRecitation.split())
+            self.recitedSources.extend(sourceOffset + source for source in newSources)
+            if self.accumulatedRecitation:
+                self.accumulatedRecitation += " " + newText
+            else:
+                self.accumulatedRecitation = newText
+            
+            aligner = self.aligner
+            if aligner is None:
+                return None, None
+            alignment = aligner.extend(newWords)
+            recitedLength = aligner.recitedLength()
+            recitedText = self.accumulatedRecitation
+            correctWordSpans = self.correctWordSpans
+        
+        feedbackStart = time.perf_counter()
+        feedback = buildRecitationFeedback(alignment, recitedLength, correctWordSpans, self.correctBaseIndex, recitedText)
+        if self.metrics:
+            self.metrics.record("normalize", alignStart - normalizeStart)
+            self.metrics.record("align", feedbackStart - alignStart)
+            self.metrics.recordSince("feedback", feedbackStart)
+        return aligner, feedback
+    
+    def currentFeedback(self):
+        """(aligner, feedback, recitedText) for what has been recited of the current ayah so far."""
+        with self.lock:
+            aligner = self.aligner
+            if aligner is None or not aligner.recitedWords:
+                return None, None, self.accumulatedRecitation
+            alignment = aligner.result()
+            recitedLength = aligner.recitedLength()
+            recitedText = self.accumulatedRecitation
+            correctWordSpans = self.correctWordSpans
+        feedback = buildRecitationFeedback(alignment, recitedLength, correctWordSpans, self.correctBaseIndex, recitedText)
+        return aligner, feedback, recitedText
+    
+    def isCurrent(self, aligner):
+        return aligner is not None and aligner is self.aligner and not self.isFinished()
+    
+    def verdict(self, feedback):
+        """True if the recitation passes, False if it fails, None if too short to judge."""
+        if feedback.recitedLength < MIN_RECITED_LENGTH:
+            return None
+        return feedback.similarity * 100 >= self.threshold
+    
+    def prefixVerdict(self, feedback):
+        """Like verdict, but judges only the part of the ayah recited so far."""
+        if feedback.recitedLength < MIN_RECITED_LENGTH:
+            return None
+        return feedback.prefixSimilarity * 100 >= self.threshold
+    
+    def isAyahComplete(self, feedback):
+        """The ayah's last word has been aligned and the whole recitation passes."""
+        return feedback.reachedEnd and bool(self.verdict(feedback))
+    
+    def markCompleted(self):
+        if self.currentAyahCompleted:
+            return False
+        self.currentAyahCompleted = True
+        return True
+    
+    def advance(self, carryOver=False):
+        with self.lock:
+            self.currentAyahIndex += 1
+        self.beginAyah(carryOver)
+        return not self.isFinished()
+    
+    def scoreCurrentAyah(self, transcript):
+        """Score a complete transcript of the current ayah as a JSON-ready dict."""
+        self.resetRecitation()
+        aligner, feedback = self.submitTranscript(transcript)
+        score = self.ayahScore(aligner, feedback)
+        score["transcript"] = transcript
+        return score
+    
+    def ayahScore(self, aligner, feedback):
+        """Summarize the current ayah's alignment as a JSON-ready dict."""
+        surahNum, ayahNum, _ = self.currentAyah()
+        missingWords, extraWords = [], []
+        for tag, correctStart, correctEnd, recitedStart, recitedEnd in feedback.opcodes:
+            if tag in ("missing", "pending", "substituted"):
+                missingWords.extend(aligner.correctWords[correctStart:correctEnd])
+            if tag in ("extra", "substituted"):
+                extraWords.extend(aligner.recitedWords[recitedStart:recitedEnd])
+        
+        return {
+            "surah": surahNum,
+            "ayah": ayahNum,
+            "similarity": round(feedback.similarity * 100, 1),
+            "passed": bool(self.verdict(feedback)),
+            "missingWords": missingWords,
+            "extraWords": extraWords,
+        }
+
+
+def scoreRecitedRange(corpus, surahNum, startAyah, endAyah, transcript, threshold=SIMILARITY_THRESHOLD):
+    """
+    Score one transcript covering several consecutive ayahs, e.g. a whole recorded
+    recitation. Each ayah is aligned against a window of the transcript starting
+    where the previous ayah's best-covering words ended, so time and memory grow
+    linearly with the range instead of with range words x transcript words.
+    """
+    startRow = corpus.findRow(surahNum, startAyah)
+    endRow = corpus.findRow(surahNum, endAyah)
+    if startRow is None or endRow is None or startRow > endRow:
+        raise ValueError(f"Ayah range {surahNum}:{startAyah}-{endAyah} not found")
+    
+    recitedWords = tokenizeArabic(normalizeArabic(transcript))
+    recitedTotal = sum(wordWeight(word) for word in recitedWords)
+    correctTotal = matchedTotal = 0
+    cursor = 0
+    ayahScores = []
+    missingWords = []
+    for row in range(startRow, endRow + 1):
+        words = corpus.rowWords(row)
+        aligner = IncrementalAligner(words, corpus.rowWordKeys(row))
+        # Twice the ayah's length leaves room for repeated and inserted words.
+        aligner.extend(recitedWords[cursor:cursor + 2 * len(words) + RANGE_WINDOW_SLACK])
+        recitedCount = aligner.bestRecitedCount()
+        matches, _ = aligner.backtrack(recitedCount)
+        correctTotal += aligner.correctTotal
+        matchedTotal += aligner.matchedWeight(recitedCount)
+        # A skipped ayah consumes nothing, so the next ayah is searched from the same place.
+        cursor += recitedCount
+        
+        totalWeight = sum(wordWeight(word) for word in words)
+        matchedWeight = sum(wordWeight(word) for word, matched in zip(words, matches) if matched)
+        missing = [word for word, matched in zip(words, matches) if not matched]
+        coverage = matchedWeight / totalWeight * 100 if totalWeight else 100.0
+        ayahScores.append({
+            "ayah": corpus.rowAyah(row)[1],
+            "coverage": round(coverage, 1),
+            "passed": coverage >= threshold,
+            "missingWords": missing,
+        })
+        missingWords.extend(missing)
+    
+    similarity = 2.0 * matchedTotal / (correctTotal + recitedTotal) if correctTotal + recitedTotal else 1.0
+    return {
+        "surah": surahNum,
+        "startAyah": startAyah,
+        "endAyah": endAyah,
+        "similarity": round(similarity * 100, 1),
+        "passed": similarity * 100 >= threshold,
+        "missingWords": missingWords,
+        "ayahs": ayahScores,
+        "transcript": transcript,
+    }
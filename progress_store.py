@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Progress Store
+SQLite history of per-ayah attempts with an SM-2 review schedule on top
+"""
+
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_PROGRESS_PATH = "progress.db"
+DEFAULT_LEARNER = "default"
+DAY_SECONDS = 86400
+RELEARN_DELAY_SECONDS = 600
+INITIAL_EASINESS = 2.5
+MIN_EASINESS = 1.3
+NEW_AYAH_LIMIT = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    learner TEXT NOT NULL,
+    surah INTEGER NOT NULL,
+    ayah INTEGER NOT NULL,
+    similarity REAL NOT NULL,
+    passed INTEGER NOT NULL,
+    attemptedAt REAL NOT NULL,
+    errorWords TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS attemptsByAyah ON attempts (learner, surah, ayah, attemptedAt);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    learner TEXT NOT NULL,
+    surah INTEGER NOT NULL,
+    ayah INTEGER NOT NULL,
+    repetitions INTEGER NOT NULL,
+    easiness REAL NOT NULL,
+    intervalDays REAL NOT NULL,
+    lapses INTEGER NOT NULL,
+    dueAt REAL NOT NULL,
+    lastReviewedAt REAL NOT NULL,
+    PRIMARY KEY (learner, surah, ayah)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS reviewsByDue ON reviews (learner, dueAt);
+CREATE INDEX IF NOT EXISTS reviewsBySurahDue ON reviews (learner, surah, dueAt);
+"""
+
+
+def reviewQuality(similarity, passed):
+    """Map a 0-100 similarity and pass/fail verdict onto the SM-2 0-5 grade."""
+    if not passed:
+        if similarity >= 50:
+            return 2
+        return 1 if similarity >= 25 else 0
+    if similarity >= 95:
+        return 5
+    return 4 if similarity >= 90 else 3
+
+
+def scheduleReview(repetitions, easiness, intervalDays, lapses, quality, now):
+    """One SM-2 step; returns the new (repetitions, easiness, intervalDays, lapses, dueAt)."""
+    easiness = max(MIN_EASINESS, easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0, easiness, 0.0, lapses + 1, now + RELEARN_DELAY_SECONDS
+    
+    if repetitions == 0:
+        intervalDays = 1.0
+    elif repetitions == 1:
+        intervalDays = 6.0
+    else:
+        intervalDays = round(intervalDays * easiness, 2)
+    return repetitions + 1, easiness, intervalDays, lapses, now + intervalDays * DAY_SECONDS
+
+
+class ProgressStore:
+    """
+    Attempts are append-only; the reviews table keeps the current SM-2 state per
+    ayah so scheduling never replays history. Both tables are indexed for the
+    per-ayah and due-date lookups, which keeps queries fast with full-Quran
+    histories. Safe to share between threads.
+    """
+    
+    def __init__(self, databasePath=DEFAULT_PROGRESS_PATH, learner=DEFAULT_LEARNER):
+        self.databasePath = databasePath
+        self.learner = learner
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(databasePath, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *excInfo):
+        self.close()
+    
+    def recordAttempt(self, surahNum, ayahNum, similarity, passed, errorWords=(), attemptedAt=None):
+        """Store one attempt and advance the ayah's review schedule; returns the next due time."""
+        now = time.time() if attemptedAt is None else attemptedAt
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO attempts (learner, surah, ayah, similarity, passed, attemptedAt, errorWords)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.learner, surahNum, ayahNum, similarity, int(bool(passed)), now, " ".join(errorWords))
+            )
+            row = self.connection.execute(
+                "SELECT repetitions, easiness, intervalDays, lapses FROM reviews"
+                " WHERE learner = ? AND surah = ? AND ayah = ?",
+                (self.learner, surahNum, ayahNum)
+            ).fetchone()
+            repetitions, easiness, intervalDays, lapses = row or (0, INITIAL_EASINESS, 0.0, 0)
+            repetitions, easiness, intervalDays, lapses, dueAt = scheduleReview(
+                repetitions, easiness, intervalDays, lapses, reviewQuality(similarity, passed), now
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO reviews"
+                " (learner, surah, ayah, repetitions, easiness, intervalDays, lapses, dueAt, lastReviewedAt)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.learner, surahNum, ayahNum, repetitions, easiness, intervalDays, lapses, dueAt, now)
+            )
+        return dueAt
+    
+    def dueAyahs(self, surahNum=None, limit=50, now=None):
+        """(surah, ayah) pairs whose review is due, most overdue first."""
+        now = time.time() if now is None else now
+        with self.lock:
+            if surahNum is None:
+                rows = self.connection.execute(
+                    "SELECT surah, ayah FROM reviews WHERE learner = ? AND dueAt <= ? ORDER BY dueAt LIMIT ?",
+                    (self.learner, now, limit)
+                ).fetchall()
+            else:
+                rows = self.connection.execute(
+                    "SELECT surah, ayah FROM reviews WHERE learner = ? AND surah = ? AND dueAt <= ?"
+                    " ORDER BY dueAt LIMIT ?",
+                    (self.learner, surahNum, now, limit)
+                ).fetchall()
+        return rows
+    
+    def reviewedAyahs(self, surahNum):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT ayah FROM reviews WHERE learner = ? AND surah = ?", (self.learner, surahNum)
+            ).fetchall()
+        return {ayahNum for (ayahNum,) in rows}
+    
+    def attemptHistory(self, surahNum, ayahNum, limit=20):
+        """Most recent attempts at one ayah as (attemptedAt, similarity, passed, errorWords)."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT attemptedAt, similarity, passed, errorWords FROM attempts"
+                " WHERE learner = ? AND surah = ? AND ayah = ? ORDER BY attemptedAt DESC LIMIT ?",
+                (self.learner, surahNum, ayahNum, limit)
+            ).fetchall()
+        return [(attemptedAt, similarity, bool(passed), errorWords.split())
+                for attemptedAt, similarity, passed, errorWords in rows]
+    
+    def practiceQueue(self, corpus, surahNum, newAyahLimit=NEW_AYAH_LIMIT, now=None):
+        """
+        Corpus rows to practice for a surah: due reviews first, then up to
+        newAyahLimit ayahs never attempted, in mushaf order.
+        """
+        rows = []
+        for _, ayahNum in self.dueAyahs(surahNum, limit=corpus.ayahCount(surahNum), now=now):
+            row = corpus.findRow(surahNum, ayahNum)
+            if row is not None:
+                rows.append(row)
+        
+        reviewed = self.reviewedAyahs(surahNum)
+        startRow, endRow = corpus.surahRows(surahNum)
+        newRows = 0
+        for row in range(startRow, endRow):
+            if newRows >= newAyahLimit:
+                break
+            if corpus.rowAyah(row)[1] not in reviewed:
+                rows.append(row)
+                newRows += 1
+        return rows
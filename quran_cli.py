@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Quran Memorization Practice CLI
+Headless scoring of transcripts or WAV recordings, one JSON line per ayah
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from latency_metrics import LatencyMetrics, startProfiling, stopProfiling
+from practice_session import SIMILARITY_THRESHOLD, PracticeSession
+from progress_store import ProgressStore
+from quran_corpus import QuranCorpus
+from quran_divisions import parseRangeSpec
+from recognition_cache import CACHE_ENV_VAR, withRecognitionCache
+from speech_backends import BackendUnavailableError, UnknownSpeechError, createBackend, loadAudioFile
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description="Score Quran recitations without the GUI.")
+    targetGroup = parser.add_mutually_exclusive_group(required=True)
+    targetGroup.add_argument("--surah", type=int, help="surah number to practice")
+    targetGroup.add_argument("--range", help="'juz 30', 'hizb 5', 'page 1' or '2:255-3:10' (may cross surahs)")
+    parser.add_argument("--start-ayah", type=int, help="first ayah of the range (default: 1)")
+    parser.add_argument("--end-ayah", type=int, help="last ayah of the range (default: end of surah)")
+    inputGroup = parser.add_mutually_exclusive_group(required=True)
+    inputGroup.add_argument("--transcripts", help="text file with one transcript per ayah ('-' for stdin)")
+    inputGroup.add_argument("--wav", nargs="+", help="WAV files (or a directory of them), one per ayah in order")
+    parser.add_argument("--backend", help="speech backend for --wav (google, vosk, whisper, fake)")
+    parser.add_argument("--model", help="model path or name for the speech backend")
+    parser.add_argument("--cache", help=f"SQLite recognition cache so re-scored files skip recognition (default: ${CACHE_ENV_VAR})")
+    parser.add_argument("--csv", default="quran.csv", help="Quran text CSV (default: quran.csv)")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="pass threshold in percent")
+    parser.add_argument("--progress", help="SQLite progress database to record attempts in")
+    parser.add_argument("--metrics", help="write per-stage latency stats here (.prom for Prometheus text, else JSON)")
+    parser.add_argument("--due", action="store_true", help="practice the surah's due review queue (needs --progress)")
+    return parser.parse_args(argv)
+
+
+def readTranscripts(transcriptFilePath):
+    if transcriptFilePath == "-":
+        return [line.strip() for line in sys.stdin]
+    with open(transcriptFilePath, 'r', encoding='utf-8') as transcriptFile:
+        return [line.strip() for line in transcriptFile]
+
+
+def expandAudioPaths(paths):
+    audioFilePaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            audioFilePaths.extend(sorted(glob.glob(os.path.join(path, "*.wav"))))
+        else:
+            audioFilePaths.append(path)
+    return audioFilePaths
+
+
+def recognizeAudioFiles(audioFilePaths, backend, metrics=None):
+    for audioFilePath in audioFilePaths:
+        startTime = time.perf_counter()
+        try:
+            transcript = backend.transcribe(loadAudioFile(audioFilePath), ("ar-SA",))
+        except UnknownSpeechError:
+            transcript = ""
+        if metrics:
+            metrics.recordSince("recognize", startTime)
+        yield transcript, {"audio": audioFilePath, "recognitionMs": round((time.perf_counter() - startTime) * 1000, 1)}
+
+
+def runSession(session, inputs, output, progressStore=None):
+    scores = []
+    for transcript, extra in inputs:
+        if session.isFinished():
+            break
+        score = session.scoreCurrentAyah(transcript)
+        score.update(extra)
+        output.write(json.dumps(score, ensure_ascii=False) + "\n")
+        output.flush()
+        scores.append(score)
+        if progressStore:
+            progressStore.recordAttempt(
+                score["surah"], score["ayah"], score["similarity"], score["passed"], score["missingWords"]
+            )
+        session.advance()
+    return scores
+
+
+def main(argv=None):
+    profiler = startProfiling()
+    try:
+        return runCli(parseArguments(argv))
+    finally:
+        stopProfiling(profiler)
+
+
+def runCli(args):
+    if not os.path.exists(args.csv):
+        print(f"Error: File {args.csv} not found.", file=sys.stderr)
+        return 2
+    
+    if args.due and not (args.progress and args.surah):
+        print("Error: --due needs --surah and a --progress database", file=sys.stderr)
+        return 2
+    if args.range:
+        try:
+            rangeStart, rangeStop, rangeLabel = parseRangeSpec(args.range)
+        except ValueError as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            return 2
+    progressStore = ProgressStore(args.progress) if args.progress else None
+    metrics = LatencyMetrics() if args.metrics else None
+    
+    with QuranCorpus.load(args.csv) as corpus:
+        session = PracticeSession(corpus, threshold=args.threshold, metrics=metrics)
+        if args.range:
+            started = session.startRange(rangeStart, rangeStop, rangeLabel)
+        elif args.due:
+            started = session.startRows(args.surah, progressStore.practiceQueue(corpus, args.surah))
+        else:
+            started = session.startSurah(args.surah, args.start_ayah, args.end_ayah)
+        if not started:
+            print(f"Error: {args.range or f'Surah {args.surah}'} range not found in {args.csv}", file=sys.stderr)
+            return 2
+        
+        if args.transcripts:
+            inputs = ((transcript, {}) for transcript in readTranscripts(args.transcripts))
+        else:
+            try:
+                backend = withRecognitionCache(createBackend(args.backend, model=args.model), args.cache)
+                backend.load()
+            except (BackendUnavailableError, ValueError) as e:
+                print(f"Error: {str(e)}", file=sys.stderr)
+                return 2
+            inputs = recognizeAudioFiles(expandAudioPaths(args.wav), backend, metrics)
+        
+        scores = runSession(session, inputs, sys.stdout, progressStore)
+        if args.wav:
+            print(f"Recognition - {backend.latencySummary()}", file=sys.stderr)
+    if progressStore:
+        progressStore.close()
+    if metrics:
+        metrics.export(args.metrics)
+    
+    passed = sum(1 for score in scores if score["passed"])
+    print(f"{passed}/{len(scores)} ayahs passed", file=sys.stderr)
+    return 0 if scores and passed == len(scores) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
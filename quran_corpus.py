@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Quran Corpus Store
+Compact binary corpus built once from quran.csv and memory-mapped at runtime
+"""
+
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from arabic_text import normalizeArabic, phoneticKey, tokenizeArabic
+
+
+CORPUS_MAGIC = b"QRNCORP4"
+CORPUS_HEADER = struct.Struct("<8sBxxxIIIIQQ")
+SURAH_COUNT = 114
+
+
+class AyahSequence:
+    """
+    Read-only sequence of (surah, ayah, text) tuples decoded on access. With a
+    lookahead, prefetch(i) decodes the next few ayahs' words and phonetic keys ahead of time into
+    a small window that slides with the session, so memory stays constant
+    however long the range is.
+    """
+    
+    def __init__(self, corpus, startRow, endRow, lookahead=0):
+        self.corpus = corpus
+        self.startRow = startRow
+        self.endRow = endRow
+        self.lookahead = lookahead
+        self.prefetchedWords = {}
+    
+    def __len__(self):
+        return self.endRow - self.startRow
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return AyahSequence(self.corpus, self.startRow + start, self.startRow + max(start, stop))
+        
+        return self.corpus.rowAyah(self._row(index))
+    
+    def __iter__(self):
+        for row in range(self.startRow, self.endRow):
+            yield self.corpus.rowAyah(row)
+    
+    def _row(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ayah index out of range")
+        return self.startRow + index
+    
+    def normalizedText(self, index):
+        return self.corpus.rowNormalizedText(self._row(index))
+    
+    def words(self, index):
+        return self._wordsAndKeys(index)[0]
+    
+    def wordKeys(self, index):
+        return self._wordsAndKeys(index)[1]
+    
+    def _wordsAndKeys(self, index):
+        row = self._row(index)
+        return self.prefetchedWords.get(row) or (self.corpus.rowWords(row), self.corpus.rowWordKeys(row))
+    
+    def prefetch(self, index):
+        """Decode words and keys for ayahs index..index+lookahead and drop everything outside that window."""
+        window = {}
+        for ahead in range(index, min(index + self.lookahead + 1, len(self))):
+            row = self._row(ahead)
+            window[row] = self.prefetchedWords.get(row) or (self.corpus.rowWords(row), self.corpus.rowWordKeys(row))
+        self.prefetchedWords = window
+
+
+class AyahSelection(AyahSequence):
+    """Like AyahSequence, but over an arbitrary list of corpus rows (e.g. a review queue)."""
+    
+    def __init__(self, corpus, rows, lookahead=0):
+        self.corpus = corpus
+        self.rows = list(rows)
+        self.lookahead = lookahead
+        self.prefetchedWords = {}
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return AyahSelection(self.corpus, self.rows[index])
+        return self.corpus.rowAyah(self._row(index))
+    
+    def __iter__(self):
+        for row in self.rows:
+            yield self.corpus.rowAyah(row)
+    
+    def _row(self, index):
+        return self.rows[index]
+
+
+class QuranCorpus:
+    """
+    Memory-mapped corpus file layout (native byte order, 4-byte aligned):
+    header, surah row index (116 x uint32), row surah numbers (uint8),
+    row ayah numbers (uint16), text offsets (rows + 1 x uint32),
+    normalized text offsets (rows + 1 x uint32), row word index (rows + 1 x uint32),
+    word start offsets (words x uint32), UTF-8 text blob, normalized UTF-8 blob,
+    phonetic key blob. Phonetic keys swap letters one for one within the Arabic
+    block, so the key blob is byte-for-byte parallel to the normalized blob and
+    shares its offsets; keys are computed once when the file is built.
+    """
+    
+    def __init__(self, corpusFilePath):
+        self.corpusFilePath = corpusFilePath
+        self._file = open(corpusFilePath, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        
+        magic, byteOrder, rowCount, textLength, normalizedLength, wordCount, _, _ = (
+            CORPUS_HEADER.unpack_from(self._map, 0)
+        )
+        if magic != CORPUS_MAGIC or byteOrder != _byteOrderFlag():
+            self.close()
+            raise ValueError(f"{corpusFilePath} is not a compatible corpus file")
+        
+        view = memoryview(self._map)
+        offset = CORPUS_HEADER.size
+        self._surahIndex, offset = _castSection(view, offset, 'I', SURAH_COUNT + 2)
+        self._rowSurahs, offset = _castSection(view, offset, 'B', rowCount)
+        self._rowAyahs, offset = _castSection(view, offset, 'H', rowCount)
+        self._textOffsets, offset = _castSection(view, offset, 'I', rowCount + 1)
+        self._normalizedOffsets, offset = _castSection(view, offset, 'I', rowCount + 1)
+        self._rowWordIndex, offset = _castSection(view, offset, 'I', rowCount + 1)
+        self._wordOffsets, offset = _castSection(view, offset, 'I', wordCount)
+        self._text = view[offset:offset + textLength]
+        offset += textLength
+        self._normalizedText = view[offset:offset + normalizedLength]
+        offset += normalizedLength
+        self._keyText = view[offset:offset + normalizedLength]
+        self.rowCount = rowCount
+    
+    @classmethod
+    def load(cls, csvFilePath, corpusFilePath=None):
+        if corpusFilePath is not None:
+            if isCorpusStale(csvFilePath, corpusFilePath):
+                buildCorpusFile(csvFilePath, corpusFilePath)
+            return cls(corpusFilePath)
+        
+        corpusFilePath = defaultCorpusPath(csvFilePath)
+        if isCorpusStale(csvFilePath, corpusFilePath):
+            try:
+                buildCorpusFile(csvFilePath, corpusFilePath)
+            except OSError:
+                # e.g. a read-only install directory: keep the built corpus in the temp directory.
+                corpusFilePath = fallbackCorpusPath(csvFilePath)
+                if isCorpusStale(csvFilePath, corpusFilePath):
+                    buildCorpusFile(csvFilePath, corpusFilePath)
+        return cls(corpusFilePath)
+    
+    def close(self):
+        for name in ('_surahIndex', '_rowSurahs', '_rowAyahs', '_textOffsets', '_normalizedOffsets',
+                     '_rowWordIndex', '_wordOffsets', '_text', '_normalizedText', '_keyText'):
+            section = self.__dict__.pop(name, None)
+            if section is not None:
+                section.release()
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *excInfo):
+        self.close()
+    
+    def __len__(self):
+        return self.rowCount
+    
+    def __contains__(self, surahNum):
+        return self.ayahCount(surahNum) > 0
+    
+    def surahNumbers(self):
+        return [surahNum for surahNum in range(1, SURAH_COUNT + 1) if surahNum in self]
+    
+    def surahCount(self):
+        return len(self.surahNumbers())
+    
+    def surahRows(self, surahNum):
+        if not isinstance(surahNum, int) or not 1 <= surahNum <= SURAH_COUNT:
+            return 0, 0
+        return self._surahIndex[surahNum], self._surahIndex[surahNum + 1]
+    
+    def ayahCount(self, surahNum):
+        startRow, endRow = self.surahRows(surahNum)
+        return endRow - startRow
+    
+    def findRow(self, surahNum, ayahNum):
+        startRow, endRow = self.surahRows(surahNum)
+        guess = startRow + ayahNum - 1
+        if startRow <= guess < endRow and self._rowAyahs[guess] == ayahNum:
+            return guess
+        
+        low, high = startRow, endRow
+        while low < high:
+            middle = (low + high) // 2
+            if self._rowAyahs[middle] < ayahNum:
+                low = middle + 1
+            else:
+                high = middle
+        if low < endRow and self._rowAyahs[low] == ayahNum:
+            return low
+        return None
+    
+    def rowAtOrAfter(self, surahNum, ayahNum):
+        """First row at or after (surah, ayah) in mushaf order; len(self) past the end."""
+        if surahNum > SURAH_COUNT:
+            return self.rowCount
+        if surahNum < 1:
+            return 0
+        low, high = self.surahRows(surahNum)
+        while low < high:
+            middle = (low + high) // 2
+            if self._rowAyahs[middle] < ayahNum:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def rowText(self, row):
+        return str(self._text[self._textOffsets[row]:self._textOffsets[row + 1]], 'utf-8')
+    
+    def rowNormalizedText(self, row):
+        return str(self._normalizedText[self._normalizedOffsets[row]:self._normalizedOffsets[row + 1]], 'utf-8')
+    
+    def rowWords(self, row):
+        return self._rowWordsFrom(self._normalizedText, row)
+    
+    def rowWordKeys(self, row):
+        """Phonetic keys of the row's normalized words (see arabic_text.phoneticKey)."""
+        return self._rowWordsFrom(self._keyText, row)
+    
+    def _rowWordsFrom(self, blob, row):
+        words = []
+        rowEnd = self._normalizedOffsets[row + 1]
+        firstWord, endWord = self._rowWordIndex[row], self._rowWordIndex[row + 1]
+        for wordIndex in range(firstWord, endWord):
+            wordEnd = self._wordOffsets[wordIndex + 1] - 1 if wordIndex + 1 < endWord else rowEnd
+            words.append(str(blob[self._wordOffsets[wordIndex]:wordEnd], 'utf-8'))
+        return tuple(words)
+    
+    def rowAyah(self, row):
+        return (self._rowSurahs[row], self._rowAyahs[row], self.rowText(row))
+    
+    def ayahText(self, surahNum, ayahNum):
+        row = self.findRow(surahNum, ayahNum)
+        if row is None:
+            return None
+        return self.rowText(row)
+    
+    def surahAyahs(self, surahNum):
+        startRow, endRow = self.surahRows(surahNum)
+        return AyahSequence(self, startRow, endRow)
+
+
+def defaultCorpusPath(csvFilePath):
+    return os.path.splitext(csvFilePath)[0] + ".corpus"
+
+
+def fallbackCorpusPath(csvFilePath):
+    """Per-CSV corpus path in the temp directory, for when the CSV's own directory is not writable."""
+    sourceId = hashlib.sha1(os.path.abspath(csvFilePath).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"quran-{sourceId}.corpus")
+
+
+def _byteOrderFlag():
+    return 1 if sys.byteorder == "little" else 2
+
+
+def _sourceStamp(csvFilePath):
+    stat = os.stat(csvFilePath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _castSection(view, offset, typecode, count):
+    itemSize = array(typecode).itemsize
+    end = offset + itemSize * count
+    section = view[offset:end].cast(typecode)
+    return section, _align(end)
+
+
+def _align(offset, boundary=4):
+    return (offset + boundary - 1) // boundary * boundary
+
+
+def isCorpusStale(csvFilePath, corpusFilePath):
+    if not os.path.exists(corpusFilePath):
+        return True
+    try:
+        with open(corpusFilePath, 'rb') as corpusFile:
+            header = corpusFile.read(CORPUS_HEADER.size)
+        magic, byteOrder, _, _, _, _, sourceSize, sourceMtime = CORPUS_HEADER.unpack(header)
+    except (OSError, struct.error):
+        return True
+    if magic != CORPUS_MAGIC or byteOrder != _byteOrderFlag():
+        return True
+    return (sourceSize, sourceMtime) != _sourceStamp(csvFilePath)
+
+
+def buildCorpusFile(csvFilePath, corpusFilePath=None):
+    if corpusFilePath is None:
+        corpusFilePath = defaultCorpusPath(csvFilePath)
+    
+    sourceSize, sourceMtime = _sourceStamp(csvFilePath)
+    rows = {}
+    with open(csvFilePath, 'r', encoding='utf-8') as csvFile:
+        csvReader = csv.DictReader(csvFile)
+        for row in csvReader:
+            surahNum = int(row['surah'])
+            ayahNum = int(row['ayah'])
+            if not 1 <= surahNum <= SURAH_COUNT or not 1 <= ayahNum <= 0xFFFF:
+                raise ValueError(f"Invalid reference {surahNum}:{ayahNum} in {csvFilePath}")
+            rows[(surahNum, ayahNum)] = row['text'].strip()
+    
+    surahIndex = array('I', [0] * (SURAH_COUNT + 2))
+    rowSurahs = array('B')
+    rowAyahs = array('H')
+    textOffsets = array('I', [0])
+    normalizedOffsets = array('I', [0])
+    rowWordIndex = array('I', [0])
+    wordOffsets = array('I')
+    textBlob = bytearray()
+    normalizedBlob = bytearray()
+    for surahNum, ayahNum in sorted(rows):
+        text = rows[(surahNum, ayahNum)]
+        rowSurahs.append(surahNum)
+        rowAyahs.append(ayahNum)
+        textBlob += text.encode('utf-8')
+        textOffsets.append(len(textBlob))
+        
+        for wordNum, word in enumerate(tokenizeArabic(normalizeArabic(text))):
+            if wordNum:
+                normalizedBlob += b" "
+            wordOffsets.append(len(normalizedBlob))
+            normalizedBlob += word.encode('utf-8')
+        normalizedOffsets.append(len(normalizedBlob))
+        rowWordIndex.append(len(wordOffsets))
+    
+    keyBlob = phoneticKey(normalizedBlob.decode('utf-8')).encode('utf-8')
+    if len(keyBlob) != len(normalizedBlob):
+        raise ValueError("Phonetic keys must keep the normalized text's byte layout")
+    
+    row = 0
+    for surahNum in range(1, SURAH_COUNT + 2):
+        while row < len(rowSurahs) and rowSurahs[row] < surahNum:
+            row += 1
+        surahIndex[surahNum] = row
+    
+    tempFilePath = corpusFilePath + ".tmp"
+    with open(tempFilePath, 'wb') as corpusFile:
+        corpusFile.write(CORPUS_HEADER.pack(
+            CORPUS_MAGIC, _byteOrderFlag(), len(rowSurahs), len(textBlob), len(normalizedBlob),
+            len(wordOffsets), sourceSize, sourceMtime
+        ))
+        sections = (surahIndex, rowSurahs, rowAyahs, textOffsets, normalizedOffsets, rowWordIndex, wordOffsets)
+        for section in sections:
+            corpusFile.write(section.tobytes())
+            corpusFile.write(b"\0" * (_align(corpusFile.tell()) - corpusFile.tell()))
+        corpusFile.write(textBlob)
+        corpusFile.write(normalizedBlob)
+        corpusFile.write(keyBlob)
+    os.replace(tempFilePath, corpusFilePath)
+    
+    return corpusFilePath
+
+
+if __name__ == "__main__":
+    sourcePath = sys.argv[1] if len(sys.argv) > 1 else "quran.csv"
+    targetPath = sys.argv[2] if len(sys.argv) > 2 else None
+    print(f"Corpus written to {buildCorpusFile(sourcePath, targetPath)}")
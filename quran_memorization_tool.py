@@ -4,33 +4,199 @@ Quran Memorization Practice Tool
 GUI application for practicing Quran recitation with speech recognition
 """
 
+import time
+
+# Taken before the remaining imports so startup timing includes them.
+LAUNCH_TIME = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import csv
-import difflib
-import speech_recognition as sr
-import threading
-import pygame
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 import os
+import sqlite3
 import sys
-import time
-import re
-import unicodedata
+import threading
+
+from arabic_text import normalizeArabic
+from audio_pipeline import MicrophoneSession, RecitationPipeline
+from latency_metrics import LatencyMetrics, StartupTimer, startProfiling, startupTimingMode, stopProfiling
+from practice_session import PracticeSession
+from progress_store import ProgressStore
+from quran_corpus import QuranCorpus
+from quran_divisions import parseRangeSpec
+from recognition_cache import withRecognitionCache
+from session_recorder import openRecorder
+from speech_backends import (
+    BackendRequestError, BackendUnavailableError, GoogleBackend, UnknownSpeechError, createBackend
+)
+from surah_resolver import SurahNameResolver
+from ui_dispatcher import UiDispatcher
+from verse_locator import VerseLocator
+
+
+DEBUG_PANEL_ENV_VAR = "QURAN_DEBUG_PANEL"
+# How long to wait for the last word when the rest of the ayah already passes.
+AYAH_END_GRACE_MS = 2000
 
 
 class QuranMemorizationTool:
-    def __init__(self, root):
+    """
+    The window is built first and shown straight away. Loading the corpus and
+    setting up the microphone and speech backend run on startup threads, behind
+    a progress bar; pygame and numpy are only imported when the first buzz plays.
+    """
+    
+    def __init__(self, root, startupTimer=None):
         self.root = root
         self.root.title("Quran Memorization Practice Tool")
         self.root.geometry("800x700")
         self.root.configure(bg="#f0f0f0")
-        
-        pygame.mixer.init()
+        self.startupTimer = startupTimer or StartupTimer()
         
         self.microphoneAvailable = False
         self.recognizer = None
-        self.microphone = None
+        self.speechBackend = None
+        self.microphoneSession = None
+        self.pipeline = None
+        self.buzzSound = None
         
+        self.isListening = False
+        self.listeningMode = "surah"
+        # Phrases recognized after the start was detected, kept for the first ayah.
+        self.heldResults = []
+        self.resultLock = threading.RLock()
+        self.surahResolver = SurahNameResolver()
+        self.renderedRecitation = ""
+        self.feedbackState = None
+        self.highlightTimer = None
+        self.advanceTimer = None
+        self.latestRecitation = None
+        self.pendingAttempt = None
+        self.progressStore = None
+        self.recorder = None
+        self.metrics = LatencyMetrics()
+        self.debugPanel = None
+        with self.startupTimer.phase("progressStore"):
+            self.openProgressStore()
+            self.openSessionRecorder()
+        
+        self.quranData = {}
+        self.corpusLoaded = False
+        self.session = PracticeSession(self.quranData, correctBaseIndex="2.0", metrics=self.metrics)
+        self.verseLocator = None
+        with self.startupTimer.phase("gui"):
+            self.setupGUI()
+        self.uiDispatcher = UiDispatcher(self.root, metrics=self.metrics)
+        self.uiDispatcher.start()
+        self.root.bind("<F12>", lambda event: self.toggleDebugPanel())
+        if os.environ.get(DEBUG_PANEL_ENV_VAR):
+            self.toggleDebugPanel()
+        
+        self.startStartupTasks()
+    
+    def startStartupTasks(self):
+        self.pendingStartupTasks = {
+            "corpus": "Loading Quran text",
+            "speech": "Setting up microphone and speech recognition",
+        }
+        self.startupProgress.config(maximum=len(self.pendingStartupTasks), value=0)
+        self.updateStartupStatus()
+        for name, load, apply in (("corpus", self.loadQuranData, self.useCorpus),
+                                  ("speech", self.setupSpeech, self.useSpeech)):
+            threading.Thread(
+                target=self.runStartupTask, args=(name, load, apply), name=f"startup-{name}", daemon=True
+            ).start()
+    
+    def runStartupTask(self, name, load, apply):
+        """Runs load() on a startup thread and hands its result to apply() on the Tk thread."""
+        result = None
+        try:
+            with self.startupTimer.phase(name):
+                result = load()
+        except Exception as e:
+            print(f"Warning: Startup task '{name}' failed: {str(e)}")
+        self.uiDispatcher.post(f"startup:{name}", self.finishStartupTask, name, apply, result)
+    
+    def finishStartupTask(self, name, apply, result):
+        apply(result)
+        self.pendingStartupTasks.pop(name, None)
+        self.startupProgress.step(1)
+        if self.pendingStartupTasks:
+            self.updateStartupStatus()
+        else:
+            self.startupComplete()
+    
+    def updateStartupStatus(self):
+        self.startupLabel.config(text=" · ".join(self.pendingStartupTasks.values()) + "...")
+    
+    def startupComplete(self):
+        self.startupTimer.record("ready", self.startupTimer.origin)
+        self.startupFrame.pack_forget()
+        if not self.corpusLoaded:
+            # useCorpus has already shown the error; without the text there is nothing to practice.
+            self.setFeedback("❌ The Quran text could not be loaded, so practice is unavailable.", "#e74c3c")
+        elif self.microphoneAvailable:
+            self.rangeButton.config(state=tk.NORMAL)
+            self.startButton.config(state=tk.NORMAL)
+            self.setFeedback("Click 'Start Listening for Surah' and say the surah name to begin", "#7f8c8d")
+        else:
+            self.setFeedback(
+                "⚠️ PyAudio not installed. Install with: brew install portaudio && pip3 install pyaudio",
+                "#e74c3c"
+            )
+        
+        timingMode = startupTimingMode()
+        if timingMode:
+            print(self.startupTimer.report())
+            if timingMode == "exit":
+                self.root.after_idle(self.closeApp)
+    
+    def loadQuranData(self, csvFilePath="quran.csv"):
+        """Runs on a startup thread: (corpus, None), or (None, error message) to show."""
+        if not os.path.exists(csvFilePath):
+            return None, f"File {csvFilePath} not found."
+        try:
+            return QuranCorpus.load(csvFilePath), None
+        except Exception as e:
+            return None, f"Error loading Quran data: {str(e)}"
+    
+    def useCorpus(self, loaded):
+        corpus, error = loaded or (None, "Error loading Quran data")
+        if error:
+            messagebox.showerror("Error", error)
+            return
+        
+        self.quranData = corpus
+        self.corpusLoaded = True
+        self.session = PracticeSession(self.quranData, correctBaseIndex="2.0", metrics=self.metrics)
+        self.verseLocator = VerseLocator(self.quranData)
+        threading.Thread(target=self.buildVerseIndex, name="verse-index", daemon=True).start()
+        print(f"Loaded {self.quranData.surahCount()} surahs")
+    
+    def buildVerseIndex(self):
+        with self.startupTimer.phase("verseIndex"):
+            self.verseLocator.build()
+    
+    def openProgressStore(self):
+        try:
+            self.progressStore = ProgressStore()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open progress database: {str(e)}. Progress will not be saved.")
+            self.progressStore = None
+    
+    def openSessionRecorder(self):
+        try:
+            self.recorder = openRecorder()
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not open session recording: {str(e)}. Audio will not be recorded.")
+            self.recorder = None
+        if self.recorder:
+            print(f"Recording phrases to {self.recorder.recordingPath}")
+    
+    def setupSpeech(self):
+        """
+        Runs on a startup thread: imports the recognizer, opens the microphone and
+        starts calibrating it, then loads the speech backend while calibration runs.
+        """
         try:
             import pyaudio
             pyaudioAvailable = True
@@ -38,109 +204,65 @@ class QuranMemorizationTool:
             pyaudioAvailable = False
             print("Warning: PyAudio not found. Microphone features will be disabled.")
         
+        import speech_recognition as sr
         try:
-            self.recognizer = sr.Recognizer()
+            recognizer = sr.Recognizer()
         except Exception as e:
             print(f"Warning: Error initializing recognizer: {str(e)}")
-            self.recognizer = None
+            recognizer = None
         
+        microphoneSession = None
         if pyaudioAvailable:
             try:
-                self.microphone = sr.Microphone()
-                self.microphoneAvailable = True
+                microphoneSession = MicrophoneSession(sr.Microphone(), recognizer)
+                self.calibrateMicrophone(microphoneSession)
             except Exception as e:
                 print(f"Warning: Error initializing microphone: {str(e)}")
-                self.microphoneAvailable = False
-        else:
-            self.microphoneAvailable = False
-        
-        self.isListening = False
-        self.currentAyahIndex = 0
-        self.currentSurah = None
-        self.ayahList = []
-        self.startAyah = 1
-        self.endAyah = 1
-        self.accumulatedRecitation = ""
-        self.listeningMode = "surah"
-        self.currentAyahCompleted = False
-        self.surahNameMapping = self.createSurahNameMapping()
-        
-        self.quranData = {}
-        self.loadQuranData()
-        self.setupGUI()
+                microphoneSession = None
         
-        if self.microphoneAvailable:
-            self.calibrateMicrophone()
-        else:
-            if hasattr(self, 'feedbackLabel'):
-                self.feedbackLabel.config(
-                    text="⚠️ PyAudio not installed. Microphone features disabled.",
-                    fg="#e74c3c"
-                )
+        with self.startupTimer.phase("speechBackend"):
+            speechBackend = self.loadSpeechBackend(recognizer)
+        return recognizer, speechBackend, microphoneSession
     
-    def createSurahNameMapping(self):
-        mapping = {}
-        numberWords = {
-            "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
-            "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17,
-            "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60,
-            "seventy": 70, "eighty": 80, "ninety": 90, "hundred": 100, "first": 1, "second": 2, "third": 3
-        }
-        
-        for num in range(1, 115):
-            mapping[str(num)] = num
-            if num in numberWords.values():
-                for word, val in numberWords.items():
-                    if val == num:
-                        mapping[word] = num
-        
-        commonSurahNames = {
-            "الفاتحة": 1, "فاتحة": 1, "سورة الفاتحة": 1,
-            "البقرة": 2, "بقرة": 2, "سورة البقرة": 2,
-            "آل عمران": 3, "عمران": 3, "سورة آل عمران": 3,
-            "النساء": 4, "نساء": 4, "سورة النساء": 4,
-            "المائدة": 5, "مائدة": 5, "سورة المائدة": 5,
-            "al-fatiha": 1, "fatiha": 1, "al fatiha": 1, "the opening": 1,
-            "al-baqarah": 2, "baqarah": 2, "al baqarah": 2, "the cow": 2,
-            "al-imran": 3, "imran": 3, "al imran": 3, "family of imran": 3,
-            "an-nisa": 4, "nisa": 4, "an nisa": 4, "the women": 4,
-            "al-maidah": 5, "maidah": 5, "al maidah": 5, "the table": 5,
-        }
-        mapping.update(commonSurahNames)
-        
-        return mapping
+    def useSpeech(self, speech):
+        if speech is None:
+            return
+        self.recognizer, self.speechBackend, self.microphoneSession = speech
+        self.microphoneAvailable = self.microphoneSession is not None
     
-    def loadQuranData(self):
-        csvFilePath = "quran.csv"
+    def loadSpeechBackend(self, recognizer):
         try:
-            if not os.path.exists(csvFilePath):
-                messagebox.showerror("Error", f"File {csvFilePath} not found.")
-                return
-            
-            with open(csvFilePath, 'r', encoding='utf-8') as csvFile:
-                csvReader = csv.DictReader(csvFile)
-                for row in csvReader:
-                    surahNum = int(row['surah'])
-                    ayahNum = int(row['ayah'])
-                    text = row['text'].strip()
-                    
-                    if surahNum not in self.quranData:
-                        self.quranData[surahNum] = {}
-                    self.quranData[surahNum][ayahNum] = text
-            
-            print(f"Loaded {len(self.quranData)} surahs from {csvFilePath}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error loading Quran data: {str(e)}")
+            speechBackend = createBackend(recognizer=recognizer)
+            speechBackend.load()
+            print(f"Speech backend ready: {speechBackend.name}")
+        except (BackendUnavailableError, ValueError) as e:
+            print(f"Warning: {str(e)}. Falling back to Google speech recognition.")
+            speechBackend = GoogleBackend(recognizer)
+        # Retried phrases are usually near-identical audio; recognize each only once.
+        return withRecognitionCache(speechBackend)
     
-    def calibrateMicrophone(self):
-        if not self.microphoneAvailable:
-            return
-        try:
-            with self.microphone as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=1)
+    def calibrateMicrophone(self, microphoneSession):
+        calibrationStart = time.perf_counter()
+        
+        def onReady():
+            self.startupTimer.record("calibration", calibrationStart)
             print("Microphone calibrated")
-        except Exception as e:
-            print(f"Warning: Could not calibrate microphone: {str(e)}")
+        
+        microphoneSession.open(
+            onReady=onReady,
+            onError=lambda e: print(f"Warning: Could not calibrate microphone: {str(e)}")
+        )
+    
+    def closeApp(self):
+        self.stopListening()
+        self.uiDispatcher.stop()
+        if self.microphoneSession:
+            self.microphoneSession.close()
+        if self.progressStore:
+            self.progressStore.close()
+        if self.recorder:
+            self.recorder.close()
+        self.root.destroy()
     
     def setupGUI(self):
         titleLabel = tk.Label(
@@ -163,10 +285,48 @@ class QuranMemorizationTool:
             fg="white",
             command=self.startListeningForSurah,
             width=20,
-            height=2
+            height=2,
+            state=tk.DISABLED
         )
         self.startButton.pack(padx=10, pady=5)
         
+        self.reviewDueVar = tk.BooleanVar(value=self.progressStore is not None)
+        self.reviewDueCheck = tk.Checkbutton(
+            inputFrame,
+            text="Review due ayahs first",
+            font=("Arial", 11),
+            bg="#f0f0f0",
+            variable=self.reviewDueVar,
+            state=tk.NORMAL if self.progressStore else tk.DISABLED
+        )
+        self.reviewDueCheck.pack(padx=10)
+        
+        rangeFrame = tk.Frame(inputFrame, bg="#f0f0f0")
+        rangeFrame.pack(pady=5)
+        
+        tk.Label(
+            rangeFrame,
+            text="Or practice a range (e.g. 'juz 30', 'hizb 5', 'page 1', '2:255-3:10'):",
+            font=("Arial", 11),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        ).pack(side=tk.LEFT, padx=5)
+        
+        self.rangeEntry = tk.Entry(rangeFrame, font=("Arial", 12), width=14)
+        self.rangeEntry.pack(side=tk.LEFT, padx=5)
+        self.rangeEntry.bind("<Return>", lambda event: self.startPracticeForRange())
+        
+        self.rangeButton = tk.Button(
+            rangeFrame,
+            text="Practice Range",
+            font=("Arial", 11),
+            bg="#2ecc71",
+            fg="white",
+            command=self.startPracticeForRange,
+            state=tk.DISABLED
+        )
+        self.rangeButton.pack(side=tk.LEFT, padx=5)
+        
         correctFrame = tk.LabelFrame(
             self.root,
             text="Correct Verse",
@@ -186,6 +346,8 @@ class QuranMemorizationTool:
             state=tk.DISABLED
         )
         self.correctText.pack(padx=10, pady=10, fill="both", expand=True)
+        self.correctText.tag_config("highlight", background="#ffeb3b")
+        self.correctText.tag_config("substituted", background="#ffd180")
         
         recitedFrame = tk.LabelFrame(
             self.root,
@@ -205,19 +367,27 @@ class QuranMemorizationTool:
             fg="#34495e"
         )
         self.recitedText.pack(padx=10, pady=10, fill="both", expand=True)
+        self.recitedText.tag_config("incorrect", background="#ffcccc", foreground="#cc0000")
+        self.recitedText.tag_config("correct", background="#ccffcc", foreground="#006600")
         
-        initialText = "Click 'Start Listening for Surah' and say the surah name to begin"
-        if not self.microphoneAvailable:
-            initialText = "⚠️ PyAudio not installed. Install with: brew install portaudio && pip3 install pyaudio"
+        initialText = "Getting ready..."
         self.feedbackLabel = tk.Label(
             self.root,
             text=initialText,
             font=("Arial", 14),
             bg="#f0f0f0",
-            fg="#7f8c8d" if self.microphoneAvailable else "#e74c3c",
+            fg="#7f8c8d",
             wraplength=750
         )
         self.feedbackLabel.pack(pady=10)
+        self.feedbackState = (initialText, self.feedbackLabel.cget("fg"))
+        
+        self.startupFrame = tk.Frame(self.root, bg="#f0f0f0")
+        self.startupFrame.pack(pady=5)
+        self.startupProgress = ttk.Progressbar(self.startupFrame, mode="determinate", length=300)
+        self.startupProgress.pack()
+        self.startupLabel = tk.Label(self.startupFrame, font=("Arial", 11), bg="#f0f0f0", fg="#7f8c8d")
+        self.startupLabel.pack()
         
         controlFrame = tk.Frame(self.root, bg="#f0f0f0")
         controlFrame.pack(pady=10)
@@ -243,108 +413,127 @@ class QuranMemorizationTool:
             return
         
         self.listeningMode = "surah"
-        self.currentSurah = None
-        self.ayahList = []
-        self.currentAyahIndex = 0
-        self.accumulatedRecitation = ""
+        self.session.clear()
         
         self.correctText.config(state=tk.NORMAL)
         self.correctText.delete(1.0, tk.END)
-        self.correctText.insert(1.0, "Listening for surah name...\nSay the name of the surah you want to practice (e.g., 'Al-Fatiha', 'الفاتحة', or '1')")
+        self.correctText.insert(1.0, "Listening for surah name...\nSay the name of the surah you want to practice (e.g., 'Al-Fatiha', 'الفاتحة', or '1'), or just start reciting from anywhere")
         self.correctText.config(state=tk.DISABLED)
-        self.recitedText.delete(1.0, tk.END)
+        self.clearRecitedText()
         
-        self.feedbackLabel.config(
-            text="🎤 Listening for surah name... Please say the surah name clearly.",
-            fg="#3498db"
-        )
+        self.setFeedback("🎤 Listening for surah name... Please say the surah name clearly.", "#3498db")
         
         self.startButton.config(state=tk.DISABLED)
         self.stopButton.config(state=tk.NORMAL)
         self.startListening()
     
-    def detectSurahFromSpeech(self, recognizedText):
-        recognizedTextLower = recognizedText.lower().strip()
+    def startPracticeForRange(self):
+        if not self.microphoneAvailable:
+            messagebox.showerror(
+                "Microphone Not Available",
+                "PyAudio is not installed. Microphone features are disabled."
+            )
+            return
         
-        for name, surahNum in self.surahNameMapping.items():
-            if name.lower() in recognizedTextLower or recognizedTextLower in name.lower():
-                if surahNum in self.quranData:
-                    return surahNum
+        try:
+            start, stop, label = parseRangeSpec(self.rangeEntry.get())
+        except ValueError as e:
+            messagebox.showerror("Invalid Range", str(e))
+            return
         
-        numbers = re.findall(r'\d+', recognizedText)
-        if numbers:
-            try:
-                surahNum = int(numbers[0])
-                if 1 <= surahNum <= 114 and surahNum in self.quranData:
-                    return surahNum
-            except ValueError:
-                pass
+        self.stopListening()
+        if not self.session.startRange(start, stop, label):
+            self.setFeedback(f"❌ No ayahs found for {label}", "#e74c3c")
+            return
         
-        return None
+        self.listeningMode = "ayah"
+        self.startButton.config(state=tk.DISABLED)
+        self.stopButton.config(state=tk.NORMAL)
+        self.displayCurrentAyah()
+    
+    def detectSurahFromSpeech(self, recognizedText):
+        return self.surahResolver.bestMatch(recognizedText, self.quranData)
+    
+    def locateRecitation(self, recognizedText):
+        if self.verseLocator is None:
+            return None
+        return self.verseLocator.bestMatch(recognizedText)
+    
+    def startPracticeAtLocation(self, located, recitedText):
+        """Start at the located word and score the phrase that located it as the start of the recitation."""
+        if not self.isListening:
+            return
+        started = self.session.startAtLocation(located, recitedText)
+        if started is None:
+            self.startPracticeForSurah(located.surah)
+            return
+        
+        self.displayCurrentAyah(f"📍 Found your place: Surah {located.surah}, Ayah {located.ayah}. ")
+        aligner, feedback = started
+        self.applyRecitation(aligner, feedback, self.session.accumulatedRecitation)
+        self.releaseHeldResults()
     
     def startPracticeForSurah(self, surahNum):
+        if not self.isListening:
+            return
         if surahNum not in self.quranData:
-            self.feedbackLabel.config(
-                text=f"❌ Surah {surahNum} not found in the data. Please try again.",
-                fg="#e74c3c"
-            )
-            self.startButton.config(state=tk.NORMAL)
-            self.stopButton.config(state=tk.DISABLED)
+            self.stopListening()
+            self.setFeedback(f"❌ Surah {surahNum} not found in the data. Please try again.", "#e74c3c")
             return
         
-        self.ayahList = []
-        ayahNumbers = sorted(self.quranData[surahNum].keys())
-        for ayahNum in ayahNumbers:
-            self.ayahList.append((surahNum, ayahNum, self.quranData[surahNum][ayahNum]))
-        
-        if not self.ayahList:
-            self.feedbackLabel.config(
-                text=f"❌ No ayahs found for Surah {surahNum}",
-                fg="#e74c3c"
-            )
-            self.startButton.config(state=tk.NORMAL)
-            self.stopButton.config(state=tk.DISABLED)
+        if not self.startSessionForSurah(surahNum):
+            self.stopListening()
+            self.setFeedback(f"❌ No ayahs found for Surah {surahNum}", "#e74c3c")
             return
         
-        self.currentSurah = surahNum
-        self.currentAyahIndex = 0
-        self.listeningMode = "ayah"
-        self.currentAyahCompleted = False
-        
-        self.feedbackLabel.config(
-            text=f"✅ Surah {surahNum} detected! Starting practice with {len(self.ayahList)} ayahs. Beginning with first ayah...",
-            fg="#27ae60"
-        )
-        
-        self.root.after(2000, self.displayCurrentAyah)
+        self.displayCurrentAyah(f"✅ Surah {surahNum} detected, {len(self.session.ayahList)} ayahs. ")
+        self.releaseHeldResults()
+    
+    def releaseHeldResults(self):
+        """
+        Switch the running pipeline to ayah mode and feed the new ayah the phrases
+        recognized while practice was being set up, in capture order.
+        """
+        with self.resultLock:
+            self.listeningMode = "ayah"
+            heldResults, self.heldResults = self.heldResults, []
+            for result in heldResults:
+                self.handlePhraseResult(result)
     
-    def displayCurrentAyah(self):
-        if self.currentAyahIndex >= len(self.ayahList):
-            self.feedbackLabel.config(
-                text=f"🎉 Practice session completed! You've recited all {len(self.ayahList)} ayahs of Surah {self.currentSurah}. Well done!",
-                fg="#27ae60"
+    def startSessionForSurah(self, surahNum):
+        if self.progressStore and self.reviewDueVar.get():
+            try:
+                rows = self.progressStore.practiceQueue(self.quranData, surahNum)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not read review queue: {str(e)}")
+                rows = []
+            if rows:
+                return self.session.startRows(surahNum, rows)
+        return self.session.startSurah(surahNum)
+    
+    def displayCurrentAyah(self, notice=""):
+        self.cancelAdvanceTimer()
+        if self.session.isFinished():
+            self.setFeedback(
+                f"🎉 Practice session completed! You've recited all {len(self.session.ayahList)} ayahs of {self.session.label}. Well done!",
+                "#27ae60"
             )
             self.stopListening()
             self.startButton.config(state=tk.NORMAL)
             self.stopButton.config(state=tk.DISABLED)
             return
         
-        surahNum, ayahNum, text = self.ayahList[self.currentAyahIndex]
+        surahNum, ayahNum, text = self.session.currentAyah()
         
         self.correctText.config(state=tk.NORMAL)
         self.correctText.delete(1.0, tk.END)
         self.correctText.insert(1.0, f"Surah {surahNum}, Ayah {ayahNum}:\n{text}")
         self.correctText.config(state=tk.DISABLED)
         
-        self.recitedText.delete(1.0, tk.END)
-        self.accumulatedRecitation = ""
-        self.currentAyahCompleted = False
+        self.clearRecitedText()
         
-        progress = f"({self.currentAyahIndex + 1}/{len(self.ayahList)})"
-        self.feedbackLabel.config(
-            text=f"Recite Surah {surahNum}, Ayah {ayahNum} {progress}. Listening...",
-            fg="#3498db"
-        )
+        progress = f"({self.session.currentAyahIndex + 1}/{len(self.session.ayahList)})"
+        self.setFeedback(f"{notice}Recite Surah {surahNum}, Ayah {ayahNum} {progress}. Listening...", "#3498db")
         
         if not self.isListening:
             self.startListening()
@@ -361,179 +550,269 @@ class QuranMemorizationTool:
             return
         
         self.isListening = True
+        self.clearRecitedText()
+        self.session.resetRecitation()
+        
+        self.pipeline = RecitationPipeline(
+            self.microphoneSession,
+            self.speechBackend,
+            self.getListenSettings,
+            self.handlePhraseResult,
+            onCaptureError=self.handleCaptureError,
+            metrics=self.metrics,
+            recorder=self.recorder,
+            segmentTag=self.recordingTag,
+        )
+        self.pipeline.start()
+    
+    def recordingTag(self):
+        """
+        (surah, ayah) to file a captured phrase under; (0, 0) while listening for a
+        surah name. Runs on the capture thread, so the session is read under its lock.
+        """
+        if self.listeningMode != "ayah":
+            return (0, 0)
+        with self.session.lock:
+            ayah = self.session.currentAyah()
+        return (ayah[0], ayah[1]) if ayah else (0, 0)
+    
+    def getListenSettings(self):
+        if self.listeningMode == "surah":
+            return 2, 10, ("ar-SA", "en-US"), "surah"
+        return 1, 5, ("ar-SA",), "ayah"
+    
+    def handlePhraseResult(self, result):
+        with self.resultLock:
+            if not self.isListening:
+                return
+            if self.listeningMode == "starting":
+                self.heldResults.append(result)
+                return
+            self.routePhraseResult(result)
+    
+    def routePhraseResult(self, result):
+        """
+        Phrases are judged by the current mode, not the one they were captured in:
+        the pipeline keeps listening across the switch from surah detection to
+        practice, so a phrase captured during detection may be the first recitation.
+        """
+        if isinstance(result.error, UnknownSpeechError):
+            if self.listeningMode == "surah":
+                self.uiDispatcher.post(
+                    "feedback", self.setFeedback,
+                    "Could not understand. Please say the surah name clearly.",
+                    "#e74c3c"
+                )
+        elif result.error is not None:
+            errorMsg = str(result.error)
+            if isinstance(result.error, BackendRequestError):
+                errorMsg = f"Error with speech recognition service: {errorMsg}"
+            else:
+                errorMsg = f"Error: {errorMsg}"
+            self.uiDispatcher.post("feedback", self.setFeedback, errorMsg, "#e74c3c")
+        elif self.listeningMode == "surah":
+            located = self.locateRecitation(result.text)
+            surahNum = None if located else self.detectSurahFromSpeech(result.text)
+            if located:
+                self.listeningMode = "starting"
+                self.uiDispatcher.post("practice", self.startPracticeAtLocation, located, result.text)
+            elif surahNum:
+                self.listeningMode = "starting"
+                self.uiDispatcher.post("practice", self.startPracticeForSurah, surahNum)
+            else:
+                recText = result.text
+                self.uiDispatcher.post(
+                    "feedback", self.setFeedback,
+                    f"Could not detect surah from '{recText}'. Please say the surah name again (e.g., 'Al-Fatiha', 'الفاتحة', or '1').",
+                    "#e74c3c"
+                )
+        else:
+            aligner, feedback = self.session.submitTranscript(result.text)
+            # Results arrive in capture order, so the accumulated text is this phrase's.
+            recitedText = self.session.accumulatedRecitation
+            self.uiDispatcher.post(
+                "recitation", self.applyRecitation,
+                aligner, feedback, recitedText, result.capturedAt
+            )
+    
+    def handleCaptureError(self, error):
+        if self.isListening:
+            errorMsg = str(error)
+            self.uiDispatcher.post("feedback", self.setFeedback, f"Error: {errorMsg}", "#e74c3c")
+    
+    def setFeedback(self, text, color):
+        if self.feedbackState == (text, color):
+            return
+        self.feedbackState = (text, color)
+        self.feedbackLabel.config(text=text, fg=color)
+    
+    def clearRecitedText(self):
         self.recitedText.delete(1.0, tk.END)
-        self.accumulatedRecitation = ""
-        
-        thread = threading.Thread(target=self.listenThread, daemon=True)
-        thread.start()
+        self.renderedRecitation = ""
     
-    def listenThread(self):
-        while self.isListening:
-            try:
-                with self.microphone as source:
-                    if self.listeningMode == "surah":
-                        audio = self.recognizer.listen(source, timeout=2, phrase_time_limit=10)
-                    else:
-                        audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
-                
-                try:
-                    if self.listeningMode == "surah":
-                        try:
-                            recognizedText = self.recognizer.recognize_google(audio, language="ar-SA")
-                        except:
-                            recognizedText = self.recognizer.recognize_google(audio, language="en-US")
-                        
-                        surahNum = self.detectSurahFromSpeech(recognizedText)
-                        if surahNum:
-                            self.isListening = False
-                            self.root.after(0, self.startPracticeForSurah, surahNum)
-                            break
-                        else:
-                            recText = recognizedText
-                            self.root.after(0, lambda txt=recText: self.feedbackLabel.config(
-                                text=f"Could not detect surah from '{txt}'. Please say the surah name again (e.g., 'Al-Fatiha', 'الفاتحة', or '1').",
-                                fg="#e74c3c"
-                            ))
-                    else:
-                        recognizedText = self.recognizer.recognize_google(audio, language="ar-SA")
-                        
-                        if self.accumulatedRecitation:
-                            self.accumulatedRecitation += " " + recognizedText
-                        else:
-                            self.accumulatedRecitation = recognizedText
-                        
-                        self.root.after(0, self.updateRecitedText, recognizedText)
-                        self.root.after(0, self.compareRecitation, self.accumulatedRecitation)
-                    
-                except sr.UnknownValueError:
-                    if self.listeningMode == "surah":
-                        self.root.after(0, lambda: self.feedbackLabel.config(
-                            text="Could not understand. Please say the surah name clearly.",
-                            fg="#e74c3c"
-                        ))
-                    pass
-                except sr.RequestError as e:
-                    errorMsg = str(e)
-                    self.root.after(0, lambda msg=errorMsg: self.feedbackLabel.config(
-                        text=f"Error with speech recognition service: {msg}",
-                        fg="#e74c3c"
-                    ))
-                    
-            except sr.WaitTimeoutError:
-                continue
-            except Exception as e:
-                if self.isListening:
-                    errorMsg = str(e)
-                    self.root.after(0, lambda msg=errorMsg: self.feedbackLabel.config(
-                        text=f"Error: {msg}",
-                        fg="#e74c3c"
-                    ))
-                break
-    
-    def updateRecitedText(self, newText):
-        currentText = self.recitedText.get(1.0, tk.END).strip()
-        if currentText:
-            self.recitedText.insert(tk.END, " " + newText)
+    def applyRecitation(self, aligner, feedback, recitedText, capturedAt=None):
+        if aligner is not None and not self.session.isCurrent(aligner):
+            return
+        renderStart = time.perf_counter()
+        self.updateRecitedText(recitedText)
+        if feedback:
+            self.compareRecitation(aligner, feedback)
+        self.metrics.recordSince("render", renderStart)
+        if capturedAt is not None:
+            self.metrics.recordSince("endToEnd", capturedAt)
+    
+    def updateRecitedText(self, recitedText):
+        if recitedText == self.renderedRecitation:
+            return
+        if self.renderedRecitation and recitedText.startswith(self.renderedRecitation):
+            self.recitedText.insert(tk.END, recitedText[len(self.renderedRecitation):])
         else:
-            self.recitedText.insert(1.0, newText)
+            self.recitedText.delete(1.0, tk.END)
+            self.recitedText.insert(1.0, recitedText)
+        self.renderedRecitation = recitedText
         self.recitedText.see(tk.END)
         
-        self.feedbackLabel.config(
-            text="Listening... (Your recitation is being transcribed in real-time)",
-            fg="#3498db"
-        )
+        self.setFeedback("Listening... (Your recitation is being transcribed in real-time)", "#3498db")
     
-    def compareRecitation(self, recitedText):
-        if self.currentAyahIndex >= len(self.ayahList):
+    def compareRecitation(self, aligner, feedback):
+        """
+        Judge the recitation so far against the ayah's prefix, so a correct partial
+        recitation is not buzzed, and move on as soon as the last word aligns.
+        """
+        if not self.session.isCurrent(aligner):
             return
         
-        _, _, correctText = self.ayahList[self.currentAyahIndex]
-        
-        normalizedCorrect = self.normalizeArabic(correctText)
-        normalizedRecited = self.normalizeArabic(recitedText)
-        
-        similarity = difflib.SequenceMatcher(None, normalizedCorrect, normalizedRecited).ratio()
-        similarityPercent = similarity * 100
+        onTrack = self.session.prefixVerdict(feedback)
+        if onTrack is None:
+            return
+        self.latestRecitation = (aligner, feedback)
         
-        if len(normalizedRecited.strip()) < 3:
+        if self.session.isAyahComplete(feedback):
+            self.completeAyah(aligner, feedback)
             return
         
-        if similarityPercent < 80:
+        if self.session.verdict(feedback):
+            self.highlightCorrectInTranscript(feedback.recitedRanges)
+            if self.advanceTimer is None:
+                self.advanceTimer = self.root.after(AYAH_END_GRACE_MS, self.completeLatestAyah)
+            self.setFeedback(
+                f"✅ Excellent! Similarity: {feedback.similarity * 100:.1f}% - Finish the ayah or wait to move on...",
+                "#27ae60"
+            )
+        elif not onTrack:
+            # A later phrase that fails overrides an earlier pass still waiting for the last word.
+            self.cancelAdvanceTimer()
             if not hasattr(self, '_lastBuzzTime') or (time.time() - self._lastBuzzTime) > 2:
                 self.playBuzzSound()
                 self._lastBuzzTime = time.time()
             
-            self.highlightIncorrectInTranscript(recitedText, correctText)
-            self.highlightCorrectText()
+            self.pendingAttempt = (aligner, feedback)
+            self.highlightIncorrectInTranscript(feedback.recitedRanges)
+            self.highlightCorrectText(feedback.correctRanges)
             
-            self.feedbackLabel.config(
-                text=f"⚠️ Similarity: {similarityPercent:.1f}% - Please correct your recitation. The correct text is highlighted above.",
-                fg="#e74c3c"
+            self.setFeedback(
+                f"⚠️ Similarity: {feedback.prefixSimilarity * 100:.1f}% - Please correct your recitation. The correct text is highlighted above.",
+                "#e74c3c"
             )
         else:
-            self.highlightCorrectInTranscript()
-            
-            if not self.currentAyahCompleted:
-                self.currentAyahCompleted = True
-                self.feedbackLabel.config(
-                    text=f"✅ Excellent! Similarity: {similarityPercent:.1f}% - Ayah completed! Moving to next ayah...",
-                    fg="#27ae60"
-                )
-                self.root.after(2000, self.moveToNextAyah)
-            else:
-                self.feedbackLabel.config(
-                    text=f"✅ Excellent! Similarity: {similarityPercent:.1f}% - Your recitation is correct!",
-                    fg="#27ae60"
-                )
+            self.cancelAdvanceTimer()
+            self.highlightCorrectInTranscript(feedback.recitedRanges)
+            self.setFeedback(
+                f"✅ Good so far: {feedback.prefixSimilarity * 100:.1f}% - Keep going...",
+                "#27ae60"
+            )
+    
+    def completeAyah(self, aligner, feedback):
+        self.cancelAdvanceTimer()
+        if not self.session.isCurrent(aligner) or not self.session.markCompleted():
+            return
+        self.highlightCorrectInTranscript(feedback.recitedRanges)
+        self.recordAttempt(aligner, feedback)
+        self.moveToNextAyah(f"✅ Ayah completed ({feedback.similarity * 100:.1f}%). ")
+    
+    def completeLatestAyah(self):
+        self.advanceTimer = None
+        if self.latestRecitation and self.session.verdict(self.latestRecitation[1]):
+            self.completeAyah(*self.latestRecitation)
+    
+    def cancelAdvanceTimer(self):
+        if self.advanceTimer is not None:
+            self.root.after_cancel(self.advanceTimer)
+            self.advanceTimer = None
+    
+    def recordAttempt(self, aligner, feedback):
+        self.pendingAttempt = None
+        if not self.progressStore:
+            return
+        score = self.session.ayahScore(aligner, feedback)
+        try:
+            self.progressStore.recordAttempt(
+                score["surah"], score["ayah"], score["similarity"], score["passed"], score["missingWords"]
+            )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save progress: {str(e)}")
     
-    def moveToNextAyah(self):
-        if self.currentAyahCompleted:
-            self.currentAyahIndex += 1
-            self.displayCurrentAyah()
+    def moveToNextAyah(self, notice=""):
+        if not self.session.currentAyahCompleted:
+            return
+        self.latestRecitation = None
+        self.session.advance(carryOver=True)
+        self.displayCurrentAyah(notice)
+        # Words already recited past the previous ayah's end count towards this one.
+        aligner, feedback, recitedText = self.session.currentFeedback()
+        if aligner is not None:
+            self.applyRecitation(aligner, feedback, recitedText)
     
     def normalizeArabic(self, text):
-        normalized = unicodedata.normalize('NFKD', text)
-        normalized = ''.join([c for c in normalized if not unicodedata.combining(c)])
-        normalized = ' '.join(normalized.split())
-        return normalized.lower()
+        return normalizeArabic(text)
     
-    def highlightCorrectText(self):
+    def applyTagRanges(self, widget, tagRanges):
+        for tag, ranges in tagRanges.items():
+            widget.tag_remove(tag, "1.0", tk.END)
+            for start, end in ranges:
+                widget.tag_add(tag, start, end)
+    
+    def highlightCorrectText(self, correctRanges):
         self.correctText.config(state=tk.NORMAL)
-        self.correctText.tag_add("highlight", "1.0", tk.END)
-        self.correctText.tag_config("highlight", background="#ffeb3b")
+        self.applyTagRanges(self.correctText, correctRanges)
         self.correctText.config(state=tk.DISABLED)
-        self.root.after(2000, self.removeHighlight)
+        if self.highlightTimer is not None:
+            self.root.after_cancel(self.highlightTimer)
+        self.highlightTimer = self.root.after(2000, self.removeHighlight)
     
     def removeHighlight(self):
+        self.highlightTimer = None
         self.correctText.config(state=tk.NORMAL)
         self.correctText.tag_remove("highlight", "1.0", tk.END)
+        self.correctText.tag_remove("substituted", "1.0", tk.END)
         self.correctText.config(state=tk.DISABLED)
     
-    def highlightIncorrectInTranscript(self, recitedText, correctText):
-        self.recitedText.tag_remove("incorrect", "1.0", tk.END)
-        self.recitedText.tag_remove("correct", "1.0", tk.END)
-        self.recitedText.tag_add("incorrect", "1.0", tk.END)
-        self.recitedText.tag_config("incorrect", background="#ffcccc", foreground="#cc0000")
+    def highlightIncorrectInTranscript(self, recitedRanges):
+        self.applyTagRanges(self.recitedText, recitedRanges)
     
-    def highlightCorrectInTranscript(self):
-        self.recitedText.tag_remove("incorrect", "1.0", tk.END)
-        self.recitedText.tag_remove("correct", "1.0", tk.END)
-        self.recitedText.tag_add("correct", "1.0", tk.END)
-        self.recitedText.tag_config("correct", background="#ccffcc", foreground="#006600")
+    def highlightCorrectInTranscript(self, recitedRanges):
+        self.highlightIncorrectInTranscript(recitedRanges)
+    
+    def createBuzzSound(self):
+        import numpy as np
+        import pygame
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        sampleRate = 44100
+        duration = 0.3
+        frequency = 440
+        t = np.linspace(0, duration, int(sampleRate * duration), False)
+        wave = np.sin(2 * np.pi * frequency * t)
+        wave = wave + 0.3 * np.random.randn(len(wave))
+        wave = (wave * 32767).astype(np.int16)
+        return pygame.sndarray.make_sound(wave)
     
     def playBuzzSound(self):
         try:
             try:
-                import numpy as np
-                sampleRate = 44100
-                duration = 0.3
-                frequency = 440
-                t = np.linspace(0, duration, int(sampleRate * duration), False)
-                wave = np.sin(2 * np.pi * frequency * t)
-                wave = wave + 0.3 * np.random.randn(len(wave))
-                wave = (wave * 32767).astype(np.int16)
-                sound = pygame.sndarray.make_sound(wave)
-                sound.play()
+                if self.buzzSound is None:
+                    self.buzzSound = self.createBuzzSound()
+                self.buzzSound.play()
             except ImportError:
                 self.playSystemBeep()
         except Exception as e:
@@ -552,19 +831,86 @@ class QuranMemorizationTool:
             winsound.Beep(440, 300)
     
     def stopListening(self):
-        self.isListening = False
+        with self.resultLock:
+            self.isListening = False
+            self.heldResults = []
+        self.cancelAdvanceTimer()
+        if self.pipeline:
+            self.pipeline.stop()
+        if self.pendingAttempt and self.session.isCurrent(self.pendingAttempt[0]):
+            self.recordAttempt(*self.pendingAttempt)
+        self.pendingAttempt = None
+        if self.speechBackend:
+            print(f"Recognition latency - {self.speechBackend.latencySummary()}")
+        print(f"Stage latency - {self.metrics.summary()}")
         self.startButton.config(state=tk.NORMAL)
         self.stopButton.config(state=tk.DISABLED)
-        self.feedbackLabel.config(
-            text="Listening stopped. Click 'Start Listening for Surah' to begin again.",
-            fg="#7f8c8d"
+        self.setFeedback("Listening stopped. Click 'Start Listening for Surah' to begin again.", "#7f8c8d")
+    
+    def toggleDebugPanel(self):
+        if self.debugPanel is not None:
+            self.debugPanel.destroy()
+            self.debugPanel = None
+            return
+        
+        self.debugPanel = tk.Toplevel(self.root)
+        self.debugPanel.title("Latency (F12 to close)")
+        self.debugPanel.protocol("WM_DELETE_WINDOW", self.toggleDebugPanel)
+        
+        self.debugText = tk.Text(self.debugPanel, font=("Courier", 11), width=72, height=14, bg="#ffffff")
+        self.debugText.pack(padx=10, pady=10, fill="both", expand=True)
+        
+        buttonFrame = tk.Frame(self.debugPanel)
+        buttonFrame.pack(pady=5)
+        tk.Button(buttonFrame, text="Export JSON", command=lambda: self.exportMetrics(".json")).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttonFrame, text="Export Prometheus", command=lambda: self.exportMetrics(".prom")).pack(side=tk.LEFT, padx=5)
+        
+        self.refreshDebugPanel()
+    
+    def refreshDebugPanel(self):
+        if self.debugPanel is None:
+            return
+        
+        lines = [f"{'stage':<15}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage, stats in self.metrics.snapshot().items():
+            if "p50Ms" not in stats:
+                continue
+            lines.append(
+                f"{stage:<15}{stats['count']:>7}{stats['p50Ms']:>10.1f}{stats['p95Ms']:>10.1f}"
+                f"{stats['p99Ms']:>10.1f}{stats['maxMs']:>10.1f}"
+            )
+        lines.append("")
+        lines.append(f"UI updates applied {self.uiDispatcher.appliedUpdates}, coalesced {self.uiDispatcher.coalescedUpdates}")
+        
+        self.debugText.delete(1.0, tk.END)
+        self.debugText.insert(1.0, "\n".join(lines))
+        self.debugPanel.after(1000, self.refreshDebugPanel)
+    
+    def exportMetrics(self, extension):
+        outputFilePath = filedialog.asksaveasfilename(
+            parent=self.debugPanel,
+            defaultextension=extension,
+            initialfile=f"latency{extension}"
         )
+        if not outputFilePath:
+            return
+        try:
+            self.metrics.export(outputFilePath)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not export metrics: {str(e)}")
 
 
 def main():
-    root = tk.Tk()
-    app = QuranMemorizationTool(root)
+    startupTimer = StartupTimer(LAUNCH_TIME)
+    startupTimer.record("imports", LAUNCH_TIME)
+    profiler = startProfiling()
+    with startupTimer.phase("tk"):
+        root = tk.Tk()
+    app = QuranMemorizationTool(root, startupTimer)
+    root.after_idle(startupTimer.record, "windowShown", LAUNCH_TIME)
+    root.protocol("WM_DELETE_WINDOW", app.closeApp)
     root.mainloop()
+    stopProfiling(profiler)
 
 
 if __name__ == "__main__":
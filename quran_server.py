@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+Quran Practice Server
+asyncio WebSocket/HTTP server running many learners' practice sessions over one
+shared corpus, verse index and recognizer
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from latency_metrics import LatencyMetrics
+from practice_session import SIMILARITY_THRESHOLD, PracticeSession, scoreRecitedRange
+from progress_store import ProgressStore
+from quran_corpus import QuranCorpus
+from quran_divisions import parseRangeSpec
+from speech_backends import BackendRequestError, BackendUnavailableError, UnknownSpeechError, audioFromPcm, createBackend
+from surah_resolver import SurahNameResolver
+from verse_locator import VerseLocator
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_PENDING_PER_SESSION = 4
+# About two minutes of 16 kHz 16-bit mono audio per message.
+MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION, OPCODE_TEXT, OPCODE_BINARY = 0x0, 0x1, 0x2
+OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG = 0x8, 0x9, 0xA
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+def applyMask(payload, mask):
+    """XOR payload with the repeating 4-byte mask as one big integer, not byte by byte."""
+    if not payload:
+        return payload
+    repeatedMask = (mask * (len(payload) // 4 + 1))[:len(payload)]
+    masked = int.from_bytes(payload, 'big') ^ int.from_bytes(repeatedMask, 'big')
+    return masked.to_bytes(len(payload), 'big')
+
+
+class WebSocket:
+    """
+    Minimal RFC 6455 framing over asyncio streams: text and binary messages,
+    fragmentation, ping/pong and close. Clients mask their frames, servers do not.
+    """
+    
+    def __init__(self, reader, writer, isClient=False):
+        self.reader = reader
+        self.writer = writer
+        self.isClient = isClient
+        self.closed = False
+    
+    async def readFrame(self):
+        try:
+            header = await self.reader.readexactly(2)
+            opcode = header[0] & 0x0F
+            final = bool(header[0] & 0x80)
+            masked = bool(header[1] & 0x80)
+            length = header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+            if length > MAX_MESSAGE_BYTES:
+                raise ConnectionClosed(f"Frame of {length} bytes exceeds the message limit")
+            mask = await self.reader.readexactly(4) if masked else None
+            payload = await self.reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            raise ConnectionClosed(str(e)) from e
+        if mask:
+            payload = applyMask(payload, mask)
+        return final, opcode, payload
+    
+    async def receive(self):
+        """The next text (str) or binary (bytes) message; raises ConnectionClosed."""
+        fragments = []
+        messageOpcode = None
+        while True:
+            final, opcode, payload = await self.readFrame()
+            if opcode == OPCODE_PING:
+                await self.sendFrame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode == OPCODE_CLOSE:
+                await self.close()
+                raise ConnectionClosed("Peer closed the connection")
+            
+            if opcode != OPCODE_CONTINUATION:
+                messageOpcode = opcode
+            fragments.append(payload)
+            if sum(len(fragment) for fragment in fragments) > MAX_MESSAGE_BYTES:
+                raise ConnectionClosed("Message exceeds the size limit")
+            if final:
+                message = b"".join(fragments)
+                return message.decode('utf-8') if messageOpcode == OPCODE_TEXT else message
+    
+    async def sendFrame(self, opcode, payload):
+        if self.closed and opcode != OPCODE_CLOSE:
+            raise ConnectionClosed("Connection already closed")
+        header = bytearray([0x80 | opcode])
+        maskBit = 0x80 if self.isClient else 0
+        if len(payload) < 126:
+            header.append(maskBit | len(payload))
+        elif len(payload) < 1 << 16:
+            header.append(maskBit | 126)
+            header += struct.pack("!H", len(payload))
+        else:
+            header.append(maskBit | 127)
+            header += struct.pack("!Q", len(payload))
+        if self.isClient:
+            mask = os.urandom(4)
+            header += mask
+            payload = applyMask(payload, mask)
+        try:
+            self.writer.write(bytes(header) + payload)
+            await self.writer.drain()
+        except ConnectionError as e:
+            raise ConnectionClosed(str(e)) from e
+    
+    async def send(self, message):
+        if isinstance(message, str):
+            await self.sendFrame(OPCODE_TEXT, message.encode('utf-8'))
+        else:
+            await self.sendFrame(OPCODE_BINARY, bytes(message))
+    
+    async def sendJson(self, message):
+        await self.send(json.dumps(message, ensure_ascii=False))
+    
+    async def receiveJson(self):
+        return json.loads(await self.receive())
+    
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.sendFrame(OPCODE_CLOSE, b"")
+        except ConnectionClosed:
+            pass
+        self.writer.close()
+
+
+def acceptKey(key):
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+async def readHttpRequest(reader):
+    """(method, path, headers, body) of one HTTP/1.1 request, or None at end of stream."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+    lines = head.decode('latin-1').split("\r\n")
+    try:
+        method, path, _ = lines[0].split(" ", 2)
+    except ValueError:
+        return None
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_MESSAGE_BYTES:
+        return method, path, headers, None
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def httpResponse(status, body, contentType="application/json; charset=utf-8"):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+        f"Content-Type: {contentType}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+
+class LearnerSession:
+    """
+    One connected learner: their PracticeSession plus the bounded queue of
+    messages not yet handled. handle() runs on the server's executor, one message
+    at a time per learner, so results come back in the order they were sent.
+    """
+    
+    def __init__(self, server, learner, maxPending=MAX_PENDING_PER_SESSION):
+        self.server = server
+        self.learner = learner
+        self.session = PracticeSession(server.corpus, server.threshold, metrics=server.metrics)
+        self.queue = asyncio.Queue(maxsize=maxPending)
+        self.sampleRate = 16000
+        self.pendingAttempt = None
+    
+    def handle(self, message):
+        """Handle one client message (a JSON dict or a bytes audio phrase); returns the reply dict."""
+        if isinstance(message, bytes):
+            return self.handleAudio(message)
+        
+        kind = message.get("type")
+        if kind == "start":
+            return self.handleStart(message)
+        if kind == "transcript":
+            return self.handleTranscript(str(message.get("text", "")))
+        if kind == "stop":
+            self.flushPendingAttempt()
+            self.session.clear()
+            return {"type": "stopped"}
+        return {"type": "error", "message": f"Unknown message type '{kind}'"}
+    
+    def handleStart(self, message):
+        self.learner = message.get("learner") or self.learner
+        self.sampleRate = int(message.get("sampleRate") or self.sampleRate)
+        self.flushPendingAttempt()
+        try:
+            if message.get("range"):
+                start, stop, label = parseRangeSpec(message["range"])
+                started = self.session.startRange(start, stop, label)
+            elif message.get("surah"):
+                started = self.session.startSurah(
+                    int(message["surah"]), message.get("startAyah"), message.get("endAyah")
+                )
+            else:
+                # No range yet: the first transcript names a surah or starts anywhere in the Quran.
+                self.session.clear()
+                return {"type": "listening"}
+        except (TypeError, ValueError) as e:
+            return {"type": "error", "message": str(e)}
+        if not started:
+            return {"type": "error", "message": "Range not found in the corpus"}
+        return self.ayahMessage()
+    
+    def handleAudio(self, pcmData):
+        if self.server.backend is None:
+            return {"type": "error", "message": "No speech backend configured; start the server with --backend"}
+        startTime = time.perf_counter()
+        try:
+            transcript = self.server.backend.transcribe(audioFromPcm(pcmData, self.sampleRate))
+        except UnknownSpeechError:
+            return {"type": "unrecognized"}
+        except (BackendRequestError, BackendUnavailableError, ImportError) as e:
+            return {"type": "error", "message": f"Error with speech recognition: {str(e)}"}
+        finally:
+            self.server.metrics.recordSince("recognize", startTime)
+        reply = self.handleTranscript(transcript)
+        reply["transcript"] = transcript
+        return reply
+    
+    def handleTranscript(self, text):
+        if not self.session.ayahList:
+            return self.detectStart(text)
+        if self.session.isFinished():
+            return {"type": "finished", "label": self.session.label}
+        
+        aligner, feedback = self.session.submitTranscript(text)
+        return self.feedbackReply(aligner, feedback)
+    
+    def feedbackReply(self, aligner, feedback):
+        """Feedback on the current ayah's recitation; advances (and says so) once the ayah completes."""
+        surahNum, ayahNum, _ = self.session.currentAyah()
+        reply = {
+            "type": "feedback",
+            "surah": surahNum,
+            "ayah": ayahNum,
+            "similarity": round(feedback.similarity * 100, 1),
+            "prefixSimilarity": round(feedback.prefixSimilarity * 100, 1),
+            "onTrack": self.session.prefixVerdict(feedback),
+            "opcodes": feedback.opcodes,
+            "completed": False,
+        }
+        
+        if self.session.isAyahComplete(feedback) and self.session.markCompleted():
+            self.pendingAttempt = None
+            self.recordAttempt(aligner, feedback)
+            self.session.advance(carryOver=True)
+            reply["completed"] = True
+            reply["next"] = self.ayahMessage()
+        elif reply["onTrack"] is False:
+            self.pendingAttempt = (aligner, feedback)
+        return reply
+    
+    def detectStart(self, text):
+        located = self.server.locator.bestMatch(text)
+        started = self.session.startAtLocation(located, text) if located else None
+        if started is not None:
+            # The phrase that located the ayah is also the start of its recitation.
+            reply = self.ayahMessage(located=True)
+            reply["feedback"] = self.feedbackReply(*started)
+            return reply
+        surahNum = self.server.resolver.bestMatch(text, self.server.corpus)
+        if surahNum and self.session.startSurah(surahNum):
+            return self.ayahMessage()
+        return {"type": "unrecognized", "text": text}
+    
+    def ayahMessage(self, located=False):
+        if self.session.isFinished():
+            return {"type": "finished", "label": self.session.label}
+        surahNum, ayahNum, text = self.session.currentAyah()
+        return {
+            "type": "ayah",
+            "surah": surahNum,
+            "ayah": ayahNum,
+            "text": text,
+            "index": self.session.currentAyahIndex,
+            "count": len(self.session.ayahList),
+            "located": located,
+        }
+    
+    def recordAttempt(self, aligner, feedback):
+        progressStore = self.server.progressStoreFor(self.learner)
+        if progressStore is None:
+            return
+        score = self.session.ayahScore(aligner, feedback)
+        # Every learner's store writes to the same file; a locked database must not stall the session.
+        try:
+            progressStore.recordAttempt(
+                score["surah"], score["ayah"], score["similarity"], score["passed"], score["missingWords"]
+            )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save progress for {self.learner}: {str(e)}")
+    
+    def flushPendingAttempt(self):
+        if self.pendingAttempt and self.session.isCurrent(self.pendingAttempt[0]):
+            self.recordAttempt(*self.pendingAttempt)
+        self.pendingAttempt = None
+
+
+class PracticeServer:
+    """
+    Serves practice sessions to many learners from one process. The corpus is
+    memory-mapped once, the verse index and surah resolver are built once, and
+    the speech backend's model is loaded once; all are read-only while serving.
+    Recognition and scoring run on a bounded thread pool (recognizers release the
+    GIL while decoding); each learner may have at most maxPending messages
+    waiting, after which the server stops reading their socket until one is done.
+    """
+    
+    def __init__(self, corpus, backend=None, threshold=SIMILARITY_THRESHOLD, workers=None,
+                 maxPending=MAX_PENDING_PER_SESSION, progressPath=None):
+        self.corpus = corpus
+        self.backend = backend
+        self.threshold = threshold
+        self.maxPending = maxPending
+        self.progressPath = progressPath
+        self.progressStores = {}
+        self.progressStoresLock = threading.Lock()
+        self.metrics = LatencyMetrics()
+        self.locator = VerseLocator(corpus)
+        self.resolver = SurahNameResolver()
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1, thread_name_prefix="practice")
+        self.sessions = set()
+        self.server = None
+    
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.locator.build)
+        if self.backend is not None:
+            await loop.run_in_executor(self.executor, self.backend.load)
+        self.server = await asyncio.start_server(self.handleConnection, host, port, limit=MAX_MESSAGE_BYTES)
+        return self.server.sockets[0].getsockname()[:2]
+    
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+        with self.progressStoresLock:
+            for progressStore in self.progressStores.values():
+                progressStore.close()
+    
+    def progressStoreFor(self, learner):
+        """The learner's store, opened once; called from executor threads. None without --progress."""
+        if not self.progressPath:
+            return None
+        with self.progressStoresLock:
+            progressStore = self.progressStores.get(learner)
+            if progressStore is None:
+                try:
+                    progressStore = self.progressStores[learner] = ProgressStore(self.progressPath, learner)
+                except sqlite3.Error as e:
+                    print(f"Warning: Could not open progress for {learner}: {str(e)}")
+            return progressStore
+    
+    async def handleConnection(self, reader, writer):
+        try:
+            request = await readHttpRequest(reader)
+            if request is None:
+                return
+            method, path, headers, body = request
+            if headers.get("upgrade", "").lower() == "websocket" and headers.get("sec-websocket-key"):
+                writer.write((
+                    "HTTP/1.1 101 Switching Protocols\r\n"
+                    "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                    f"Sec-WebSocket-Accept: {acceptKey(headers['sec-websocket-key'])}\r\n\r\n"
+                ).encode('latin-1'))
+                await writer.drain()
+                await self.runSession(WebSocket(reader, writer), path)
+                return
+            writer.write(await self.handleHttp(method, path, body))
+            await writer.drain()
+        finally:
+            writer.close()
+    
+    async def handleHttp(self, method, path, body):
+        if body is None:
+            return httpResponse(413, json.dumps({"error": "Request body too large"}))
+        if method == "GET" and path == "/health":
+            return httpResponse(200, json.dumps({"status": "ok", "sessions": len(self.sessions)}))
+        if method == "GET" and path == "/metrics":
+            return httpResponse(200, self.metrics.toPrometheus(), "text/plain; version=0.0.4")
+        if method == "POST" and path == "/score":
+            try:
+                request = json.loads(body or b"{}")
+                score = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, scoreRecitedRange, self.corpus, int(request["surah"]),
+                    int(request.get("startAyah", 1)), int(request.get("endAyah", request.get("startAyah", 1))),
+                    str(request.get("transcript", "")), self.threshold,
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                return httpResponse(400, json.dumps({"error": str(e)}))
+            return httpResponse(200, json.dumps(score, ensure_ascii=False))
+        return httpResponse(404, json.dumps({"error": f"No route for {method} {path}"}))
+    
+    async def runSession(self, socket, path):
+        learner = path.rsplit("/", 1)[-1] if path.startswith("/session/") else "default"
+        learnerSession = LearnerSession(self, learner, self.maxPending)
+        self.sessions.add(learnerSession)
+        worker = asyncio.ensure_future(self.processMessages(socket, learnerSession))
+        try:
+            while not worker.done():
+                message = await socket.receive()
+                if isinstance(message, str):
+                    try:
+                        message = json.loads(message)
+                    except ValueError:
+                        await socket.sendJson({"type": "error", "message": "Messages must be JSON or binary audio"})
+                        continue
+                # Blocks when the learner already has maxPending messages waiting.
+                await learnerSession.queue.put((time.perf_counter(), message))
+        except ConnectionClosed:
+            pass
+        finally:
+            # Nobody is left to answer, so drop what is still queued and let the worker finish.
+            while not learnerSession.queue.empty():
+                learnerSession.queue.get_nowait()
+            learnerSession.queue.put_nowait(None)
+            await worker
+            await asyncio.get_running_loop().run_in_executor(self.executor, learnerSession.flushPendingAttempt)
+            self.sessions.discard(learnerSession)
+            await socket.close()
+    
+    async def processMessages(self, socket, learnerSession):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await learnerSession.queue.get()
+            if item is None:
+                return
+            receivedAt, message = item
+            reply = await loop.run_in_executor(self.executor, self.timedHandle, learnerSession, message, receivedAt)
+            if isinstance(message, dict) and "id" in message:
+                reply["id"] = message["id"]
+            try:
+                await socket.sendJson(reply)
+            except ConnectionClosed:
+                return
+            self.metrics.recordSince("endToEnd", receivedAt)
+    
+    def timedHandle(self, learnerSession, message, receivedAt):
+        self.metrics.recordSince("queueWait", receivedAt)
+        try:
+            return learnerSession.handle(message)
+        except Exception as e:
+            print(f"Warning: Session {learnerSession.learner} failed to handle a message: {str(e)}")
+            return {"type": "error", "message": str(e)}
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description="Serve Quran practice sessions to many learners over WebSocket/HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"interface to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--csv", default="quran.csv", help="Quran text CSV (default: quran.csv)")
+    parser.add_argument("--backend", help="speech backend for audio messages (google, vosk, whisper, fake)")
+    parser.add_argument("--model", help="model path or name for the speech backend")
+    parser.add_argument("--workers", type=int, help="recognition/scoring threads (default: one per core)")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING_PER_SESSION,
+                        help=f"messages a learner may have waiting before reads pause (default: {MAX_PENDING_PER_SESSION})")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="pass threshold in percent")
+    parser.add_argument("--progress", help="SQLite progress database; attempts are stored per learner")
+    parser.add_argument("--metrics", help="write per-stage latency stats here on shutdown (.prom or JSON)")
+    return parser.parse_args(argv)
+
+
+async def serve(args, corpus, backend):
+    server = PracticeServer(corpus, backend, args.threshold, args.workers, args.max_pending, args.progress)
+    try:
+        host, port = await server.start(args.host, args.port)
+    except BackendUnavailableError:
+        await server.close()
+        raise
+    print(f"Serving {len(corpus)} ayahs on ws://{host}:{port}/session/<learner> and http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if args.metrics:
+            server.metrics.export(args.metrics)
+        await server.close()
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+    if not os.path.exists(args.csv):
+        print(f"Error: File {args.csv} not found.", file=sys.stderr)
+        return 2
+    try:
+        backend = createBackend(args.backend, model=args.model) if args.backend else None
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 2
+    with QuranCorpus.load(args.csv) as corpus:
+        try:
+            asyncio.run(serve(args, corpus, backend))
+        except BackendUnavailableError as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            return 2
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Incremental Recitation Aligner
+Word-level alignment of a growing recitation against the correct ayah
+"""
+
+from array import array
+from collections import namedtuple
+from itertools import accumulate
+
+from arabic_text import keysMatch, phoneticKey
+
+
+AlignmentResult = namedtuple(
+    "AlignmentResult",
+    ["similarity", "correctMatches", "recitedMatches", "prefixSimilarity", "frontier", "scoredWords"],
+)
+
+
+def wordWeight(word):
+    return len(word) + 1
+
+
+class IncrementalAligner:
+    """
+    Weighted longest-common-subsequence alignment over normalized words.
+    Every matched word counts its characters plus the separating space, so the
+    similarity stays on the same 2*M/T scale as difflib's character ratio.
+    Each recited word adds one DP row, so a chunk costs O(chunk words x ayah words).
+    
+    Words match when their phonetic keys are within a weighted edit distance
+    (see arabic_text.keysMatch), so spelling variants and long-vowel slips still
+    count. Each distinct recited key is compared against the ayah's distinct keys
+    once, and the resulting position vector is reused by every later DP row; a
+    fuzzy match is credited with the lighter of the two words.
+    
+    While an ayah is still being recited, the full similarity understates a
+    correct start, so result() also scores the recitation against the ayah's
+    prefix up to the furthest aligned word (the frontier). Backtracking prefers
+    the earliest correct position, so a word repeated later in the ayah does not
+    pull the frontier ahead of the learner. Once the last word has aligned, any
+    words recited after it belong to the next ayah: result() scores only the
+    first scoredWords recited words, and overflowWords() returns the rest.
+    """
+    
+    def __init__(self, correctWords, correctKeys=None):
+        """correctKeys are the words' phonetic keys, e.g. precomputed by the corpus."""
+        self.correctWords = tuple(correctWords)
+        self.correctWeights = [0] + [wordWeight(word) for word in self.correctWords]
+        self.correctTotal = sum(self.correctWeights)
+        if correctKeys is None:
+            correctKeys = [phoneticKey(word) for word in self.correctWords]
+        self.keyPositions = {}
+        for position, key in enumerate(correctKeys, 1):
+            self.keyPositions.setdefault(key, []).append(position)
+        self.matchPositionsByKey = {}
+        self.reset()
+    
+    def reset(self):
+        self.recitedWords = []
+        self.recitedPositions = []
+        self.recitedTotal = 0
+        self.rows = [array('I', bytes(4 * (len(self.correctWords) + 1)))]
+    
+    def matchPositions(self, word):
+        """1-based positions of the correct words this recited word matches."""
+        key = phoneticKey(word)
+        positions = self.matchPositionsByKey.get(key)
+        if positions is None:
+            positions = []
+            for correctKey, keyPositions in self.keyPositions.items():
+                if keysMatch(key, correctKey):
+                    positions.extend(keyPositions)
+            positions = self.matchPositionsByKey[key] = tuple(sorted(positions))
+        return positions
+    
+    def extend(self, newWords):
+        for word in newWords:
+            previous = self.rows[-1]
+            weight = wordWeight(word)
+            positions = self.matchPositions(word)
+            candidates = list(previous)
+            for position in positions:
+                candidates[position] = previous[position - 1] + min(weight, self.correctWeights[position])
+            self.rows.append(array('I', accumulate(candidates, max)))
+            self.recitedWords.append(word)
+            self.recitedPositions.append(positions)
+            self.recitedTotal += weight
+        return self.result()
+    
+    def recitedLength(self):
+        return max(self.recitedTotal - 1, 0)
+    
+    def matchedWeight(self, recitedCount=None):
+        return self.rows[len(self.recitedWords) if recitedCount is None else recitedCount][-1]
+    
+    def recitedWeight(self, recitedCount):
+        return sum(wordWeight(word) for word in self.recitedWords[:recitedCount])
+    
+    def similarity(self, recitedCount=None):
+        """Similarity to the whole ayah, over the first recitedCount recited words (default: all)."""
+        recitedTotal = self.recitedTotal if recitedCount is None else self.recitedWeight(recitedCount)
+        total = self.correctTotal + recitedTotal
+        if not total:
+            return 1.0
+        return 2.0 * self.matchedWeight(recitedCount) / total
+    
+    def prefixSimilarity(self, frontier, recitedCount=None):
+        recitedTotal = self.recitedTotal if recitedCount is None else self.recitedWeight(recitedCount)
+        total = sum(self.correctWeights[:frontier + 1]) + recitedTotal
+        if not total:
+            return 1.0
+        return 2.0 * self.matchedWeight(recitedCount) / total
+    
+    def bestRecitedCount(self):
+        """
+        How many leading recited words best cover the ayah: the earliest count that
+        maximizes matched weight minus unmatched recited weight. Used to find where
+        an ayah ends inside a longer recitation without consuming the next ayah.
+        """
+        bestCount, bestScore, recitedTotal = 0, 0, 0
+        for count, word in enumerate(self.recitedWords, 1):
+            recitedTotal += wordWeight(word)
+            score = 2 * self.rows[count][-1] - recitedTotal
+            if score > bestScore:
+                bestCount, bestScore = count, score
+        return bestCount
+    
+    def overflowWords(self):
+        """Recited words after the one aligned to the ayah's last word, i.e. the start of the next ayah."""
+        return self.recitedWords[self.result().scoredWords:]
+    
+    def backtrack(self, recitedCount):
+        correctMatches = [False] * len(self.correctWords)
+        recitedMatches = [False] * len(self.recitedWords)
+        
+        recitedIndex, correctIndex = recitedCount, len(self.correctWords)
+        while recitedIndex and correctIndex:
+            row, previous = self.rows[recitedIndex], self.rows[recitedIndex - 1]
+            weight = min(wordWeight(self.recitedWords[recitedIndex - 1]), self.correctWeights[correctIndex])
+            if row[correctIndex - 1] == row[correctIndex]:
+                correctIndex -= 1
+            elif (correctIndex in self.recitedPositions[recitedIndex - 1]
+                    and row[correctIndex] == previous[correctIndex - 1] + weight):
+                recitedIndex -= 1
+                correctIndex -= 1
+                correctMatches[correctIndex] = True
+                recitedMatches[recitedIndex] = True
+            elif previous[correctIndex] >= row[correctIndex - 1]:
+                recitedIndex -= 1
+            else:
+                correctIndex -= 1
+        return correctMatches, recitedMatches
+    
+    def result(self):
+        recitedCount = len(self.recitedWords)
+        correctMatches, recitedMatches = self.backtrack(recitedCount)
+        if correctMatches and correctMatches[-1]:
+            # Words after the one aligned to the ayah's last word run into the next
+            # ayah; they are neither scored here nor allowed to claim matches.
+            lastMatched = max(index for index, matched in enumerate(recitedMatches) if matched)
+            if lastMatched + 1 < recitedCount:
+                recitedCount = lastMatched + 1
+                correctMatches, recitedMatches = self.backtrack(recitedCount)
+        
+        frontier = next((index + 1 for index in range(len(correctMatches) - 1, -1, -1) if correctMatches[index]), 0)
+        return AlignmentResult(
+            self.similarity(recitedCount), correctMatches, recitedMatches,
+            self.prefixSimilarity(frontier, recitedCount), frontier, recitedCount,
+        )
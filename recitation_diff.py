@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Recitation Diff
+Turns a word alignment into opcode spans and Tk text tag ranges
+"""
+
+from collections import namedtuple
+
+from arabic_text import normalizeArabic, tokenizeArabic
+
+
+RecitationFeedback = namedtuple(
+    "RecitationFeedback",
+    ["similarity", "recitedLength", "opcodes", "correctRanges", "recitedRanges", "prefixSimilarity", "reachedEnd"],
+)
+
+CORRECT_WIDGET_TAGS = {"missing": "highlight", "substituted": "substituted"}
+RECITED_WIDGET_TAGS = {"equal": "correct", "extra": "incorrect", "substituted": "incorrect"}
+
+
+def alignmentOpcodes(alignment):
+    """
+    Return difflib-style (tag, correctStart, correctEnd, recitedStart, recitedEnd)
+    word spans where tag is 'equal', 'missing', 'extra' or 'substituted'.
+    """
+    correctMatched = [index for index, matched in enumerate(alignment.correctMatches) if matched]
+    recitedMatched = [index for index, matched in enumerate(alignment.recitedMatches) if matched]
+    anchors = list(zip(correctMatched, recitedMatched))
+    anchors.append((len(alignment.correctMatches), len(alignment.recitedMatches)))
+    
+    opcodes = []
+    correctIndex = recitedIndex = 0
+    for correctAnchor, recitedAnchor in anchors:
+        if correctIndex < correctAnchor and recitedIndex < recitedAnchor:
+            opcodes.append(("substituted", correctIndex, correctAnchor, recitedIndex, recitedAnchor))
+        elif correctIndex < correctAnchor:
+            opcodes.append(("missing", correctIndex, correctAnchor, recitedIndex, recitedIndex))
+        elif recitedIndex < recitedAnchor:
+            opcodes.append(("extra", correctIndex, correctIndex, recitedIndex, recitedAnchor))
+        
+        if correctAnchor == len(alignment.correctMatches) and recitedAnchor == len(alignment.recitedMatches):
+            break
+        if opcodes and opcodes[-1][0] == "equal" and opcodes[-1][2] == correctAnchor and opcodes[-1][4] == recitedAnchor:
+            _, correctStart, _, recitedStart, _ = opcodes[-1]
+            opcodes[-1] = ("equal", correctStart, correctAnchor + 1, recitedStart, recitedAnchor + 1)
+        else:
+            opcodes.append(("equal", correctAnchor, correctAnchor + 1, recitedAnchor, recitedAnchor + 1))
+        correctIndex, recitedIndex = correctAnchor + 1, recitedAnchor + 1
+    
+    return opcodes
+
+
+def markPending(opcodes):
+    """
+    The words after the last aligned one have not been reached yet, so a trailing
+    'missing' span becomes 'pending'. A trailing 'substituted' span splits into
+    the recited words, which are still wrong, and the pending rest of the ayah.
+    """
+    if not opcodes or opcodes[-1][0] not in ("missing", "substituted"):
+        return opcodes
+    tag, correctStart, correctEnd, recitedStart, recitedEnd = opcodes[-1]
+    tail = [("pending", correctStart, correctEnd, recitedEnd, recitedEnd)]
+    if tag == "substituted":
+        tail.insert(0, ("extra", correctStart, correctStart, recitedStart, recitedEnd))
+    return opcodes[:-1] + tail
+
+
+def markOverflow(opcodes, scoredWords):
+    """
+    Recited words after the one aligned to the ayah's last word start the next
+    ayah, so a trailing 'extra' span past scoredWords becomes 'overflow'.
+    """
+    if not opcodes or opcodes[-1][0] != "extra" or opcodes[-1][3] < scoredWords:
+        return opcodes
+    return opcodes[:-1] + [("overflow",) + opcodes[-1][1:]]
+
+
+def wordSpans(rawText):
+    """
+    Character (start, end) offsets in rawText of every normalized word, so spans
+    found on diacritic-free words can be highlighted on the displayed text.
+    Standalone marks such as waqf signs normalize to nothing and get no span.
+    Returns None if the per-token words disagree with whole-text normalization.
+    """
+    spans = []
+    position = 0
+    for token in rawText.split():
+        start = rawText.index(token, position)
+        position = start + len(token)
+        for _ in tokenizeArabic(normalizeArabic(token)):
+            spans.append((start, position))
+    
+    if len(spans) != len(tokenizeArabic(normalizeArabic(rawText))):
+        return None
+    return spans
+
+
+def tagRanges(opcodes, spans, widgetTags, baseIndex, side):
+    """
+    Map word opcodes onto Tk text indices relative to baseIndex.
+    side selects the correct (1) or recited (3) word range of each opcode.
+    """
+    ranges = {tag: [] for tag in set(widgetTags.values())}
+    if spans is None:
+        return ranges
+    
+    for opcode in opcodes:
+        tag = widgetTags.get(opcode[0])
+        wordStart, wordEnd = opcode[side], opcode[side + 1]
+        if tag is None or wordStart == wordEnd:
+            continue
+        ranges[tag].append((
+            f"{baseIndex}+{spans[wordStart][0]}c",
+            f"{baseIndex}+{spans[wordEnd - 1][1]}c",
+        ))
+    return ranges
+
+
+def correctTagRanges(opcodes, spans, baseIndex):
+    return tagRanges(opcodes, spans, CORRECT_WIDGET_TAGS, baseIndex, 1)
+
+
+def recitedTagRanges(opcodes, spans, baseIndex="1.0"):
+    return tagRanges(opcodes, spans, RECITED_WIDGET_TAGS, baseIndex, 3)
+
+
+def buildRecitationFeedback(alignment, recitedLength, correctSpans, correctBaseIndex, recitedText):
+    opcodes = markOverflow(markPending(alignmentOpcodes(alignment)), alignment.scoredWords)
+    return RecitationFeedback(
+        alignment.similarity,
+        recitedLength,
+        opcodes,
+        correctTagRanges(opcodes, correctSpans, correctBaseIndex),
+        recitedTagRanges(opcodes, wordSpans(recitedText)),
+        alignment.prefixSimilarity,
+        bool(alignment.correctMatches) and alignment.frontier == len(alignment.correctMatches),
+    )
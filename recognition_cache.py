@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Recognition Cache
+LRU cache of recognition results keyed by an acoustic fingerprint of the phrase
+audio, with an optional SQLite tier so results survive between runs
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from speech_backends import RecognitionBackend, UnknownSpeechError
+
+
+CACHE_ENV_VAR = "QURAN_RECOGNITION_CACHE"
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_DISK_TTL_SECONDS = 30 * 86400
+DEFAULT_MAX_DISK_ENTRIES = 100000
+DISK_PRUNE_INTERVAL = 200
+
+FINGERPRINT_RATE = 8000
+FINGERPRINT_FRAME_MS = 20
+FINGERPRINT_LEVELS = 16
+# Zero crossings per bucket in a 20 ms frame sampled at 4 kHz, i.e. about 75 Hz of dominant frequency.
+FINGERPRINT_CROSSING_BUCKET = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recognitions (
+    key TEXT PRIMARY KEY,
+    transcript TEXT,
+    storedAt REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS recognitionsByAge ON recognitions (storedAt);
+"""
+
+
+def audioFingerprint(audio):
+    """
+    Hash of the phrase's loudness and pitch contour: 20 ms frames of 8 kHz audio,
+    each reduced to one of 16 loudness levels relative to the loudest frame plus
+    a coarse zero-crossing count, with silent frames trimmed from both ends. The
+    zero crossings tell apart phrases with the same rhythm but different sounds.
+    Replays of the same audio, at any gain or with a little more leading or
+    trailing silence, get the same fingerprint.
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        pcmData = bytes(audio)
+    else:
+        pcmData = audio.get_raw_data(convert_rate=FINGERPRINT_RATE, convert_width=2)
+    samples = array('h')
+    samples.frombytes(pcmData[:len(pcmData) - len(pcmData) % 2])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    
+    frameLength = FINGERPRINT_RATE * FINGERPRINT_FRAME_MS // 1000
+    # Every other sample is plenty for an envelope and halves the cost.
+    frames = [samples[start:start + frameLength:2] for start in range(0, len(samples), frameLength)]
+    energies = [sum(map(abs, frame)) for frame in frames]
+    peak = max(energies, default=0) or 1
+    levels = [min(FINGERPRINT_LEVELS - 1, energy * FINGERPRINT_LEVELS // peak) for energy in energies]
+    voiced = [index for index, level in enumerate(levels) if level]
+    
+    contour = bytearray()
+    for index in range(voiced[0], voiced[-1] + 1) if voiced else ():
+        frame = frames[index]
+        crossings = sum(1 for previous, sample in zip(frame, frame[1:]) if (previous < 0) != (sample < 0))
+        contour += bytes((levels[index], crossings // FINGERPRINT_CROSSING_BUCKET if levels[index] else 0))
+    return hashlib.blake2b(bytes(contour), digest_size=16).hexdigest()
+
+
+def backendIdentity(backend):
+    """Backend name plus model, so switching models never serves stale transcripts."""
+    model = getattr(backend, "modelPath", None) or getattr(backend, "modelName", None)
+    return f"{backend.name}:{model}" if model else backend.name
+
+
+class RecognitionCache:
+    """
+    In-memory LRU of key -> transcript (None for unintelligible audio), bounded
+    by maxEntries and expiring entries after ttlSeconds. With diskPath, misses
+    fall through to a SQLite table with its own, longer TTL and row limit, and
+    disk hits are promoted into memory. Safe to share between threads.
+    """
+    
+    def __init__(self, maxEntries=DEFAULT_MAX_ENTRIES, ttlSeconds=DEFAULT_TTL_SECONDS, diskPath=None,
+                 diskTtlSeconds=DEFAULT_DISK_TTL_SECONDS, maxDiskEntries=DEFAULT_MAX_DISK_ENTRIES):
+        self.maxEntries = maxEntries
+        self.ttlSeconds = ttlSeconds
+        self.diskPath = diskPath
+        self.diskTtlSeconds = diskTtlSeconds
+        self.maxDiskEntries = maxDiskEntries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.diskWrites = 0
+        
+        self.connection = None
+        if diskPath:
+            try:
+                self.connection = sqlite3.connect(diskPath, check_same_thread=False)
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute("PRAGMA synchronous=NORMAL")
+                self.connection.executescript(SCHEMA)
+            except sqlite3.Error as e:
+                print(f"Warning: Recognition cache {diskPath} unavailable, keeping results in memory only: {str(e)}")
+                self.connection = None
+    
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *excInfo):
+        self.close()
+    
+    def key(self, backend, audio, languages):
+        return f"{backendIdentity(backend)}|{','.join(languages)}|{audioFingerprint(audio)}"
+    
+    def get(self, key, now=None):
+        """(found, transcript); a found None transcript means the audio was unintelligible."""
+        now = time.time() if now is None else now
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                transcript, storedAt = entry
+                if now - storedAt <= self.ttlSeconds:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, transcript
+                del self.entries[key]
+                self.expirations += 1
+            
+            row = self.diskLookup(key, now)
+            if row is None:
+                self.misses += 1
+                return False, None
+            transcript, _ = row
+            # Promoted entries start a fresh memory TTL; the disk tier keeps its own age.
+            self.storeInMemory(key, transcript, now)
+            self.hits += 1
+            self.diskHits += 1
+            return True, transcript
+    
+    def put(self, key, transcript, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.storeInMemory(key, transcript, now)
+            if self.connection is None:
+                return
+            try:
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO recognitions (key, transcript, storedAt) VALUES (?, ?, ?)",
+                        (key, transcript, now)
+                    )
+                    self.diskWrites += 1
+                    if self.diskWrites % DISK_PRUNE_INTERVAL == 0:
+                        self.pruneDisk(now)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not write recognition cache: {str(e)}")
+    
+    def storeInMemory(self, key, transcript, now):
+        self.entries[key] = (transcript, now)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def diskLookup(self, key, now):
+        if self.connection is None:
+            return None
+        try:
+            return self.connection.execute(
+                "SELECT transcript, storedAt FROM recognitions WHERE key = ? AND storedAt >= ?",
+                (key, now - self.diskTtlSeconds)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not read recognition cache: {str(e)}")
+            return None
+    
+    def pruneDisk(self, now):
+        self.connection.execute("DELETE FROM recognitions WHERE storedAt < ?", (now - self.diskTtlSeconds,))
+        self.connection.execute(
+            "DELETE FROM recognitions WHERE storedAt < ("
+            " SELECT storedAt FROM recognitions ORDER BY storedAt DESC LIMIT 1 OFFSET ?)",
+            (self.maxDiskEntries - 1,)
+        )
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "diskHits": self.diskHits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+    
+    def summary(self):
+        stats = self.stats()
+        diskNote = f" ({stats['diskHits']} from disk)" if self.diskPath else ""
+        return (
+            f"cache {stats['hits']} hits{diskNote}, {stats['misses']} misses, "
+            f"hit rate {stats['hitRate']:.0%}, {stats['evictions']} evicted, {stats['expirations']} expired"
+        )
+
+
+class CachingBackend(RecognitionBackend):
+    """
+    Wraps another backend: phrases whose fingerprint is cached skip recognition
+    entirely, including every language a surah-name phrase would be tried in.
+    Unintelligible results are cached too; request errors are not, so they are
+    retried next time.
+    """
+    
+    def __init__(self, backend, cache=None):
+        super().__init__()
+        self.backend = backend
+        self.cache = cache if cache is not None else RecognitionCache()
+        self.name = backend.name
+        self.orderDependent = backend.orderDependent
+    
+    def load(self):
+        self.backend.load()
+        self.loaded = True
+    
+    def transcribe(self, audio, languages=("ar-SA",)):
+        key = self.cache.key(self.backend, audio, languages)
+        found, transcript = self.cache.get(key)
+        if found:
+            if transcript is None:
+                raise UnknownSpeechError("Cached unintelligible phrase")
+            return transcript
+        
+        try:
+            transcript = self.backend.transcribe(audio, languages)
+        except UnknownSpeechError:
+            self.cache.put(key, None)
+            raise
+        self.cache.put(key, transcript)
+        return transcript
+    
+    def latencyStats(self):
+        stats = self.backend.latencyStats()
+        stats["cache"] = self.cache.stats()
+        return stats
+    
+    def latencySummary(self):
+        return f"{self.backend.latencySummary()}; {self.cache.summary()}"
+
+
+def cachePath():
+    return os.environ.get(CACHE_ENV_VAR) or None
+
+
+def withRecognitionCache(backend, diskPath=None):
+    """backend behind an in-memory cache, persisted to diskPath (default: QURAN_RECOGNITION_CACHE) if set."""
+    return CachingBackend(backend, RecognitionCache(diskPath=diskPath or cachePath()))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Session Replay
+Feed a recorded session back through recognition and recitation scoring faster
+than real time, or export its phrases as WAV files for review
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+
+from latency_metrics import LatencyMetrics
+from practice_session import SIMILARITY_THRESHOLD, PracticeSession
+from quran_corpus import QuranCorpus
+from recognition_cache import CACHE_ENV_VAR, withRecognitionCache
+from session_recorder import AudioRingBuffer
+from speech_backends import BackendRequestError, UnknownSpeechError, createBackend
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(description="Re-score or export a recorded practice session.")
+    parser.add_argument("recording", help="session recording written with QURAN_RECORD")
+    parser.add_argument("--csv", default="quran.csv", help="Quran text CSV (default: quran.csv)")
+    parser.add_argument("--backend", help="speech backend (google, vosk, whisper, fake)")
+    parser.add_argument("--model", help="model path or name for the speech backend")
+    parser.add_argument("--cache", help=f"SQLite recognition cache shared across replays (default: ${CACHE_ENV_VAR})")
+    parser.add_argument("--workers", type=int, default=4, help="phrases recognized in parallel (default: 4; the fake backend uses 1)")
+    parser.add_argument("--surah", type=int, help="only replay this surah")
+    parser.add_argument("--ayah", type=int, help="only replay this ayah (needs --surah)")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="pass threshold in percent")
+    parser.add_argument("--output", help="write one JSON line per ayah attempt here (default: stdout)")
+    parser.add_argument("--metrics", help="write per-stage latency stats here (.prom for Prometheus text, else JSON)")
+    parser.add_argument("--export", metavar="DIRECTORY", help="write each phrase as a WAV file instead of scoring")
+    return parser.parse_args(argv)
+
+
+def selectSegments(recording, surahNum=None, ayahNum=None):
+    """Ayah-mode segments, optionally limited to one surah or ayah."""
+    return [
+        segment for segment in recording.segments()
+        if segment.mode == "ayah" and segment.surah
+        and (surahNum is None or segment.surah == surahNum)
+        and (ayahNum is None or segment.ayah == ayahNum)
+    ]
+
+
+def exportSegments(recording, segments, outputDirectory):
+    os.makedirs(outputDirectory, exist_ok=True)
+    for segment in segments:
+        outputFilePath = os.path.join(
+            outputDirectory, f"{segment.number:06d}_{segment.surah:03d}_{segment.ayah:03d}.wav"
+        )
+        with wave.open(outputFilePath, 'wb') as waveFile:
+            waveFile.setnchannels(1)
+            waveFile.setsampwidth(recording.sampleWidth)
+            waveFile.setframerate(recording.sampleRate)
+            waveFile.writeframes(recording.pcm(segment))
+    return len(segments)
+
+
+def recognizeSegments(recording, segments, backend, workers, metrics=None):
+    """
+    Transcripts of the segments in order ('' for unintelligible), recognized on
+    a thread pool, or one at a time for a backend that replays by call order.
+    """
+    
+    def recognize(segment):
+        startTime = time.perf_counter()
+        try:
+            return backend.transcribe(recording.audio(segment), ("ar-SA",))
+        except (UnknownSpeechError, BackendRequestError):
+            return ""
+        finally:
+            if metrics:
+                metrics.recordSince("recognize", startTime)
+    
+    if backend.orderDependent:
+        workers = 1
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(recognize, segments))
+
+
+def replayAttempts(corpus, segments, transcripts, threshold=SIMILARITY_THRESHOLD, metrics=None):
+    """
+    Consecutive segments recorded for the same ayah form one attempt; each is
+    replayed phrase by phrase, as the GUI saw it, and scored with the current matcher.
+    """
+    session = PracticeSession(corpus, threshold=threshold, metrics=metrics)
+    recorded = zip(segments, transcripts)
+    for (surahNum, ayahNum), attempt in groupby(recorded, key=lambda item: (item[0].surah, item[0].ayah)):
+        attempt = list(attempt)
+        if not session.startSurah(surahNum, ayahNum, ayahNum):
+            print(f"Warning: Surah {surahNum}, Ayah {ayahNum} not in the corpus; skipping", file=sys.stderr)
+            continue
+        aligner = feedback = None
+        for _, transcript in attempt:
+            if transcript:
+                aligner, feedback = session.submitTranscript(transcript)
+        if feedback is None:
+            aligner, feedback = session.submitTranscript("")
+        score = session.ayahScore(aligner, feedback)
+        score.update({
+            "recordedAt": attempt[0][0].capturedAt,
+            "segments": [segment.number for segment, _ in attempt],
+            "audioSeconds": round(sum(segment.durationSeconds for segment, _ in attempt), 2),
+            "transcripts": [transcript for _, transcript in attempt],
+        })
+        yield score
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+    if args.ayah is not None and args.surah is None:
+        print("Error: --ayah needs --surah", file=sys.stderr)
+        return 2
+    try:
+        recording = AudioRingBuffer(args.recording, readOnly=True)
+    except (OSError, ValueError) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 2
+    
+    with recording:
+        segments = selectSegments(recording, args.surah, args.ayah)
+        if args.export:
+            count = exportSegments(recording, segments, args.export)
+            print(f"Exported {count} phrases to {args.export}", file=sys.stderr)
+            return 0
+        if not os.path.exists(args.csv):
+            print(f"Error: File {args.csv} not found.", file=sys.stderr)
+            return 2
+        
+        metrics = LatencyMetrics() if args.metrics else None
+        # Phrases retried with the same audio, or replayed before, are recognized once.
+        backend = withRecognitionCache(createBackend(args.backend, model=args.model), args.cache)
+        backend.load()
+        startTime = time.perf_counter()
+        transcripts = recognizeSegments(recording, segments, backend, args.workers, metrics)
+        
+        output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        scores = []
+        try:
+            with QuranCorpus.load(args.csv) as corpus:
+                for score in replayAttempts(corpus, segments, transcripts, args.threshold, metrics):
+                    output.write(json.dumps(score, ensure_ascii=False) + "\n")
+                    scores.append(score)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        wallSeconds = time.perf_counter() - startTime
+    
+    if metrics:
+        metrics.export(args.metrics)
+    audioSeconds = sum(segment.durationSeconds for segment in segments)
+    passed = sum(1 for score in scores if score["passed"])
+    print(
+        f"{passed}/{len(scores)} ayah attempts passed; replayed {audioSeconds:.1f} s of audio in "
+        f"{wallSeconds:.1f} s ({audioSeconds / wallSeconds if wallSeconds else 0:.1f}x real time)",
+        file=sys.stderr
+    )
+    print(f"Recognition - {backend.latencySummary()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Session Recorder
+Fixed-size memory-mapped ring buffer of captured phrase audio with a per-ayah segment index
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from speech_backends import audioFromPcm
+
+
+RECORDING_MAGIC = b"QRNREC01"
+RECORD_ENV_VAR = "QURAN_RECORD"
+RECORD_SIZE_ENV_VAR = "QURAN_RECORD_MB"
+DEFAULT_CAPACITY_MB = 64
+DEFAULT_SEGMENT_CAPACITY = 16384
+RECORDING_SAMPLE_RATE = 16000
+RECORDING_SAMPLE_WIDTH = 2
+
+# magic, sample width, sample rate, PCM capacity, PCM bytes ever written,
+# segments ever written, segment capacity (little-endian so files move between machines)
+RECORDING_HEADER = struct.Struct("<8sB3xIQQQI")
+# stream start, byte length, surah, ayah, mode (0 surah name, 1 ayah), capture wall time
+SEGMENT_ENTRY = struct.Struct("<QIHHB3xd")
+HEADER_SIZE = 64
+PAGE_SIZE = 4096
+
+SEGMENT_MODES = {"surah": 0, "ayah": 1}
+
+RecordedSegment = namedtuple(
+    "RecordedSegment", ["number", "surah", "ayah", "mode", "capturedAt", "start", "length", "durationSeconds"]
+)
+
+
+class AudioRingBuffer:
+    """
+    Layout: header, segment index (segmentCapacity fixed-size entries, itself a
+    ring), then `capacity` bytes of 16 kHz 16-bit mono PCM written as a ring.
+    Positions are absolute stream offsets; a segment is still readable while its
+    start is within the last `capacity` bytes written. The PCM is written before
+    its index entry and the header counters last, so a crash loses at most the
+    phrase being appended. Opening an existing recording resumes appending to it.
+    """
+    
+    def __init__(self, recordingPath, capacityBytes=DEFAULT_CAPACITY_MB * 1024 * 1024,
+                 segmentCapacity=DEFAULT_SEGMENT_CAPACITY, readOnly=False):
+        self.recordingPath = recordingPath
+        self.readOnly = readOnly
+        self.lock = threading.Lock()
+        
+        if not os.path.exists(recordingPath):
+            if readOnly:
+                raise ValueError(f"Recording {recordingPath} not found")
+            self.create(capacityBytes, segmentCapacity)
+        
+        self._file = open(recordingPath, 'rb' if readOnly else 'r+b')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ if readOnly else mmap.ACCESS_WRITE)
+        except Exception:
+            self._file.close()
+            raise
+        
+        (magic, self.sampleWidth, self.sampleRate, self.capacity,
+         self.bytesWritten, self.segmentCount, self.segmentCapacity) = RECORDING_HEADER.unpack_from(self._map, 0)
+        if magic != RECORDING_MAGIC or len(self._map) < self.dataOffset() + self.capacity:
+            self.close()
+            raise ValueError(f"{recordingPath} is not a compatible session recording")
+    
+    def create(self, capacityBytes, segmentCapacity):
+        capacityBytes -= capacityBytes % RECORDING_SAMPLE_WIDTH
+        header = RECORDING_HEADER.pack(
+            RECORDING_MAGIC, RECORDING_SAMPLE_WIDTH, RECORDING_SAMPLE_RATE, capacityBytes, 0, 0, segmentCapacity
+        )
+        self.segmentCapacity = segmentCapacity
+        with open(self.recordingPath, 'wb') as recordingFile:
+            recordingFile.write(header)
+            # Sparse on most filesystems: untouched parts of the ring take no disk space.
+            recordingFile.truncate(self.dataOffset() + capacityBytes)
+    
+    def dataOffset(self):
+        indexEnd = HEADER_SIZE + self.segmentCapacity * SEGMENT_ENTRY.size
+        return (indexEnd + PAGE_SIZE - 1) // PAGE_SIZE * PAGE_SIZE
+    
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            if not self.readOnly:
+                self._map.flush()
+            self._map.close()
+            self._map = None
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *excInfo):
+        self.close()
+    
+    def append(self, audio, surahNum=0, ayahNum=0, mode="ayah", capturedAt=None):
+        """
+        Store one phrase. audio is an AudioData (converted to 16 kHz 16-bit mono)
+        or raw PCM bytes already in that format. Returns the segment number.
+        """
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            pcmData = bytes(audio)
+        else:
+            pcmData = audio.get_raw_data(convert_rate=self.sampleRate, convert_width=self.sampleWidth)
+        if len(pcmData) > self.capacity:
+            raise ValueError(f"Phrase of {len(pcmData)} bytes does not fit a {self.capacity}-byte recording")
+        
+        with self.lock:
+            start = self.bytesWritten
+            position = start % self.capacity
+            firstPart = min(len(pcmData), self.capacity - position)
+            dataOffset = self.dataOffset()
+            self._map[dataOffset + position:dataOffset + position + firstPart] = pcmData[:firstPart]
+            if firstPart < len(pcmData):
+                self._map[dataOffset:dataOffset + len(pcmData) - firstPart] = pcmData[firstPart:]
+            
+            number = self.segmentCount
+            SEGMENT_ENTRY.pack_into(
+                self._map, HEADER_SIZE + (number % self.segmentCapacity) * SEGMENT_ENTRY.size,
+                start, len(pcmData), surahNum, ayahNum, SEGMENT_MODES.get(mode, 1),
+                time.time() if capturedAt is None else capturedAt,
+            )
+            self.bytesWritten += len(pcmData)
+            self.segmentCount += 1
+            RECORDING_HEADER.pack_into(
+                self._map, 0, RECORDING_MAGIC, self.sampleWidth, self.sampleRate, self.capacity,
+                self.bytesWritten, self.segmentCount, self.segmentCapacity,
+            )
+        return number
+    
+    def segments(self):
+        """Segments whose audio has not been overwritten yet, oldest first."""
+        with self.lock:
+            bytesWritten, segmentCount = self.bytesWritten, self.segmentCount
+        modeNames = {value: name for name, value in SEGMENT_MODES.items()}
+        bytesPerSecond = self.sampleRate * self.sampleWidth
+        segments = []
+        for number in range(max(0, segmentCount - self.segmentCapacity), segmentCount):
+            start, length, surahNum, ayahNum, mode, capturedAt = SEGMENT_ENTRY.unpack_from(
+                self._map, HEADER_SIZE + (number % self.segmentCapacity) * SEGMENT_ENTRY.size
+            )
+            if start < bytesWritten - self.capacity:
+                continue
+            segments.append(RecordedSegment(
+                number, surahNum, ayahNum, modeNames.get(mode, "ayah"), capturedAt, start, length, length / bytesPerSecond
+            ))
+        return segments
+    
+    def ayahSegments(self, surahNum, ayahNum):
+        return [segment for segment in self.segments() if (segment.surah, segment.ayah) == (surahNum, ayahNum)]
+    
+    def pcm(self, segment):
+        position = segment.start % self.capacity
+        dataOffset = self.dataOffset()
+        firstPart = min(segment.length, self.capacity - position)
+        pcmData = self._map[dataOffset + position:dataOffset + position + firstPart]
+        if firstPart < segment.length:
+            pcmData += self._map[dataOffset:dataOffset + segment.length - firstPart]
+        return pcmData
+    
+    def audio(self, segment):
+        return audioFromPcm(self.pcm(segment), self.sampleRate, self.sampleWidth)
+
+
+def recordingPath():
+    return os.environ.get(RECORD_ENV_VAR) or None
+
+
+def openRecorder():
+    """The ring buffer named by QURAN_RECORD (sized by QURAN_RECORD_MB), or None when recording is off."""
+    path = recordingPath()
+    if not path:
+        return None
+    capacityMegabytes = float(os.environ.get(RECORD_SIZE_ENV_VAR) or DEFAULT_CAPACITY_MB)
+    return AudioRingBuffer(path, capacityBytes=int(capacityMegabytes * 1024 * 1024))
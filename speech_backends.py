@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Speech Recognition Backends
+Pluggable recognizers: Google Web Speech, offline Vosk and Whisper models, and a replaying fake
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class UnknownSpeechError(Exception):
+    pass
+
+
+class BackendRequestError(Exception):
+    pass
+
+
+class BackendUnavailableError(Exception):
+    pass
+
+
+class RecognitionBackend:
+    """
+    Base class: subclasses implement recognize(audio, language) and may load
+    their model in load(), which is called once at startup and kept warm.
+    """
+    
+    name = "base"
+    sampleRate = 16000
+    # True if the transcript depends on the order of calls rather than on the audio.
+    orderDependent = False
+    
+    def __init__(self):
+        self.latencies = []
+        self.latencyLock = threading.Lock()
+        self.loaded = False
+    
+    def load(self):
+        self.loaded = True
+    
+    def recognize(self, audio, language):
+        raise NotImplementedError
+    
+    def transcribe(self, audio, languages=("ar-SA",)):
+        if not self.loaded:
+            self.load()
+        
+        startTime = time.perf_counter()
+        try:
+            for attempt, language in enumerate(languages, 1):
+                try:
+                    return self.recognize(audio, language)
+                except (UnknownSpeechError, BackendRequestError):
+                    if attempt == len(languages):
+                        raise
+        finally:
+            self.recordLatency(time.perf_counter() - startTime)
+    
+    def recordLatency(self, seconds):
+        with self.latencyLock:
+            self.latencies.append(seconds)
+    
+    def latencyStats(self):
+        with self.latencyLock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return {"backend": self.name, "phrases": 0}
+        return {
+            "backend": self.name,
+            "phrases": len(latencies),
+            "meanMs": sum(latencies) / len(latencies) * 1000,
+            "p50Ms": latencies[len(latencies) // 2] * 1000,
+            "maxMs": latencies[-1] * 1000,
+        }
+    
+    def latencySummary(self):
+        stats = self.latencyStats()
+        if not stats["phrases"]:
+            return f"{self.name}: no phrases recognized"
+        return (
+            f"{self.name}: {stats['phrases']} phrases, mean {stats['meanMs']:.0f} ms, "
+            f"p50 {stats['p50Ms']:.0f} ms, max {stats['maxMs']:.0f} ms"
+        )
+
+
+class GoogleBackend(RecognitionBackend):
+    name = "google"
+    
+    def __init__(self, recognizer=None):
+        super().__init__()
+        self.recognizer = recognizer
+    
+    def load(self):
+        import speech_recognition as sr
+        self.sr = sr
+        if self.recognizer is None:
+            self.recognizer = sr.Recognizer()
+        self.loaded = True
+    
+    def recognize(self, audio, language):
+        try:
+            return self.recognizer.recognize_google(audio, language=language)
+        except self.sr.UnknownValueError as e:
+            raise UnknownSpeechError(str(e)) from e
+        except self.sr.RequestError as e:
+            raise BackendRequestError(str(e)) from e
+
+
+class VoskBackend(RecognitionBackend):
+    name = "vosk"
+    
+    def __init__(self, modelPath):
+        super().__init__()
+        self.modelPath = modelPath
+        self.model = None
+    
+    def load(self):
+        try:
+            import vosk
+        except ImportError as e:
+            raise BackendUnavailableError("Vosk not installed. Install with: pip install vosk") from e
+        if not self.modelPath or not os.path.isdir(self.modelPath):
+            raise BackendUnavailableError(f"Vosk model directory not found: {self.modelPath}")
+        
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.model = vosk.Model(self.modelPath)
+        self.loaded = True
+    
+    def recognize(self, audio, language):
+        recognizer = self.vosk.KaldiRecognizer(self.model, self.sampleRate)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.sampleRate, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+        if not text:
+            raise UnknownSpeechError("Vosk returned no text")
+        return text
+
+
+class WhisperBackend(RecognitionBackend):
+    name = "whisper"
+    
+    def __init__(self, modelName="small"):
+        super().__init__()
+        self.modelName = modelName or "small"
+        self.model = None
+    
+    def load(self):
+        try:
+            import numpy as np
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise BackendUnavailableError(
+                "faster-whisper not installed. Install with: pip install faster-whisper"
+            ) from e
+        
+        self.np = np
+        self.model = WhisperModel(self.modelName, device="cpu", compute_type="int8")
+        self.loaded = True
+    
+    def recognize(self, audio, language):
+        rawData = audio.get_raw_data(convert_rate=self.sampleRate, convert_width=2)
+        samples = self.np.frombuffer(rawData, dtype=self.np.int16).astype(self.np.float32) / 32768.0
+        segments, _ = self.model.transcribe(samples, language=language.split("-")[0], beam_size=1)
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        if not text:
+            raise UnknownSpeechError("Whisper returned no text")
+        return text
+
+
+class FakeBackend(RecognitionBackend):
+    """
+    Replays canned transcripts in order; None entries simulate unintelligible
+    audio. Transcripts follow the order of the calls, so phrases must be
+    recognized one at a time to get the transcript meant for them.
+    """
+    
+    name = "fake"
+    orderDependent = True
+    
+    def __init__(self, transcripts=(), delay=0.0):
+        super().__init__()
+        self.transcripts = list(transcripts)
+        self.delay = delay
+        self.position = 0
+        self.positionLock = threading.Lock()
+    
+    @classmethod
+    def fromFile(cls, transcriptFilePath, delay=0.0):
+        with open(transcriptFilePath, 'r', encoding='utf-8') as transcriptFile:
+            transcripts = [line.strip() or None for line in transcriptFile]
+        return cls(transcripts, delay)
+    
+    def recognize(self, audio, language):
+        with self.positionLock:
+            if self.position >= len(self.transcripts):
+                raise UnknownSpeechError("No more canned transcripts")
+            transcript = self.transcripts[self.position]
+            self.position += 1
+        
+        if self.delay:
+            time.sleep(self.delay)
+        if transcript is None:
+            raise UnknownSpeechError("Canned unintelligible phrase")
+        return transcript
+    
+    def transcribe(self, audio, languages=("ar-SA",)):
+        return super().transcribe(audio, languages[:1])
+
+
+def createBackend(name=None, recognizer=None, model=None):
+    name = (name or os.environ.get("QURAN_SPEECH_BACKEND") or "google").lower()
+    model = model or os.environ.get("QURAN_SPEECH_MODEL")
+    
+    if name == "google":
+        return GoogleBackend(recognizer)
+    if name == "vosk":
+        return VoskBackend(model)
+    if name == "whisper":
+        return WhisperBackend(model)
+    if name == "fake":
+        if model:
+            return FakeBackend.fromFile(model)
+        return FakeBackend()
+    raise ValueError(f"Unknown speech backend: {name}")
+
+
+def loadAudioFile(audioFilePath):
+    import speech_recognition as sr
+    with sr.AudioFile(audioFilePath) as source:
+        return sr.Recognizer().record(source)
+
+
+def audioFromPcm(pcmData, sampleRate=RecognitionBackend.sampleRate, sampleWidth=2):
+    """Wrap raw mono PCM, e.g. a phrase streamed to the server, as audio the backends accept."""
+    import speech_recognition as sr
+    return sr.AudioData(pcmData, sampleRate, sampleWidth)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Surah Name Resolver
+Aho-Corasick exact matching plus a character trigram index for misspelled surah names
+"""
+
+import re
+from collections import defaultdict
+
+from arabic_text import normalizeArabic
+
+
+SURAH_NAMES = [
+    (1, "الفاتحة", "Al-Fatihah", "The Opening"),
+    (2, "البقرة", "Al-Baqarah", "The Cow"),
+    (3, "آل عمران", "Al Imran", "Family of Imran"),
+    (4, "النساء", "An-Nisa", "The Women"),
+    (5, "المائدة", "Al-Ma'idah", "The Table Spread"),
+    (6, "الأنعام", "Al-An'am", "The Cattle"),
+    (7, "الأعراف", "Al-A'raf", "The Heights"),
+    (8, "الأنفال", "Al-Anfal", "The Spoils of War"),
+    (9, "التوبة", "At-Tawbah", "The Repentance"),
+    (10, "يونس", "Yunus", "Jonah"),
+    (11, "هود", "Hud", "Hud"),
+    (12, "يوسف", "Yusuf", "Joseph"),
+    (13, "الرعد", "Ar-Ra'd", "The Thunder"),
+    (14, "إبراهيم", "Ibrahim", "Abraham"),
+    (15, "الحجر", "Al-Hijr", "The Rocky Tract"),
+    (16, "النحل", "An-Nahl", "The Bee"),
+    (17, "الإسراء", "Al-Isra", "The Night Journey"),
+    (18, "الكهف", "Al-Kahf", "The Cave"),
+    (19, "مريم", "Maryam", "Mary"),
+    (20, "طه", "Ta-Ha", "Ta-Ha"),
+    (21, "الأنبياء", "Al-Anbiya", "The Prophets"),
+    (22, "الحج", "Al-Hajj", "The Pilgrimage"),
+    (23, "المؤمنون", "Al-Mu'minun", "The Believers"),
+    (24, "النور", "An-Nur", "The Light"),
+    (25, "الفرقان", "Al-Furqan", "The Criterion"),
+    (26, "الشعراء", "Ash-Shu'ara", "The Poets"),
+    (27, "النمل", "An-Naml", "The Ant"),
+    (28, "القصص", "Al-Qasas", "The Stories"),
+    (29, "العنكبوت", "Al-Ankabut", "The Spider"),
+    (30, "الروم", "Ar-Rum", "The Romans"),
+    (31, "لقمان", "Luqman", "Luqman"),
+    (32, "السجدة", "As-Sajdah", "The Prostration"),
+    (33, "الأحزاب", "Al-Ahzab", "The Combined Forces"),
+    (34, "سبأ", "Saba", "Sheba"),
+    (35, "فاطر", "Fatir", "Originator"),
+    (36, "يس", "Ya-Sin", "Ya Sin"),
+    (37, "الصافات", "As-Saffat", "Those Who Set the Ranks"),
+    (38, "ص", "Sad", "Sad"),
+    (39, "الزمر", "Az-Zumar", "The Troops"),
+    (40, "غافر", "Ghafir", "The Forgiver"),
+    (41, "فصلت", "Fussilat", "Explained in Detail"),
+    (42, "الشورى", "Ash-Shura", "The Consultation"),
+    (43, "الزخرف", "Az-Zukhruf", "The Ornaments of Gold"),
+    (44, "الدخان", "Ad-Dukhan", "The Smoke"),
+    (45, "الجاثية", "Al-Jathiyah", "The Crouching"),
+    (46, "الأحقاف", "Al-Ahqaf", "The Wind-Curved Sandhills"),
+    (47, "محمد", "Muhammad", "Muhammad"),
+    (48, "الفتح", "Al-Fath", "The Victory"),
+    (49, "الحجرات", "Al-Hujurat", "The Rooms"),
+    (50, "ق", "Qaf", "Qaf"),
+    (51, "الذاريات", "Adh-Dhariyat", "The Winnowing Winds"),
+    (52, "الطور", "At-Tur", "The Mount"),
+    (53, "النجم", "An-Najm", "The Star"),
+    (54, "القمر", "Al-Qamar", "The Moon"),
+    (55, "الرحمن", "Ar-Rahman", "The Beneficent"),
+    (56, "الواقعة", "Al-Waqi'ah", "The Inevitable"),
+    (57, "الحديد", "Al-Hadid", "The Iron"),
+    (58, "المجادلة", "Al-Mujadila", "The Pleading Woman"),
+    (59, "الحشر", "Al-Hashr", "The Exile"),
+    (60, "الممتحنة", "Al-Mumtahanah", "She That Is to Be Examined"),
+    (61, "الصف", "As-Saff", "The Ranks"),
+    (62, "الجمعة", "Al-Jumu'ah", "The Congregation"),
+    (63, "المنافقون", "Al-Munafiqun", "The Hypocrites"),
+    (64, "التغابن", "At-Taghabun", "The Mutual Disillusion"),
+    (65, "الطلاق", "At-Talaq", "The Divorce"),
+    (66, "التحريم", "At-Tahrim", "The Prohibition"),
+    (67, "الملك", "Al-Mulk", "The Sovereignty"),
+    (68, "القلم", "Al-Qalam", "The Pen"),
+    (69, "الحاقة", "Al-Haqqah", "The Reality"),
+    (70, "المعارج", "Al-Ma'arij", "The Ascending Stairways"),
+    (71, "نوح", "Nuh", "Noah"),
+    (72, "الجن", "Al-Jinn", "The Jinn"),
+    (73, "المزمل", "Al-Muzzammil", "The Enshrouded One"),
+    (74, "المدثر", "Al-Muddaththir", "The Cloaked One"),
+    (75, "القيامة", "Al-Qiyamah", "The Resurrection"),
+    (76, "الإنسان", "Al-Insan", "The Man"),
+    (77, "المرسلات", "Al-Mursalat", "The Emissaries"),
+    (78, "النبأ", "An-Naba", "The Tidings"),
+    (79, "النازعات", "An-Nazi'at", "Those Who Drag Forth"),
+    (80, "عبس", "Abasa", "He Frowned"),
+    (81, "التكوير", "At-Takwir", "The Overthrowing"),
+    (82, "الانفطار", "Al-Infitar", "The Cleaving"),
+    (83, "المطففين", "Al-Mutaffifin", "The Defrauding"),
+    (84, "الانشقاق", "Al-Inshiqaq", "The Sundering"),
+    (85, "البروج", "Al-Buruj", "The Mansions of the Stars"),
+    (86, "الطارق", "At-Tariq", "The Nightcomer"),
+    (87, "الأعلى", "Al-A'la", "The Most High"),
+    (88, "الغاشية", "Al-Ghashiyah", "The Overwhelming"),
+    (89, "الفجر", "Al-Fajr", "The Dawn"),
+    (90, "البلد", "Al-Balad", "The City"),
+    (91, "الشمس", "Ash-Shams", "The Sun"),
+    (92, "الليل", "Al-Layl", "The Night"),
+    (93, "الضحى", "Ad-Duha", "The Morning Hours"),
+    (94, "الشرح", "Ash-Sharh", "The Relief"),
+    (95, "التين", "At-Tin", "The Fig"),
+    (96, "العلق", "Al-Alaq", "The Clot"),
+    (97, "القدر", "Al-Qadr", "The Power"),
+    (98, "البينة", "Al-Bayyinah", "The Clear Proof"),
+    (99, "الزلزلة", "Az-Zalzalah", "The Earthquake"),
+    (100, "العاديات", "Al-Adiyat", "The Courser"),
+    (101, "القارعة", "Al-Qari'ah", "The Calamity"),
+    (102, "التكاثر", "At-Takathur", "The Rivalry in World Increase"),
+    (103, "العصر", "Al-Asr", "The Declining Day"),
+    (104, "الهمزة", "Al-Humazah", "The Traducer"),
+    (105, "الفيل", "Al-Fil", "The Elephant"),
+    (106, "قريش", "Quraysh", "Quraysh"),
+    (107, "الماعون", "Al-Ma'un", "The Small Kindnesses"),
+    (108, "الكوثر", "Al-Kawthar", "The Abundance"),
+    (109, "الكافرون", "Al-Kafirun", "The Disbelievers"),
+    (110, "النصر", "An-Nasr", "The Divine Support"),
+    (111, "المسد", "Al-Masad", "The Palm Fiber"),
+    (112, "الإخلاص", "Al-Ikhlas", "The Sincerity"),
+    (113, "الفلق", "Al-Falaq", "The Daybreak"),
+    (114, "الناس", "An-Nas", "Mankind"),
+]
+
+EXTRA_ALIASES = {
+    "fatiha": 1, "the opening": 1, "baqara": 2, "the cow": 2, "imran": 3, "ali imran": 3,
+    "nisa": 4, "maidah": 5, "the table": 5, "yaseen": 36, "yasin": 36, "rahman": 55, "mulk": 67,
+    "ikhlas": 112, "falaq": 113, "nas": 114,
+}
+
+UNITS = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+ORDINALS = {"first": 1, "second": 2, "third": 3}
+
+LATIN_ARTICLE = re.compile(r"^(al|an|ar|as|at|az|ad|adh|ash)[\s-]")
+NUMBER_PATTERN = re.compile(r"(?<!\d)\d+(?!\d)")
+FILLER_WORDS = {"surah", "surat", "sura", "suratu", "suratul", "sure", "chapter", "سوره", "please", "recite"}
+SOUND_REPLACEMENTS = [("ee", "i"), ("oo", "u"), ("ou", "u"), ("ph", "f"), ("q", "k"), ("ck", "k")]
+REPEATED_LETTER = re.compile(r"(\w)\1+")
+TRAILING_H = re.compile(r"(?<=[aeiou])h\b")
+FUZZY_THRESHOLD = 0.5
+
+
+def foldName(text):
+    folded = normalizeArabic(text)
+    folded = re.sub(r"['’`ʿʾ]", "", folded)
+    folded = re.sub(r"[^\w\s]|_", " ", folded)
+    return " ".join(folded.split())
+
+
+def numberToWords(number):
+    if number < 20:
+        return UNITS[number]
+    if number < 100:
+        tens, units = divmod(number, 10)
+        return TENS[tens] + (f" {UNITS[units]}" if units else "")
+    hundreds, rest = divmod(number, 100)
+    words = f"{UNITS[hundreds]} hundred"
+    return words + (f" {numberToWords(rest)}" if rest else "")
+
+
+def surahAliases():
+    aliases = {}
+    for surahNum, arabicName, transliteration, englishName in SURAH_NAMES:
+        names = {arabicName, f"سورة {arabicName}", transliteration, englishName}
+        if arabicName.startswith("ال"):
+            names.add(arabicName[2:])
+        latinName = foldName(transliteration)
+        withoutArticle = LATIN_ARTICLE.sub("", latinName)
+        names.update({withoutArticle, latinName.replace(" ", ""), f"surah {withoutArticle}", f"surat {withoutArticle}"})
+        if englishName.lower().startswith("the "):
+            names.add(englishName[4:])
+        names.update({numberToWords(surahNum), f"surah {numberToWords(surahNum)}"})
+        
+        for name in names:
+            folded = foldName(name)
+            if folded:
+                aliases.setdefault(folded, surahNum)
+    
+    for name, surahNum in ORDINALS.items():
+        aliases.setdefault(name, surahNum)
+    for name, surahNum in EXTRA_ALIASES.items():
+        aliases.setdefault(foldName(name), surahNum)
+    return aliases
+
+
+def soundKey(folded):
+    """Collapse spelling variants ASR produces for transliterated names (baqarah/bakara)."""
+    words = [word for word in folded.split() if word not in FILLER_WORDS]
+    key = " ".join(words)
+    for source, target in SOUND_REPLACEMENTS:
+        key = key.replace(source, target)
+    key = REPEATED_LETTER.sub(r"\1", key)
+    return TRAILING_H.sub("", key)
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SurahNameResolver:
+    """
+    Exact aliases are found in one pass with an Aho-Corasick automaton and only
+    count on word boundaries, so "1" never matches inside "114". Anything else is
+    ranked by trigram Dice similarity against aliases sharing trigrams with the text.
+    """
+    
+    def __init__(self, aliases=None):
+        self.aliases = aliases if aliases is not None else surahAliases()
+        self.aliasNames = list(self.aliases)
+        self.aliasKeys = [soundKey(name) for name in self.aliasNames]
+        self.aliasTrigrams = [trigrams(key) if key else set() for key in self.aliasKeys]
+        self.aliasWordCounts = [len(key.split()) for key in self.aliasKeys]
+        self.trigramIndex = defaultdict(list)
+        for aliasId, grams in enumerate(self.aliasTrigrams):
+            for gram in grams:
+                self.trigramIndex[gram].append(aliasId)
+        self.buildAutomaton()
+    
+    def buildAutomaton(self):
+        self.transitions = [{}]
+        self.failure = [0]
+        self.outputs = [[]]
+        
+        for aliasId, name in enumerate(self.aliasNames):
+            state = 0
+            for char in name:
+                nextState = self.transitions[state].get(char)
+                if nextState is None:
+                    nextState = len(self.transitions)
+                    self.transitions[state][char] = nextState
+                    self.transitions.append({})
+                    self.failure.append(0)
+                    self.outputs.append([])
+                state = nextState
+            self.outputs[state].append(aliasId)
+        
+        queue = list(self.transitions[0].values())
+        for state in queue:
+            for char, nextState in self.transitions[state].items():
+                fallback = self.failure[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.failure[fallback]
+                failState = self.transitions[fallback].get(char, 0)
+                self.failure[nextState] = failState if failState != nextState else 0
+                self.outputs[nextState] = self.outputs[nextState] + self.outputs[self.failure[nextState]]
+                queue.append(nextState)
+    
+    def exactMatches(self, folded):
+        matches = []
+        state = 0
+        for position, char in enumerate(folded):
+            while state and char not in self.transitions[state]:
+                state = self.failure[state]
+            state = self.transitions[state].get(char, 0)
+            for aliasId in self.outputs[state]:
+                start = position - len(self.aliasNames[aliasId]) + 1
+                end = position + 1
+                if (start == 0 or folded[start - 1] == " ") and (end == len(folded) or folded[end] == " "):
+                    matches.append((aliasId, start))
+        return matches
+    
+    def fuzzyMatches(self, folded, candidateLimit=10):
+        key = soundKey(folded)
+        if not key:
+            return []
+        
+        sharedCounts = defaultdict(int)
+        for gram in trigrams(key):
+            for aliasId in self.trigramIndex.get(gram, ()):
+                sharedCounts[aliasId] += 1
+        candidates = sorted(sharedCounts, key=sharedCounts.get, reverse=True)[:candidateLimit]
+        
+        words = key.split()
+        windowTrigrams = {}
+        scored = []
+        for aliasId in candidates:
+            aliasGrams = self.aliasTrigrams[aliasId]
+            windowSize = max(1, min(self.aliasWordCounts[aliasId], len(words)))
+            bestScore = 0.0
+            for start in range(len(words) - windowSize + 1):
+                windowGrams = windowTrigrams.get((start, windowSize))
+                if windowGrams is None:
+                    windowGrams = trigrams(" ".join(words[start:start + windowSize]))
+                    windowTrigrams[(start, windowSize)] = windowGrams
+                score = 2 * len(aliasGrams & windowGrams) / (len(aliasGrams) + len(windowGrams))
+                bestScore = max(bestScore, score)
+            scored.append((aliasId, bestScore))
+        return scored
+    
+    def resolve(self, text, limit=5):
+        """Return up to limit (surahNum, score, alias) tuples, best first; only exact hits score 1.0."""
+        folded = foldName(text)
+        if not folded:
+            return []
+        
+        ranked = {}
+        
+        def offer(surahNum, score, alias, tieBreak):
+            key = (score, tieBreak)
+            if surahNum not in ranked or key > ranked[surahNum][0]:
+                ranked[surahNum] = (key, alias)
+        
+        for match in NUMBER_PATTERN.finditer(folded):
+            surahNum = int(match.group())
+            if 1 <= surahNum <= 114:
+                offer(surahNum, 1.0, match.group(), 1000 - match.start())
+        
+        exactMatches = self.exactMatches(folded)
+        for aliasId, start in exactMatches:
+            offer(self.aliases[self.aliasNames[aliasId]], 1.0, self.aliasNames[aliasId],
+                  len(self.aliasNames[aliasId]) * 1000 - start)
+        
+        if not ranked:
+            for aliasId, score in self.fuzzyMatches(folded):
+                if score >= FUZZY_THRESHOLD:
+                    offer(self.aliases[self.aliasNames[aliasId]], min(score, 0.99), self.aliasNames[aliasId],
+                          len(self.aliasNames[aliasId]))
+        
+        ordered = sorted(ranked.items(), key=lambda item: item[1][0], reverse=True)
+        return [(surahNum, key[0], alias) for surahNum, (key, alias) in ordered[:limit]]
+    
+    def bestMatch(self, text, availableSurahs=None):
+        for surahNum, _, _ in self.resolve(text, limit=114):
+            if availableSurahs is None or surahNum in availableSurahs:
+                return surahNum
+        return None
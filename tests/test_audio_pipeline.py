@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Audio Pipeline Tests
+Canned phrases through RecitationPipeline with the fake backend, no microphone or network needed
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from audio_pipeline import ListenCancelled, PhraseResult, RecitationPipeline, ResultSequencer
+from speech_backends import FakeBackend, UnknownSpeechError
+
+
+RESULT_TIMEOUT = 5.0
+
+
+class CannedMicrophone:
+    """Stands in for MicrophoneSession: one phrase per listen(), then waits to be cancelled."""
+    
+    def __init__(self, phraseCount):
+        self.phrases = [f"phrase {number}".encode() for number in range(phraseCount)]
+        self.lock = threading.Lock()
+    
+    def listen(self, timeout, phraseTimeLimit, cancelled=None):
+        with self.lock:
+            if self.phrases:
+                return self.phrases.pop(0)
+        cancelled.wait()
+        raise ListenCancelled("Listening was cancelled")
+
+
+class RecitationPipelineTest(unittest.TestCase):
+    
+    def runPipeline(self, transcripts, delay=0.0):
+        results = []
+        finished = threading.Event()
+        
+        def onResult(result):
+            results.append(result)
+            if len(results) == len(transcripts):
+                finished.set()
+        
+        pipeline = RecitationPipeline(
+            CannedMicrophone(len(transcripts)),
+            FakeBackend(transcripts, delay=delay),
+            lambda: (1, 5, ("ar-SA",), "ayah"),
+            onResult,
+            workerCount=2,
+        )
+        pipeline.start()
+        try:
+            self.assertTrue(finished.wait(RESULT_TIMEOUT), f"only {len(results)} of {len(transcripts)} results arrived")
+        finally:
+            pipeline.stop()
+        for thread in pipeline.threads:
+            thread.join(RESULT_TIMEOUT)
+            self.assertFalse(thread.is_alive())
+        return results
+    
+    def testResultsArriveInCaptureOrder(self):
+        transcripts = ["بسم الله", "الرحمن الرحيم", "الحمد لله", "رب العالمين", "مالك يوم الدين"]
+        results = self.runPipeline(transcripts, delay=0.01)
+        self.assertEqual([result.sequenceNumber for result in results], list(range(len(transcripts))))
+        self.assertEqual([result.text for result in results], transcripts)
+        self.assertTrue(all(result.mode == "ayah" for result in results))
+    
+    def testUnintelligiblePhraseKeepsItsPlace(self):
+        results = self.runPipeline(["الحمد لله", None, "رب العالمين"])
+        self.assertEqual([result.text for result in results], ["الحمد لله", None, "رب العالمين"])
+        self.assertIsInstance(results[1].error, UnknownSpeechError)
+    
+    def testStopCancelsThePendingListen(self):
+        pipeline = RecitationPipeline(
+            CannedMicrophone(0), FakeBackend(), lambda: (1, 5, ("ar-SA",), "ayah"), lambda result: None
+        )
+        pipeline.start()
+        pipeline.stop()
+        for thread in pipeline.threads:
+            thread.join(RESULT_TIMEOUT)
+            self.assertFalse(thread.is_alive())
+
+
+class ResultSequencerTest(unittest.TestCase):
+    
+    def testReleasesOutOfOrderResultsInSequence(self):
+        delivered = []
+        sequencer = ResultSequencer(delivered.append)
+        for sequenceNumber in (2, 0, 3, 1):
+            sequencer.submit(PhraseResult(sequenceNumber, text=str(sequenceNumber)))
+        self.assertEqual([result.text for result in delivered], ["0", "1", "2", "3"])
+    
+    def testDroppedPhrasesAreSkipped(self):
+        delivered = []
+        sequencer = ResultSequencer(delivered.append)
+        sequencer.submit(PhraseResult(1, text="1"))
+        sequencer.submit(PhraseResult(0, dropped=True))
+        self.assertEqual([result.text for result in delivered], ["1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+UI Dispatcher
+Coalesces widget updates posted from worker threads and applies them on the Tk thread at a fixed frame rate
+"""
+
+import queue
+import time
+
+
+UI_FRAME_INTERVAL_MS = 33
+
+
+class UiDispatcher:
+    """
+    Worker threads call post() with a key naming the piece of UI state they
+    change ("feedback", "recitation", ...). Once per frame the Tk thread drains
+    the queue and, for every key, applies only the most recently posted update,
+    in the order the keys were last posted.
+    """
+    
+    def __init__(self, root, frameInterval=UI_FRAME_INTERVAL_MS, metrics=None):
+        self.root = root
+        self.frameInterval = frameInterval
+        self.metrics = metrics
+        self.updates = queue.SimpleQueue()
+        self.timerId = None
+        self.appliedUpdates = 0
+        self.coalescedUpdates = 0
+    
+    def start(self):
+        if self.timerId is None:
+            self.timerId = self.root.after(self.frameInterval, self.drain)
+    
+    def stop(self):
+        if self.timerId is not None:
+            self.root.after_cancel(self.timerId)
+            self.timerId = None
+    
+    def post(self, key, callback, *args):
+        self.updates.put((key, callback, args, time.perf_counter()))
+    
+    def drain(self):
+        latest = {}
+        while True:
+            try:
+                key, callback, args, postedAt = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if latest.pop(key, None) is not None:
+                self.coalescedUpdates += 1
+            latest[key] = (callback, args, postedAt)
+        
+        for key, (callback, args, postedAt) in latest.items():
+            if self.metrics:
+                self.metrics.recordSince("uiQueue", postedAt)
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Warning: UI update '{key}' failed: {str(e)}")
+            self.appliedUpdates += 1
+        
+        self.timerId = self.root.after(self.frameInterval, self.drain)
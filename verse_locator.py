@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Verse Locator
+Word n-gram inverted index over the normalized corpus for finding where a recitation starts
+"""
+
+import math
+import threading
+from array import array
+from collections import defaultdict, namedtuple
+
+from arabic_text import normalizeArabic, phoneticKey, tokenizeArabic
+
+
+# wordOffset is the ayah word the recitation starts at; queryOffset the first query word located there.
+LocatorMatch = namedtuple("LocatorMatch", ["surah", "ayah", "wordOffset", "score", "matchedGrams", "queryOffset"])
+
+MAX_UNIGRAM_POSTINGS = 400
+MIN_MATCHED_GRAMS = 2
+# Recited before almost every surah, so it says nothing about where a recitation is.
+BASMALA_KEYS = tuple(phoneticKey(word) for word in tokenizeArabic(normalizeArabic("بسم الله الرحمن الرحيم")))
+
+
+class VerseLocator:
+    """
+    Indexes every word bigram of the corpus (bigrams may cross ayah boundaries
+    within a surah) plus rare single words. A query votes for the corpus word
+    position it would start at; votes are weighted by inverse document frequency,
+    so a few recognized words are enough to rank candidates across all 6,236 ayahs.
+    Words are indexed by phonetic key, so spelling variants still vote.
+    A basmala in the query is left out: learners often open with it, and it
+    would otherwise send every such recitation to Al-Fatiha, or place it just
+    before the surah the basmala introduces.
+    The index is built lazily on first use, or ahead of time with build().
+    """
+    
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.buildLock = threading.Lock()
+        self.isBuilt = False
+        self.bigrams = {}
+        self.unigrams = {}
+        self.positionRows = array('I')
+        self.rowFirstPositions = array('I')
+    
+    def build(self):
+        with self.buildLock:
+            if self.isBuilt:
+                return
+            
+            bigrams = defaultdict(lambda: array('I'))
+            unigrams = defaultdict(lambda: array('I'))
+            positionRows = array('I')
+            rowFirstPositions = array('I')
+            position = 0
+            previousWord = None
+            previousSurah = None
+            for row in range(len(self.corpus)):
+                surahNum = self.corpus.rowAyah(row)[0]
+                if surahNum != previousSurah:
+                    previousWord = None
+                    previousSurah = surahNum
+                rowFirstPositions.append(position)
+                for word in self.corpus.rowWordKeys(row):
+                    unigrams[word].append(position)
+                    if previousWord is not None:
+                        bigrams[previousWord, word].append(position - 1)
+                    positionRows.append(row)
+                    previousWord = word
+                    position += 1
+            rowFirstPositions.append(position)
+            
+            self.bigrams = dict(bigrams)
+            self.unigrams = dict(unigrams)
+            self.positionRows = positionRows
+            self.rowFirstPositions = rowFirstPositions
+            self.isBuilt = True
+    
+    def wordCount(self):
+        return len(self.positionRows)
+    
+    def gramWeight(self, postings):
+        return math.log(1 + self.wordCount() / len(postings))
+    
+    def locate(self, text, limit=5):
+        """Rank the corpus positions where the recited words most likely start."""
+        if not self.isBuilt:
+            self.build()
+        
+        queryWords = [phoneticKey(word) for word in tokenizeArabic(normalizeArabic(text))]
+        basmalaIndexes = basmalaWordIndexes(queryWords)
+        keptIndexes = [index for index in range(len(queryWords)) if index not in basmalaIndexes]
+        words = [queryWords[index] for index in keptIndexes]
+        queryOffset = keptIndexes[0] if keptIndexes else 0
+        votes = defaultdict(float)
+        grams = defaultdict(int)
+        for index in range(len(words) - 1):
+            postings = self.bigrams.get((words[index], words[index + 1]))
+            if not postings:
+                continue
+            weight = self.gramWeight(postings)
+            for position in postings:
+                start = position - index
+                votes[start] += weight
+                grams[start] += 1
+        
+        # Single words only break ties or rescue one- and two-word queries.
+        for index, word in enumerate(words):
+            postings = self.unigrams.get(word)
+            if not postings or len(postings) > MAX_UNIGRAM_POSTINGS:
+                continue
+            weight = self.gramWeight(postings) / 4
+            for position in postings:
+                start = position - index
+                if start in votes or len(words) < 3:
+                    votes[start] += weight
+        
+        ranked = sorted(votes, key=lambda start: (-votes[start], start))
+        matches = []
+        seenRows = set()
+        for start in ranked:
+            position = min(max(start, 0), self.wordCount() - 1)
+            row = self.positionRows[position]
+            if row in seenRows:
+                continue
+            seenRows.add(row)
+            surahNum, ayahNum, _ = self.corpus.rowAyah(row)
+            matches.append(LocatorMatch(
+                surahNum, ayahNum, position - self.rowFirstPositions[row], votes[start], grams[start], queryOffset
+            ))
+            if len(matches) >= limit:
+                break
+        return matches
+    
+    def bestMatch(self, text, minMatchedGrams=MIN_MATCHED_GRAMS):
+        """
+        The top candidate if at least minMatchedGrams recited word pairs support it,
+        else None. Repeated passages resolve to their first occurrence.
+        """
+        matches = self.locate(text, limit=1)
+        if not matches or matches[0].matchedGrams < minMatchedGrams:
+            return None
+        return matches[0]
+
+
+def basmalaWordIndexes(words):
+    """Indexes of query words that are part of a recited basmala."""
+    indexes = set()
+    for start in range(len(words) - len(BASMALA_KEYS) + 1):
+        if tuple(words[start:start + len(BASMALA_KEYS)]) == BASMALA_KEYS:
+            indexes.update(range(start, start + len(BASMALA_KEYS)))
+    # A basmala on its own is still Al-Fatiha's first ayah.
+    return indexes if len(indexes) < len(words) else set()